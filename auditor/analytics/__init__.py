@@ -1,5 +1,31 @@
-from .service import AthenaAnalyticsService
+import importlib
+
+from .service import AthenaAnalyticsService, AsyncAthenaAnalyticsService
 from .dao import AthenaDAO
+from .cache import CachedAnalyticsService
 from .interfaces import AbstractQueryDAO, AbstractAthenaAnalyticsService
 
-__all__ = ['AthenaAnalyticsService', 'AthenaDAO', 'AbstractQueryDAO', 'AbstractAthenaAnalyticsService']
+# Engines other than Athena are imported on first access, so importing the package for the
+# default Athena path does not load them.
+_LAZY_EXPORTS = {
+    'StreamingAnalyticsService': 'streaming', 'AuditAggregate': 'streaming',
+    'ShardedAnalyticsService': 'sharding', 'ProcessPoolShardExecutor': 'sharding',
+    'LambdaShardExecutor': 'sharding', 'audit_shard': 'sharding',
+    'IncrementalAnalyticsService': 'incremental',
+    'ScanAnalyticsService': 'scan', 'fits_direct_scan': 'scan',
+    'ConsentStateIndex': 'consent', 'EffectiveConsentService': 'consent',
+    'ConsentLookupIndex': 'lookup', 'ConsentRecord': 'lookup', 'write_lookup_index': 'lookup',
+}
+
+def __getattr__(name):
+    # PEP 562: `from auditor.analytics import StreamingAnalyticsService` keeps working lazily.
+    if name in _LAZY_EXPORTS:
+        return getattr(importlib.import_module(f".{_LAZY_EXPORTS[name]}", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+__all__ = ['AthenaAnalyticsService', 'AsyncAthenaAnalyticsService', 'AthenaDAO', 'CachedAnalyticsService',
+           'StreamingAnalyticsService', 'IncrementalAnalyticsService', 'ScanAnalyticsService',
+           'fits_direct_scan', 'EffectiveConsentService', 'ConsentStateIndex', 'ConsentLookupIndex',
+           'ConsentRecord', 'write_lookup_index', 'AuditAggregate',
+           'ShardedAnalyticsService', 'ProcessPoolShardExecutor', 'LambdaShardExecutor', 'audit_shard',
+           'AbstractQueryDAO', 'AbstractAthenaAnalyticsService']
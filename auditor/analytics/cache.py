@@ -0,0 +1,90 @@
+import hashlib
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from .dao import TERMINAL_QUERY_STATES
+from .interfaces import AbstractAthenaAnalyticsService
+from ..state import AbstractStateStore
+from ..utils import Logger
+
+def normalize_query(query: str) -> str:
+    """Whitespace- and terminator-insensitive form of a query, so formatting changes still hit."""
+    return ' '.join(query.split()).rstrip(';').strip()
+
+def cache_key(query: str, export_arn: str) -> str:
+    digest = hashlib.sha256(f"{export_arn}\n{normalize_query(query)}".encode('utf-8')).hexdigest()
+    return f"query-cache#{digest}"
+
+def pending_key(query_id: str) -> str:
+    return f"query-cache-pending#{query_id}"
+
+class CachedAnalyticsService:
+    """
+    Result cache in front of an analytics service, keyed by normalized query text plus the
+    export ARN of the snapshot being audited. A hit returns the earlier query id without
+    starting a new query; only SUCCEEDED executions are cached. The cache key of a running
+    query is also kept in the store under its query id, so a resumed audit (a later
+    invocation with a new instance) still caches the result when it sees the query finish.
+    """
+    def __init__(self, service: AbstractAthenaAnalyticsService, store: AbstractStateStore,
+                 export_arn: Optional[str], ttl: int = 86400):
+        self.service = service
+        self.store = store
+        self.export_arn = export_arn
+        self.ttl = ttl
+        self._hits = {}
+        self._pending = {}
+
+    def run_query(self, query: str, database: str, output: str) -> str:
+        if not self.export_arn:
+            # Without a snapshot identity the data behind the query can change; never cache.
+            return self.service.run_query(query, database, output)
+
+        key = cache_key(query, self.export_arn)
+        entry = self.store.get(key)
+        if entry is not None:
+            Logger.log("Query cache hit", query_id=entry['query_id'], export_arn=self.export_arn)
+            Logger.metric("QueryCacheHit", "Count", 1)
+            self._hits[entry['query_id']] = entry
+            return entry['query_id']
+
+        Logger.metric("QueryCacheMiss", "Count", 1)
+        query_id = self.service.run_query(query, database, output)
+        self._pending[query_id] = key
+        self.store.put(pending_key(query_id), {'key': key}, ttl=self.ttl)
+        return query_id
+
+    def wait_completion(self, query_id: str) -> str:
+        if query_id in self._hits:
+            return self._hits[query_id]['status']
+
+        return self._record(query_id, self.service.wait_completion(query_id))
+
+    def check_state(self, query_id: str) -> str:
+        if query_id in self._hits:
+            return self._hits[query_id]['status']
+        status = self.service.check_state(query_id)
+        return self._record(query_id, status) if status in TERMINAL_QUERY_STATES else status
+
+    def _record(self, query_id: str, status: str) -> str:
+        key = self._pending.pop(query_id, None)
+        if key is None:
+            pending = self.store.get(pending_key(query_id))
+            key = pending['key'] if pending else None
+        if key is None:
+            return status
+        self.store.delete(pending_key(query_id))
+        if status == 'SUCCEEDED':
+            self.store.put(key, {'query_id': query_id, 'status': status, 'export_arn': self.export_arn,
+                                 'cached_at': time.time()}, ttl=self.ttl)
+        return status
+
+    def query_statistics(self, query_id: str) -> Dict[str, int]:
+        # A cache hit scanned nothing in this audit.
+        if query_id in self._hits:
+            return {}
+        return self.service.query_statistics(query_id)
+
+    def stream_results(self, query_id: str, **kwargs) -> Iterator[Dict[str, Any]]:
+        # Cached query ids still have their results in ATHENA_OUTPUT.
+        return self.service.stream_results(query_id, **kwargs)
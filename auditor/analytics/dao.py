@@ -1,7 +1,15 @@
+from typing import Any, BinaryIO, Dict, Iterator, List
+
+TERMINAL_QUERY_STATES = ('SUCCEEDED', 'FAILED', 'CANCELLED')
+
 class AthenaDAO:
     """AWS Athena Implementation of Query DAO."""
-    def __init__(self, athena_client):
+    def __init__(self, athena_client, s3_client=None):
         self.client = athena_client
+        # Optional: only needed to read large result sets straight from ATHENA_OUTPUT.
+        self.s3 = s3_client
+        # Statistics of finished executions, kept from the status calls that observed them.
+        self._statistics = {}
 
     def start_execution(self, query: str, database: str, output: str) -> str:
         response = self.client.start_query_execution(
@@ -13,4 +21,49 @@ class AthenaDAO:
 
     def fetch_execution_state(self, query_id: str) -> str:
         response = self.client.get_query_execution(QueryExecutionId=query_id)
-        return response['QueryExecution']['Status']['State']
+        return self._observe(query_id, response['QueryExecution'])
+
+    def fetch_execution_states(self, query_ids: List[str]) -> Dict[str, str]:
+        """Batch variant of fetch_execution_state (BatchGetQueryExecution accepts 50 ids per call)."""
+        states = {}
+        for i in range(0, len(query_ids), 50):
+            response = self.client.batch_get_query_execution(QueryExecutionIds=query_ids[i:i + 50])
+            for execution in response.get('QueryExecutions', []):
+                query_id = execution['QueryExecutionId']
+                states[query_id] = self._observe(query_id, execution)
+        return states
+
+    def _observe(self, query_id: str, execution: Dict[str, Any]) -> str:
+        state = execution['Status']['State']
+        if state in TERMINAL_QUERY_STATES:
+            self._statistics[query_id] = execution.get('Statistics', {})
+        return state
+
+    def fetch_execution_statistics(self, query_id: str) -> Dict[str, int]:
+        """
+        Statistics (DataScannedInBytes, EngineExecutionTimeInMillis, QueryQueueTimeInMillis, ...)
+        of a finished execution; free when a status check already saw it finish.
+        """
+        if query_id not in self._statistics:
+            response = self.client.get_query_execution(QueryExecutionId=query_id)
+            self._statistics[query_id] = response['QueryExecution'].get('Statistics', {})
+        return self._statistics[query_id]
+
+    def iter_result_pages(self, query_id: str, page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Lazily pages through GetQueryResults (at most 1000 rows per page)."""
+        params = {'QueryExecutionId': query_id, 'MaxResults': page_size}
+        while True:
+            response = self.client.get_query_results(**params)
+            yield response
+            if not response.get('NextToken'):
+                return
+            params['NextToken'] = response['NextToken']
+
+    def open_result_csv(self, query_id: str) -> BinaryIO:
+        """Opens the query's result CSV in ATHENA_OUTPUT as a stream (requires an S3 client)."""
+        if self.s3 is None:
+            raise RuntimeError("AthenaDAO has no S3 client for direct result reads")
+        response = self.client.get_query_execution(QueryExecutionId=query_id)
+        location = response['QueryExecution']['ResultConfiguration']['OutputLocation']
+        bucket, key = location[len('s3://'):].split('/', 1)
+        return self.s3.get_object(Bucket=bucket, Key=key)['Body']
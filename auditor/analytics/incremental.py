@@ -0,0 +1,69 @@
+import time
+from datetime import datetime
+
+from .streaming import AuditAggregate, StreamingAnalyticsService
+from ..state import AbstractStateStore
+from ..storage import ExportReader, continues_from, export_window
+from ..utils import Logger
+
+class IncrementalAnalyticsService(StreamingAnalyticsService):
+    """
+    Streaming engine that maintains the audit aggregate across snapshots. A full export
+    rebuilds the baseline; an incremental export only applies its changed items to the
+    previously stored aggregate, so nightly cost is O(changes) rather than O(table). The
+    aggregate is stored with the time it is current as of, and a delta is only applied when its
+    ExportFromTime is that time: a gap or overlap between windows would silently skew the counts.
+    """
+    def __init__(self, reader: ExportReader, store: AbstractStateStore, export_id: str, table_name: str):
+        super().__init__(reader)
+        self.store = store
+        self.export_id = export_id
+        self.state_key = f"aggregate#{table_name}"
+
+    def aggregate(self) -> AuditAggregate:
+        if self._aggregate is not None:
+            return self._aggregate
+
+        start_time = time.time()
+        previous = self.store.get(self.state_key)
+        if previous and previous['export_id'] == self.export_id:
+            # Re-run of an already applied export: applying the delta twice would double count.
+            self._aggregate = AuditAggregate.from_dict(previous['aggregate'])
+            return self._aggregate
+
+        manifest_key = self.reader.manifest_key(self.export_id)
+        if manifest_key is None:
+            raise FileNotFoundError(f"No export manifest for export_id={self.export_id}")
+        summary = self.reader.summary(self.export_id)
+        export_type = summary.get('exportType', 'FULL_EXPORT')
+        keys = [e['dataFileS3Key'] for e in self.reader.manifest_entries(manifest_key)]
+
+        if export_type == 'INCREMENTAL_EXPORT':
+            if previous is None:
+                raise RuntimeError("Incremental export received before any full export baseline")
+            base_time = datetime.fromisoformat(previous['export_time']) if previous.get('export_time') else None
+            if not continues_from(summary, base_time):
+                raise RuntimeError(
+                    f"Incremental export {self.export_id} starts at {summary.get('exportFromTime')} but the stored "
+                    f"aggregate ({previous['export_id']}) is as of {previous.get('export_time')}; "
+                    "a full export is required to rebuild the baseline")
+            aggregate = AuditAggregate.from_dict(previous['aggregate'])
+            changes = 0
+            for old_item, new_item in self.reader.iter_changes(keys):
+                aggregate.apply_change(old_item, new_item)
+                changes += 1
+            Logger.log("Delta aggregation applied", export_id=self.export_id,
+                       base_export_id=previous['export_id'], changes=changes, duration=time.time() - start_time)
+        else:
+            aggregate = AuditAggregate()
+            for item in self.reader.iter_items(keys):
+                aggregate.add(item)
+            Logger.log("Baseline aggregation rebuilt", export_id=self.export_id,
+                       records=aggregate.total, duration=time.time() - start_time)
+
+        _, as_of = export_window(summary)
+        self.store.put(self.state_key, {'export_id': self.export_id,
+                                        'export_time': as_of.isoformat() if as_of else None,
+                                        'aggregate': aggregate.to_dict()})
+        self._aggregate = aggregate
+        return aggregate
@@ -1,11 +1,16 @@
-from typing import Protocol
+from typing import Any, BinaryIO, Dict, Iterator, List, Protocol
 
 class AbstractQueryDAO(Protocol):
     """Structural interface for analytical query interactions."""
     def start_execution(self, query: str, database: str, output: str) -> str: ...
     def fetch_execution_state(self, query_id: str) -> str: ...
+    def fetch_execution_states(self, query_ids: List[str]) -> Dict[str, str]: ...
+    def fetch_execution_statistics(self, query_id: str) -> Dict[str, int]: ...
+    def iter_result_pages(self, query_id: str, page_size: int = 1000) -> Iterator[Dict[str, Any]]: ...
+    def open_result_csv(self, query_id: str) -> BinaryIO: ...
 
 class AbstractAthenaAnalyticsService(Protocol):
     """Structural interface for Athena-specific analytical operations."""
     def run_query(self, query: str, database: str, output: str) -> str: ...
+    def check_state(self, query_id: str) -> str: ...
     def wait_completion(self, query_id: str) -> str: ...
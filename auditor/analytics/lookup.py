@@ -0,0 +1,162 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .consent import ConsentStateIndex, KEY_SIZE, format_timestamp_key, pack_user_id
+from ..storage import AbstractObjectStore
+
+MAGIC = b'CONSIDX1'
+VERSION = 1
+# magic, version, record size, bloom hash count, reserved, record count, bloom bytes, vocabulary bytes
+HEADER = struct.Struct('<8sHHHHQQQ')
+# packed user id, timestamp key, action code, source code
+RECORD = struct.Struct(f'<{KEY_SIZE}sqBH')
+BLOOM_BITS_PER_KEY = 10
+BLOOM_HASHES = 7  # ~1% false positives at 10 bits per key
+
+class ConsentRecord(NamedTuple):
+    action: Optional[str]
+    source: Optional[str]
+    timestamp: Optional[str]
+
+def _bloom_positions(key: bytes, bits: int, hashes: int) -> Iterable[int]:
+    # Re-hashed so that non-random ids (e.g. time-based UUIDs) still spread evenly; double hashing derives k probes.
+    digest = hashlib.blake2b(key, digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    return ((h1 + i * h2) % bits for i in range(hashes))
+
+def write_lookup_index(index: ConsentStateIndex, path: str) -> int:
+    """
+    Writes `index` as a lookup file: header, vocabularies (JSON), Bloom filter, then
+    fixed-width records sorted by packed user id. Returns the number of records.
+    """
+    entries = sorted(index.entries())
+    bloom_bits = max(64, len(entries) * BLOOM_BITS_PER_KEY + 7) // 8 * 8
+    bloom = bytearray(bloom_bits // 8)
+    for key, _, _, _ in entries:
+        for bit in _bloom_positions(key, bloom_bits, BLOOM_HASHES):
+            bloom[bit >> 3] |= 1 << (bit & 7)
+    vocabulary = json.dumps({'actions': index.actions.values, 'sources': index.sources.values}).encode('utf-8')
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, BLOOM_HASHES, 0, len(entries), len(bloom), len(vocabulary)))
+        f.write(vocabulary)
+        f.write(bloom)
+        pack, actions, sources = RECORD.pack, index.actions.codes, index.sources.codes
+        for key, action, source, ts in entries:
+            f.write(pack(key, ts, actions[action], sources[source]))
+    return len(entries)
+
+class ConsentLookupIndex:
+    """
+    Read side of a lookup file. The file is memory-mapped, so opening it reads only the
+    header and vocabularies; the Bloom filter answers most misses without touching the
+    records, and hits binary-search the sorted records in place (O(log n) page reads).
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, hashes, _, count, bloom_bytes, vocab_bytes = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            self._mm.close()
+            raise ValueError(f"Not a consent lookup index (version {VERSION}): {path}")
+        vocabulary = json.loads(self._mm[HEADER.size:HEADER.size + vocab_bytes])
+        self.actions, self.sources = vocabulary['actions'], vocabulary['sources']
+        self.count = count
+        self._hashes = hashes
+        self._bloom_offset = HEADER.size + vocab_bytes
+        self._bloom_bits = bloom_bytes * 8
+        self._records_offset = self._bloom_offset + bloom_bytes
+
+    @classmethod
+    def from_store(cls, store: AbstractObjectStore, key: str, cache_dir: Optional[str] = None) -> 'ConsentLookupIndex':
+        """Downloads `key` once into `cache_dir` (reused by warm Lambda containers) and maps it."""
+        directory = cache_dir or os.path.join(tempfile.gettempdir(), 'consent-index')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, key.replace('/', '_'))
+        if not os.path.exists(path):
+            partial = f"{path}.{os.getpid()}.part"
+            with store.open(key) as src, open(partial, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+            os.replace(partial, path)
+        return cls(path)
+
+    @staticmethod
+    def latest_key(store: AbstractObjectStore, prefix: str = "consent-index/") -> Optional[str]:
+        """Key of the newest lookup file; export ids sort by export time."""
+        keys = [k for k in store.list_keys(prefix) if k.endswith('.idx')]
+        return max(keys) if keys else None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._mm.close()
+
+    def entries(self) -> Iterator[Tuple[bytes, Optional[str], Optional[str], int]]:
+        """Yields (packed key, action, source, timestamp key) for every record, in key order."""
+        unpack, base, size = RECORD.unpack_from, self._records_offset, RECORD.size
+        for position in range(self.count):
+            key, ts, action, source = unpack(self._mm, base + position * size)
+            yield key, self.actions[action], self.sources[source], ts
+
+    def might_contain(self, key: bytes) -> bool:
+        mm, offset = self._mm, self._bloom_offset
+        return all(mm[offset + (bit >> 3)] & (1 << (bit & 7))
+                   for bit in _bloom_positions(key, self._bloom_bits, self._hashes))
+
+    def _search(self, key: bytes, lo: int = 0) -> int:
+        """Index of the first record whose key is >= `key`, searching from `lo`."""
+        mm, base, size = self._mm, self._records_offset, RECORD.size
+        hi = self.count
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            offset = base + mid * size
+            if mm[offset:offset + KEY_SIZE] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _record(self, position: int, key: bytes) -> Optional[ConsentRecord]:
+        if position >= self.count:
+            return None
+        stored, ts, action, source = RECORD.unpack_from(self._mm, self._records_offset + position * RECORD.size)
+        if stored != key:
+            return None
+        return ConsentRecord(self.actions[action], self.sources[source], format_timestamp_key(ts))
+
+    def get(self, user_id: str) -> Optional[ConsentRecord]:
+        """The user's latest signal as of the snapshot, or None if the user has none."""
+        key = pack_user_id(user_id)
+        if not self.might_contain(key):
+            return None
+        return self._record(self._search(key), key)
+
+    def get_many(self, user_ids: Iterable[str]) -> Dict[str, Optional[ConsentRecord]]:
+        """Batch lookup: probes in key order so each search starts where the previous one ended."""
+        results: Dict[str, Optional[ConsentRecord]] = {}
+        probes: List = []
+        for user_id in user_ids:
+            key = pack_user_id(user_id)
+            results[user_id] = None
+            if self.might_contain(key):
+                probes.append((key, user_id))
+        position = 0
+        for key, user_id in sorted(probes):
+            position = self._search(key, position)
+            results[user_id] = self._record(position, key)
+        return results
@@ -0,0 +1,41 @@
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional
+
+def _timestamp(value: str) -> datetime:
+    # Athena renders timestamps as 'YYYY-MM-DD HH:MM:SS.fff' (optionally with a zone suffix).
+    return datetime.fromisoformat(value.replace(' UTC', '+00:00'))
+
+_DECODERS: Dict[str, Callable[[str], Any]] = {
+    'boolean': lambda v: v == 'true',
+    'tinyint': int,
+    'smallint': int,
+    'integer': int,
+    'bigint': int,
+    'real': float,
+    'float': float,
+    'double': float,
+    'decimal': Decimal,
+    'date': date.fromisoformat,
+    'timestamp': _timestamp,
+    'timestamp with time zone': _timestamp,
+}
+
+def decode_value(value: Optional[str], column_type: str) -> Any:
+    """Decodes an Athena result cell into its Python type (strings for varchar/complex types)."""
+    base_type = column_type.split('(', 1)[0].lower()
+    if value is None:
+        return None
+    if value == '' and base_type not in ('varchar', 'char', 'string'):
+        # Athena writes NULL as an empty field in result CSVs.
+        return None
+    decoder = _DECODERS.get(base_type)
+    return decoder(value) if decoder else value
+
+def encode_value(value: Any) -> Any:
+    """JSON-safe form of a decoded cell: ISO-8601 text for dates and timestamps, decimals as strings."""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
@@ -1,18 +1,129 @@
+import asyncio
+import csv
+import io
+from typing import Any, Dict, Iterator, List, Optional
+from .dao import TERMINAL_QUERY_STATES
 from .interfaces import AbstractQueryDAO
-from ..utils import Poller
+from .results import decode_value
+from ..polling import CompletionHistory, query_template_key
+from ..utils import Logger, MultiplexedPoller, Poller, run_sync
+
+# Athena execution statistics emitted as per-query metrics: (statistic, metric name, unit).
+QUERY_STATISTIC_METRICS = (
+    ('DataScannedInBytes', 'QueryDataScanned', 'Bytes'),
+    ('EngineExecutionTimeInMillis', 'QueryEngineExecutionTime', 'Milliseconds'),
+    ('QueryQueueTimeInMillis', 'QueryQueueTime', 'Milliseconds'),
+)
 
 class AthenaAnalyticsService:
     """High-level Orchestration for Athena Query Execution."""
-    def __init__(self, dao: AbstractQueryDAO):
+    def __init__(self, dao: AbstractQueryDAO, history: Optional[CompletionHistory] = None):
         self.dao = dao
+        # Execution statistics of the queries this service saw finish, by query id.
+        self.statistics: Dict[str, Dict[str, int]] = {}
+        # Optional: polls around each query template's learned run time instead of the fixed backoff.
+        self.history = history
+        self._templates: Dict[str, str] = {}
 
     def run_query(self, query: str, database: str, output: str) -> str:
-        return self.dao.start_execution(query, database, output)
+        query_id = self.dao.start_execution(query, database, output)
+        if self.history is not None:
+            self._templates[query_id] = query_template_key(query)
+        return query_id
+
+    def check_state(self, query_id: str) -> str:
+        """One non-blocking status check (resumable orchestration)."""
+        return self._finished(query_id, self.dao.fetch_execution_state(query_id))
 
     def wait_completion(self, query_id: str) -> str:
-        return Poller.wait(
+        template = self._templates.pop(query_id, None)
+        return self._finished(query_id, Poller.wait(
             f"Query {query_id}",
             lambda: self.dao.fetch_execution_state(query_id),
             success_states=['SUCCEEDED'],
-            failure_states=['FAILED', 'CANCELLED']
-        )
+            failure_states=['FAILED', 'CANCELLED'],
+            history=self.history if template else None,
+            history_key=template
+        ))
+
+    def query_statistics(self, query_id: str) -> Dict[str, int]:
+        """Scan size and engine/queue time of a finished query (empty until it has finished)."""
+        return self.statistics.get(query_id, {})
+
+    def _finished(self, query_id: str, state: str) -> str:
+        """Records and emits the statistics of a query the first time it is seen in a terminal state."""
+        if state in TERMINAL_QUERY_STATES and query_id not in self.statistics:
+            statistics = self.dao.fetch_execution_statistics(query_id)
+            self.statistics[query_id] = statistics
+            Logger.log("Query statistics", query_id=query_id, state=state, statistics=statistics)
+            for name, metric, unit in QUERY_STATISTIC_METRICS:
+                if statistics.get(name) is not None:
+                    Logger.metric(metric, unit, statistics[name])
+        return state
+
+    def stream_results(self, query_id: str, page_size: int = 1000, direct_read: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily yields typed result rows as dicts. Small results come from one GetQueryResults
+        page; when more pages follow (and `direct_read` is allowed), the result CSV in
+        ATHENA_OUTPUT is streamed instead, so memory stays bounded by a single page.
+        """
+        pages = self.dao.iter_result_pages(query_id, page_size)
+        first = next(pages)
+        columns = [(c['Name'], c['Type']) for c in first['ResultSet']['ResultSetMetadata']['ColumnInfo']]
+
+        if first.get('NextToken') and direct_read and getattr(self.dao, 's3', None) is not None:
+            pages.close()
+            Logger.log("Large result set: streaming result CSV", query_id=query_id)
+            yield from self._stream_csv(query_id, columns)
+            return
+
+        # The first row of the first page repeats the column names.
+        rows = first['ResultSet']['Rows'][1:]
+        while True:
+            for row in rows:
+                yield {name: decode_value(cell.get('VarCharValue'), ctype)
+                       for (name, ctype), cell in zip(columns, row['Data'])}
+            page = next(pages, None)
+            if page is None:
+                return
+            rows = page['ResultSet']['Rows']
+
+    def _stream_csv(self, query_id: str, columns) -> Iterator[Dict[str, Any]]:
+        with self.dao.open_result_csv(query_id) as body:
+            reader = csv.reader(io.TextIOWrapper(body, encoding='utf-8', newline=''))
+            next(reader, None)  # header
+            for values in reader:
+                yield {name: decode_value(value, ctype) for (name, ctype), value in zip(columns, values)}
+
+class AsyncAthenaAnalyticsService(AthenaAnalyticsService):
+    """
+    Asyncio variant of AthenaAnalyticsService. All query waits share one MultiplexedPoller,
+    so K concurrent queries cost one BatchGetQueryExecution call per tick instead of K threads.
+    The sync methods are shims that keep the AbstractAthenaAnalyticsService contract.
+    """
+    def __init__(self, dao: AbstractQueryDAO, poller: Optional[MultiplexedPoller] = None):
+        super().__init__(dao)
+        self.poller = poller or MultiplexedPoller()
+        self.poller.register('query', self.dao.fetch_execution_states, initial_delay=2, max_delay=30)
+
+    async def run_query_async(self, query: str, database: str, output: str) -> str:
+        return await asyncio.to_thread(self.dao.start_execution, query, database, output)
+
+    async def wait_completion_async(self, query_id: str) -> str:
+        state = await self.poller.wait('query', query_id, success_states=['SUCCEEDED'],
+                                       failure_states=['FAILED', 'CANCELLED'])
+        # The batch status calls already kept the statistics, so this makes no further API call.
+        return self._finished(query_id, state)
+
+    async def wait_all_async(self, query_ids: List[str]) -> Dict[str, str]:
+        states = await asyncio.gather(*(self.wait_completion_async(q) for q in query_ids))
+        return dict(zip(query_ids, states))
+
+    def run_query(self, query: str, database: str, output: str) -> str:
+        return run_sync(self.run_query_async(query, database, output))
+
+    def wait_completion(self, query_id: str) -> str:
+        return run_sync(self.wait_completion_async(query_id))
+
+    def wait_all(self, query_ids: List[str]) -> Dict[str, str]:
+        return run_sync(self.wait_all_async(query_ids))
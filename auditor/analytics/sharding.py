@@ -0,0 +1,96 @@
+import heapq
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from typing import Any, Dict, Iterable, List, Optional, Protocol, Sequence, Union
+
+from .streaming import AuditAggregate, StreamingAnalyticsService
+from ..storage import AbstractObjectStore, ExportReader
+from ..utils import Logger
+
+def plan_shards(entries: List[Dict[str, Any]], shard_count: int) -> List[List[str]]:
+    """Balances manifest data files across shards by item count (largest file first, lightest shard)."""
+    heap = [(0, i, []) for i in range(max(1, shard_count))]
+    for entry in sorted(entries, key=lambda e: e.get('itemCount', 0), reverse=True):
+        load, i, keys = heapq.heappop(heap)
+        keys.append(entry['dataFileS3Key'])
+        heapq.heappush(heap, (load + entry.get('itemCount', 0), i, keys))
+    return [keys for _, _, keys in sorted(heap, key=lambda s: s[1]) if keys]
+
+def audit_shard(store: AbstractObjectStore, keys: List[str]) -> Dict[str, Any]:
+    """Worker: streams one shard of data files into a serialized partial aggregate."""
+    aggregate = AuditAggregate()
+    for item in ExportReader(store).iter_items(keys):
+        aggregate.add(item)
+    return aggregate.to_dict()
+
+def reduce_aggregates(partials: Iterable[Dict[str, Any]]) -> AuditAggregate:
+    """Reducer: merges the partial aggregates returned by the workers."""
+    result = AuditAggregate()
+    for partial in partials:
+        result.merge(AuditAggregate.from_dict(partial))
+    return result
+
+class AbstractShardExecutor(Protocol):
+    """Structural interface for fanning shards out to workers."""
+    def map_shards(self, shards: List[List[str]]) -> List[Dict[str, Any]]: ...
+
+class AbstractAuditorInvoker(Protocol):
+    """Structural interface for invoking the Auditor Lambda (satisfied by BotoSnapshotDAO)."""
+    def invoke_auditor(self, function_name: str, payload: Dict[str, Any],
+                       invocation_type: str = 'Event') -> Dict[str, Any]: ...
+
+class ProcessPoolShardExecutor:
+    """Runs shard workers as local processes (offline runs and tests)."""
+    def __init__(self, store: AbstractObjectStore, max_workers: Optional[int] = None):
+        self.store = store
+        self.max_workers = max_workers
+
+    def map_shards(self, shards: List[List[str]]) -> List[Dict[str, Any]]:
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(audit_shard, repeat(self.store), shards))
+
+class LambdaShardExecutor:
+    """Runs shard workers as synchronous invocations of the Auditor Lambda (`AUDIT_SHARD` events)."""
+    def __init__(self, invoker: AbstractAuditorInvoker, function_name: str, bucket: str, max_workers: int = 16):
+        self.invoker = invoker
+        self.function_name = function_name
+        self.bucket = bucket
+        self.max_workers = max_workers
+
+    def _invoke(self, keys: List[str]) -> Dict[str, Any]:
+        response = self.invoker.invoke_auditor(
+            self.function_name,
+            {"type": "AUDIT_SHARD", "bucket": self.bucket, "keys": keys},
+            invocation_type='RequestResponse'
+        )
+        payload = json.loads(response['Payload'].read())
+        if response.get('FunctionError') or payload.get('statusCode') != 200:
+            raise RuntimeError(f"Shard worker failed: {payload}")
+        return payload['aggregate']
+
+    def map_shards(self, shards: List[List[str]]) -> List[Dict[str, Any]]:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(self._invoke, shards))
+
+class ShardedAnalyticsService(StreamingAnalyticsService):
+    """
+    Map-reduce variant of the streaming engine. The export's `manifest-files.json` is
+    split into data-file shards, each shard is audited by an independent worker and
+    the partial aggregates are reduced into the final result.
+    """
+    def __init__(self, reader: ExportReader, executor: AbstractShardExecutor, shard_count: int,
+                 export_id: Optional[Union[str, Sequence[str]]] = None):
+        super().__init__(reader, export_id)
+        self.executor = executor
+        self.shard_count = shard_count
+
+    def aggregate(self) -> AuditAggregate:
+        if self._aggregate is None:
+            start_time = time.time()
+            shards = plan_shards(self.manifest_entries(), self.shard_count)
+            self._aggregate = reduce_aggregates(self.executor.map_shards(shards))
+            Logger.log("Sharded pass completed", exports=self.export_ids or 'latest', shards=len(shards),
+                       records=self._aggregate.total, duration=time.time() - start_time)
+        return self._aggregate
@@ -0,0 +1,165 @@
+import re
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from ..storage import ExportReader, attribute_value
+from ..utils import Logger
+
+# Columns the streaming engine aggregates on; equality filters on any other column are unsupported.
+AGGREGATE_COLUMNS = ('action', 'source')
+
+_COUNT_QUERY = re.compile(
+    r"^\s*SELECT\s+count\(\*\)(?:\s+as\s+\w+)?\s+FROM\s+(?:\(.+?\)|\S+)(?:\s+WHERE\s+(?P<where>.+?))?\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+_EQUALITY = re.compile(r"^\s*\"?(\w+)\"?\s*=\s*'([^']*)'\s*$")
+
+def parse_count_query(query: str) -> Dict[str, str]:
+    """Extracts the equality filters of a `SELECT count(*) ... WHERE col = 'v' [AND ...]` query."""
+    match = _COUNT_QUERY.match(query)
+    if not match:
+        raise ValueError(f"Unsupported query for streaming engine: {query}")
+    filters = {}
+    if match.group('where'):
+        for clause in re.split(r"\s+AND\s+", match.group('where'), flags=re.IGNORECASE):
+            eq = _EQUALITY.match(clause)
+            if not eq or eq.group(1).lower() not in AGGREGATE_COLUMNS:
+                raise ValueError(f"Unsupported filter for streaming engine: {clause.strip()}")
+            filters[eq.group(1).lower()] = eq.group(2)
+    return filters
+
+class AuditAggregate:
+    """
+    Mergeable record counts keyed by (action, source), the partial result of one streaming pass.
+    `days` breaks the same counts down by signal day, keyed by (day, action, source), for the
+    rollup store; it is None when unknown (an aggregate rebuilt from bare counts or stored by
+    an earlier version).
+    """
+    def __init__(self, counts: Optional[Dict[Tuple[str, str], int]] = None,
+                 days: Optional[Dict[Tuple[str, str, str], int]] = None):
+        self.counts = Counter(counts or {})
+        self.days = Counter(days) if days is not None else (Counter() if counts is None else None)
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def add(self, item: Dict[str, Any]):
+        key = (attribute_value(item, 'action'), attribute_value(item, 'source'))
+        self.counts[key] += 1
+        if self.days is not None:
+            timestamp = attribute_value(item, 'timestamp')
+            if timestamp:
+                self.days[(timestamp[:10],) + key] += 1
+
+    def remove(self, item: Dict[str, Any]):
+        key = (attribute_value(item, 'action'), attribute_value(item, 'source'))
+        _decrement(self.counts, key)
+        if self.days is not None:
+            timestamp = attribute_value(item, 'timestamp')
+            if timestamp:
+                _decrement(self.days, (timestamp[:10],) + key)
+
+    def apply_change(self, old_item: Optional[Dict[str, Any]], new_item: Optional[Dict[str, Any]]):
+        """Applies one incremental-export change: inserts add, deletes subtract, updates do both."""
+        if old_item:
+            self.remove(old_item)
+        if new_item:
+            self.add(new_item)
+
+    def merge(self, other: 'AuditAggregate') -> 'AuditAggregate':
+        self.counts.update(other.counts)
+        if self.days is not None and other.days is not None:
+            self.days.update(other.days)
+        else:
+            self.days = None
+        return self
+
+    def count(self, action: Optional[str] = None, source: Optional[str] = None) -> int:
+        return sum(
+            n for (a, s), n in self.counts.items()
+            if (action is None or a == action) and (source is None or s == source)
+        )
+
+    def to_dict(self) -> Dict[str, List[list]]:
+        """JSON-serializable form, used to ship partial aggregates between workers."""
+        data = {"counts": [[a, s, n] for (a, s), n in sorted(self.counts.items(), key=str)]}
+        if self.days is not None:
+            data["days"] = [[d, a, s, n] for (d, a, s), n in sorted(self.days.items(), key=str)]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, List[list]]) -> 'AuditAggregate':
+        days = {(d, a, s): n for d, a, s, n in data["days"]} if "days" in data else None
+        return cls({(a, s): n for a, s, n in data.get("counts", [])}, days)
+
+def _decrement(counts: Counter, key: tuple):
+    counts[key] -= 1
+    if counts[key] <= 0:
+        del counts[key]
+
+class StreamingAnalyticsService:
+    """
+    Analytics service that answers count audits in a single streaming pass over
+    the DynamoDB export files, bypassing the Glue Crawler and Athena round trips.
+    """
+    def __init__(self, reader: ExportReader, export_id: Optional[Union[str, Sequence[str]]] = None):
+        self.reader = reader
+        # One export id, or several for a combined multi-table audit.
+        self.export_ids = [export_id] if isinstance(export_id, str) else list(export_id or [])
+        self._aggregate = None
+        self._results = {}
+
+    def manifest_entries(self) -> List[Dict[str, Any]]:
+        """Manifest entries of the audited exports (of the latest export when none are given)."""
+        entries = []
+        for export_id in self.export_ids or [None]:
+            manifest_key = self.reader.manifest_key(export_id)
+            if manifest_key is None:
+                raise FileNotFoundError(f"No export manifest under {self.reader.prefix} (export_id={export_id})")
+            entries.extend(self.reader.manifest_entries(manifest_key))
+        return entries
+
+    def data_keys(self) -> Optional[List[str]]:
+        """Data files of the audited exports, or None to read every export under the prefix."""
+        if not self.export_ids:
+            return None
+        return [e['dataFileS3Key'] for e in self.manifest_entries()]
+
+    def aggregate(self) -> AuditAggregate:
+        """Streams the snapshot once; subsequent queries reuse the aggregate."""
+        if self._aggregate is None:
+            start_time = time.time()
+            aggregate = AuditAggregate()
+            for item in self.reader.iter_items(self.data_keys()):
+                aggregate.add(item)
+            Logger.log("Streaming pass completed", prefix=self.reader.prefix,
+                       records=aggregate.total, duration=time.time() - start_time)
+            self._aggregate = aggregate
+        return self._aggregate
+
+    def run_query(self, query: str, database: str, output: str) -> str:
+        query_id = f"stream-{uuid.uuid4()}"
+        try:
+            filters = parse_count_query(query)
+            self._results[query_id] = ('SUCCEEDED', self.aggregate().count(**filters))
+        except ValueError as e:
+            Logger.log("Streaming query rejected", level="ERROR", query_id=query_id, error=str(e))
+            self._results[query_id] = ('FAILED', None)
+        return query_id
+
+    def check_state(self, query_id: str) -> str:
+        return self._results[query_id][0]
+
+    def wait_completion(self, query_id: str) -> str:
+        # Queries are evaluated eagerly in run_query, so there is nothing to poll.
+        return self._results[query_id][0]
+
+    def get_result(self, query_id: str) -> Optional[int]:
+        return self._results[query_id][1]
+
+    def daily_rollup(self) -> Optional[Dict[Tuple[str, str, str], int]]:
+        """Signal counts by (day, action, source) from the same pass, or None when not tracked."""
+        return self.aggregate().days
@@ -0,0 +1,38 @@
+"""
+Module-scope AWS client cache.
+Clients are built once per Lambda container and reused by every warm invocation,
+instead of paying client construction (endpoint resolution, credential lookup) per call.
+"""
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+# Adaptive retry configuration for high-throughput resilience.
+BOTO_CONFIG = Config(
+    retries={'mode': 'adaptive', 'max_attempts': 10}
+)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(service_name: str, config: Config = BOTO_CONFIG, region_name: str = None):
+    """Returns the cached client for a service (and region, default: the container's), creating it on first use."""
+    if region_name == os.environ.get('AWS_REGION'):
+        region_name = None
+    key = (service_name, region_name)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                kwargs = {'region_name': region_name} if region_name else {}
+                client = boto3.client(service_name, config=config, **kwargs)
+                _clients[key] = client
+    return client
+
+def reset_clients():
+    """Drops all cached clients (used by tests that patch boto3 between runs)."""
+    with _clients_lock:
+        _clients.clear()
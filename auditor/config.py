@@ -1,4 +1,14 @@
 import os
+import re
+
+from .discovery.schema import item_columns, parquet_columns
+from .storage import snapshot_date_from_prefix
+
+def _in(values) -> str:
+    # Values are validated export ids or YYYY-MM-DD dates, so they need no escaping.
+    if len(values) == 1:
+        return f"= '{values[0]}'"
+    return "IN (" + ", ".join(f"'{v}'" for v in values) + ")"
 
 class AuditConfiguration:
     """
@@ -15,6 +25,112 @@ class AuditConfiguration:
         self.database_name = os.environ.get('DATABASE_NAME')
         self.table_name = os.environ.get('TABLE_NAME')
         self.athena_output = os.environ.get('ATHENA_OUTPUT')
+        # 'athena' (Glue Crawler + Athena), 'streaming' (direct pass over the export files),
+        # 'sharded' (streaming pass fanned out over AUDIT_SHARDS Lambda workers),
+        # 'incremental' (stored aggregate updated with each export's changes), 'consent' (counts users
+        # by their latest signal), 'scan' (parallel segmented Scan of the live table)
+        # or 'adaptive' ('scan' below the SCAN_MAX_* limits, else 'athena')
+        self.audit_engine = os.environ.get('AUDIT_ENGINE', 'athena')
+        self.scan_segments = int(os.environ.get('SCAN_SEGMENTS', '8'))
+        self.scan_max_items = int(os.environ.get('SCAN_MAX_ITEMS', '500000'))
+        self.scan_max_bytes = int(os.environ.get('SCAN_MAX_BYTES', str(256 * 1024 * 1024)))
+        self.audit_shards = int(os.environ.get('AUDIT_SHARDS', '8'))
+        # Upper bound on concurrently running suite queries (keep below the Athena DML quota)
+        self.audit_max_in_flight = int(os.environ.get('AUDIT_MAX_IN_FLIGHT', '5'))
+        # Rows returned per suite query (the rest stays in ATHENA_OUTPUT); keeps responses and ledger entries small
+        self.suite_max_rows = int(os.environ.get('AUDIT_SUITE_MAX_ROWS', '100'))
+        # 'crawler' (Glue Crawler run per audit) or 'catalog' (fixed schema + direct partition adds)
+        self.discovery_mode = os.environ.get('DISCOVERY_MODE', 'crawler')
+        self.data_lake_bucket = os.environ.get('DATA_LAKE_BUCKET')
+        # Query result cache: 'none', 'memory' (per warm container), 'sqlite' or 'dynamodb' (STATE_TABLE)
+        self.result_cache = os.environ.get('RESULT_CACHE', 'none')
+        self.result_cache_ttl = int(os.environ.get('RESULT_CACHE_TTL', '86400'))
+        # Audit state lives in STATE_TABLE (DynamoDB) when set, otherwise in a local SQLite file
+        self.state_table = os.environ.get('STATE_TABLE')
+        self.state_path = os.environ.get('STATE_PATH', '/tmp/audit-state.sqlite')
+        self.export_prefix = os.environ.get('EXPORT_PREFIX', 'exports/')
+        # 'blocking' (one invocation waits out the crawl and query) or 'resumable' (checkpointed steps,
+        # rescheduled through EventBridge Scheduler with SCHEDULER_ROLE_ARN, else a Lambda re-invoke)
+        self.audit_mode = os.environ.get('AUDIT_MODE', 'blocking')
+        # Pre-flight Athena budget: audits whose exports exceed SCAN_BUDGET_BYTES (0 disables) are refused,
+        # or run on SCAN_BUDGET_FALLBACK ('streaming' or 'sharded', which Athena does not bill per byte)
+        self.scan_budget_bytes = int(os.environ.get('SCAN_BUDGET_BYTES', '0'))
+        self.scan_budget_fallback = os.environ.get('SCAN_BUDGET_FALLBACK', '')
+        self.scheduler_role_arn = os.environ.get('SCHEDULER_ROLE_ARN')
+        self.resume_inline_wait = float(os.environ.get('RESUME_INLINE_WAIT', '5'))
+        # Learned polling: crawl and query waits check around past completion times (kept in the state store)
+        self.adaptive_polling = os.environ.get('ADAPTIVE_POLLING', 'false').lower() == 'true'
+        # Idempotency ledger: one audit per snapshot however often it is triggered. A claim is taken over
+        # after IDEMPOTENCY_LEASE seconds (default: the function timeout, or the resumable phase limits)
+        self.audit_idempotency = os.environ.get('AUDIT_IDEMPOTENCY', 'false').lower() == 'true'
+        self.idempotency_lease = int(os.environ.get(
+            'IDEMPOTENCY_LEASE', str(13 * 3600 if self.audit_mode == 'resumable' else 900)))
+        # Daily rollup written after each successful snapshot audit: '' (off), 'sqlite' (a local file at
+        # ROLLUP_PATH) or 's3' (one segment per export under ROLLUP_PREFIX in DATA_LAKE_BUCKET)
+        self.rollup_store = os.environ.get('ROLLUP_STORE', '')
+        self.rollup_path = os.environ.get('ROLLUP_PATH', '/tmp/audit-rollup.sqlite')
+        self.rollup_prefix = os.environ.get('ROLLUP_PREFIX', 'rollups/')
+        # Parquet conversion output (see use_parquet_table); scoped Athena audits read it when the event names its table
+        self.parquet_prefix = os.environ.get('PARQUET_PREFIX', 'parquet/')
+        self.parquet_table = None
+        # Audited snapshots (see scope_to_export); unscoped audits read every export under export_prefix
+        self.export_ids = []
+        self.snapshot_dates = []
+        self.snapshot_prefix = self.export_prefix
+
+    @property
+    def export_id(self):
+        """The audited export when exactly one is in scope (single-table audits)."""
+        return self.export_ids[0] if len(self.export_ids) == 1 else None
+
+    def scope_to_export(self, export_id: str, s3_prefix: str = None):
+        """
+        Adds one export, given its id and the S3Prefix it was written under, to the audit scope.
+        Combined audits call this once per export; they read from the shared base prefix
+        unless every export sits under the same per-day prefix.
+        """
+        if not re.fullmatch(r'[0-9A-Za-z-]+', export_id):
+            raise ValueError(f"Invalid export id: {export_id}")
+        prefix = s3_prefix.rstrip('/') + '/' if s3_prefix else self.export_prefix
+        self.snapshot_prefix = prefix if not self.export_ids or prefix == self.snapshot_prefix else self.export_prefix
+        self.export_ids.append(export_id)
+        snapshot_date = snapshot_date_from_prefix(s3_prefix)
+        if snapshot_date and snapshot_date not in self.snapshot_dates:
+            self.snapshot_dates.append(snapshot_date)
+
+    def use_parquet_table(self, table_name: str):
+        """Reads the audited exports from the catalog table the Parquet conversion stage registered them in."""
+        if not re.fullmatch(r'[0-9A-Za-z_-]+', table_name):
+            raise ValueError(f"Invalid Parquet table name: {table_name}")
+        self.parquet_table = table_name
+
+    def relation(self) -> str:
+        """
+        Table reference for audit queries. A scoped audit reads a subquery over its own
+        partitions (`export_id` in catalog mode, the crawled `snapshot_date` otherwise), so
+        Athena prunes every other snapshot and scan cost stays flat as history grows. The
+        catalog table keeps each record in one `item` struct, so its subquery also flattens
+        that struct into the columns the audit queries read.
+        """
+        if self.parquet_table and self.export_ids:
+            # Converted snapshots: typed columns and `action` partitions, so far fewer bytes are scanned.
+            table = f'"{self.database_name}"."{self.parquet_table}"'
+            return f"(SELECT {parquet_columns()} FROM {table} WHERE export_id {_in(self.export_ids)})"
+        table = f'"{self.database_name}"."{self.table_name}"'
+        if self.discovery_mode == 'catalog':
+            where = f" WHERE export_id {_in(self.export_ids)}" if self.export_ids else ""
+            return f"(SELECT {item_columns()} FROM {table}{where})"
+        if self.snapshot_dates:
+            return f"(SELECT * FROM {table} WHERE snapshot_date {_in(self.snapshot_dates)})"
+        return table
 
     def is_valid(self):
-        return all([self.crawler_name, self.database_name, self.table_name, self.athena_output])
+        required = [self.crawler_name, self.database_name, self.table_name, self.athena_output]
+        if (self.audit_engine in ('streaming', 'sharded', 'incremental', 'consent') or self.discovery_mode == 'catalog'
+                or self.scan_budget_bytes or self.rollup_store == 's3'):
+            required.append(self.data_lake_bucket)
+        if self.scan_budget_fallback not in ('', 'streaming', 'sharded'):
+            return False
+        if self.rollup_store not in ('', 'sqlite', 's3'):
+            return False
+        return all(required)
@@ -1,5 +1,7 @@
-from .service import GlueDiscoveryService
+from .service import (GlueDiscoveryService, AsyncGlueDiscoveryService, StaticDiscoveryService, CatalogDiscoveryService,
+                      ParquetCatalogService)
 from .dao import GlueDAO
-from .interfaces import AbstractMetadataDAO, AbstractGlueDiscoveryService
+from .interfaces import AbstractMetadataDAO, AbstractCatalogDAO, AbstractGlueDiscoveryService
 
-__all__ = ['GlueDiscoveryService', 'GlueDAO', 'AbstractMetadataDAO', 'AbstractGlueDiscoveryService']
+__all__ = ['GlueDiscoveryService', 'AsyncGlueDiscoveryService', 'StaticDiscoveryService', 'CatalogDiscoveryService',
+           'ParquetCatalogService', 'GlueDAO', 'AbstractMetadataDAO', 'AbstractCatalogDAO', 'AbstractGlueDiscoveryService']
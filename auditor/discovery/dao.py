@@ -18,3 +18,37 @@ class GlueDAO:
     def fetch_crawler_state(self, name: str) -> str:
         response = self.client.get_crawler(Name=name)
         return response['Crawler']['State']
+
+    def fetch_crawler_states(self, names: list) -> dict:
+        """Batch variant of fetch_crawler_state (BatchGetCrawlers accepts 100 names per call)."""
+        states = {}
+        for i in range(0, len(names), 100):
+            response = self.client.batch_get_crawlers(CrawlerNames=names[i:i + 100])
+            for crawler in response.get('Crawlers', []):
+                states[crawler['Name']] = crawler['State']
+        return states
+
+    def create_table(self, database: str, table_input: dict):
+        try:
+            self.client.create_table(DatabaseName=database, TableInput=table_input)
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'AlreadyExistsException':
+                Logger.log("Catalog table already registered", table=table_input['Name'])
+            else:
+                raise
+
+    def add_partitions(self, database: str, table: str, partition_inputs: list) -> list:
+        """Registers partitions with one batch call; returns the values of newly added partitions."""
+        response = self.client.batch_create_partition(
+            DatabaseName=database,
+            TableName=table,
+            PartitionInputList=partition_inputs
+        )
+        failed = []
+        for error in response.get('Errors', []):
+            if error['ErrorDetail']['ErrorCode'] == 'AlreadyExistsException':
+                Logger.log("Partition already registered", partition=error['PartitionValues'])
+            else:
+                raise RuntimeError(f"Partition registration failed: {error}")
+            failed.append(error['PartitionValues'])
+        return [p['Values'] for p in partition_inputs if p['Values'] not in failed]
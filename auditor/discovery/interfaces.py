@@ -4,8 +4,15 @@ class AbstractMetadataDAO(Protocol):
     """Structural interface for metadata discovery interactions."""
     def trigger_crawler(self, name: str) -> None: ...
     def fetch_crawler_state(self, name: str) -> str: ...
+    def fetch_crawler_states(self, names: list) -> dict: ...
+
+class AbstractCatalogDAO(Protocol):
+    """Structural interface for direct catalog registration (no crawling)."""
+    def create_table(self, database: str, table_input: dict) -> None: ...
+    def add_partitions(self, database: str, table: str, partition_inputs: list) -> list: ...
 
 class AbstractGlueDiscoveryService(Protocol):
     """Structural interface for Glue-specific discovery operations."""
     def refresh(self) -> None: ...
+    def check_ready(self) -> str: ...
     def wait_ready(self) -> str: ...
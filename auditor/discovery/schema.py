@@ -0,0 +1,94 @@
+"""
+Fixed Glue Catalog definitions of the exported `PrivacyLogsTable` (DYNAMODB_JSON format)
+and of its Parquet conversion (see `snapshot.parquet`).
+"""
+
+# Exported attributes and their DynamoDB type keys. Each export line is {"Item": {<attribute>: {<type>: <value>}}};
+# the JSON SerDe matches keys case-insensitively.
+ITEM_ATTRIBUTES = (
+    ('user_id', 's', 'string'),
+    ('timestamp', 's', 'string'),
+    ('action', 's', 'string'),
+    ('source', 's', 'string'),
+    ('is_mock', 'bool', 'boolean'),
+)
+
+ITEM_TYPE = "struct<" + ",".join(f"{name}:struct<{key}:{hive_type}>" for name, key, hive_type in ITEM_ATTRIBUTES) + ">"
+
+PARTITION_KEYS = [{'Name': 'export_id', 'Type': 'string'}]
+
+def item_columns() -> str:
+    """
+    Select list that flattens the `item` struct into the top-level columns every audit query
+    reads (`action`, `source`, `user_id`, `"timestamp"`, ...), plus the `export_id` partition.
+    """
+    columns = [f'item."{name}".{key} AS "{name}"' for name, key, _ in ITEM_ATTRIBUTES]
+    return ", ".join(columns + ['export_id'])
+
+def storage_descriptor(location: str) -> dict:
+    """Storage descriptor shared by the table and each of its partitions."""
+    return {
+        'Columns': [{'Name': 'item', 'Type': ITEM_TYPE}],
+        'Location': location,
+        # TextInputFormat decompresses the gzipped data files transparently.
+        'InputFormat': 'org.apache.hadoop.mapred.TextInputFormat',
+        'OutputFormat': 'org.apache.hadoop.hive.ql.io.HiveIgnoreKeyTextOutputFormat',
+        'SerdeInfo': {
+            'SerializationLibrary': 'org.openx.data.jsonserde.JsonSerDe',
+            'Parameters': {'ignore.malformed.json': 'true'}
+        }
+    }
+
+def table_input(table_name: str, location: str) -> dict:
+    return {
+        'Name': table_name,
+        'TableType': 'EXTERNAL_TABLE',
+        'Parameters': {'classification': 'json', 'compressionType': 'gzip', 'EXTERNAL': 'TRUE'},
+        'PartitionKeys': PARTITION_KEYS,
+        'StorageDescriptor': storage_descriptor(location)
+    }
+
+def partition_input(export_id: str, location: str) -> dict:
+    return {'Values': [export_id], 'StorageDescriptor': storage_descriptor(location)}
+
+# Parquet conversion: typed columns, with `action` (and the snapshot) moved into the partition path.
+PARQUET_COLUMNS = [
+    {'Name': 'user_id', 'Type': 'string'},
+    {'Name': 'timestamp', 'Type': 'timestamp'},
+    {'Name': 'source', 'Type': 'string'},
+    {'Name': 'is_mock', 'Type': 'boolean'},
+]
+
+PARQUET_PARTITION_KEYS = [
+    {'Name': 'snapshot_date', 'Type': 'string'},
+    {'Name': 'export_id', 'Type': 'string'},
+    {'Name': 'action', 'Type': 'string'},
+]
+
+def parquet_columns() -> str:
+    """
+    Select list giving the Parquet table the columns of the export table. The typed timestamp
+    is rendered back to ISO-8601 text, which `from_iso8601_timestamp` and `max` accept as before.
+    """
+    return 'user_id, to_iso8601("timestamp") AS "timestamp", action, source, is_mock, export_id'
+
+def parquet_storage_descriptor(location: str) -> dict:
+    return {
+        'Columns': PARQUET_COLUMNS,
+        'Location': location,
+        'InputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
+        'OutputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
+        'SerdeInfo': {'SerializationLibrary': 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe'}
+    }
+
+def parquet_table_input(table_name: str, location: str) -> dict:
+    return {
+        'Name': table_name,
+        'TableType': 'EXTERNAL_TABLE',
+        'Parameters': {'classification': 'parquet', 'EXTERNAL': 'TRUE'},
+        'PartitionKeys': PARQUET_PARTITION_KEYS,
+        'StorageDescriptor': parquet_storage_descriptor(location)
+    }
+
+def parquet_partition_input(values: list, location: str) -> dict:
+    return {'Values': values, 'StorageDescriptor': parquet_storage_descriptor(location)}
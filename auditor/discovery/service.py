@@ -1,20 +1,139 @@
-from .interfaces import AbstractMetadataDAO
-from ..utils import Poller
+import asyncio
+from typing import List, Optional
+from botocore.exceptions import ClientError
+from . import schema
+from .interfaces import AbstractMetadataDAO, AbstractCatalogDAO
+from ..polling import CompletionHistory
+from ..utils import Logger, MultiplexedPoller, Poller, run_sync
 
 class GlueDiscoveryService:
     """High-level Orchestration for Glue Metadata Discovery."""
-    def __init__(self, dao: AbstractMetadataDAO, crawler_name: str):
+    def __init__(self, dao: AbstractMetadataDAO, crawler_name: str, history: Optional[CompletionHistory] = None):
         self.dao = dao
         self.crawler_name = crawler_name
+        # Optional: polls around this crawler's learned run time instead of the fixed backoff.
+        self.history = history
 
     def refresh(self):
         self.dao.trigger_crawler(self.crawler_name)
 
+    def check_ready(self) -> str:
+        """One non-blocking status check (resumable orchestration)."""
+        return self.dao.fetch_crawler_state(self.crawler_name)
+
     def wait_ready(self):
         return Poller.wait(
             f"Crawler {self.crawler_name}",
             lambda: self.dao.fetch_crawler_state(self.crawler_name),
             success_states=['READY'],
             initial_delay=10,
-            max_delay=60
+            max_delay=60,
+            history=self.history,
+            history_key=f"crawler#{self.crawler_name}"
         )
+
+class AsyncGlueDiscoveryService:
+    """Asyncio variant of GlueDiscoveryService; crawler waits share a MultiplexedPoller."""
+    def __init__(self, dao: AbstractMetadataDAO, crawler_name: str, poller: Optional[MultiplexedPoller] = None):
+        self.dao = dao
+        self.crawler_name = crawler_name
+        self.poller = poller or MultiplexedPoller()
+        self.poller.register('crawler', self.dao.fetch_crawler_states, initial_delay=10, max_delay=60)
+
+    async def refresh_async(self):
+        await asyncio.to_thread(self.dao.trigger_crawler, self.crawler_name)
+
+    def check_ready(self) -> str:
+        return self.dao.fetch_crawler_state(self.crawler_name)
+
+    async def wait_ready_async(self):
+        return await self.poller.wait('crawler', self.crawler_name, success_states=['READY'])
+
+    def refresh(self):
+        run_sync(self.refresh_async())
+
+    def wait_ready(self):
+        return run_sync(self.wait_ready_async())
+
+class StaticDiscoveryService:
+    """Discovery for engines that read export files directly and need no catalog refresh."""
+    def refresh(self):
+        pass
+
+    def check_ready(self) -> str:
+        return 'READY'
+
+    def wait_ready(self):
+        return 'READY'
+
+def add_partitions(dao: AbstractCatalogDAO, database: str, table_input: dict, partitions: list) -> list:
+    """Adds partitions with one batch call, registering the table first if it does not exist yet."""
+    try:
+        return dao.add_partitions(database, table_input['Name'], partitions)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'EntityNotFoundException':
+            raise
+        # First run only: register the table, then retry the partition batch.
+        dao.create_table(database, table_input)
+        return dao.add_partitions(database, table_input['Name'], partitions)
+
+class CatalogDiscoveryService:
+    """
+    Crawler-free discovery: the fixed `PrivacyLogsTable` schema is registered once and
+    each export is added as an `export_id` partition with a single batch catalog call.
+    """
+    def __init__(self, dao: AbstractCatalogDAO, database: str, table: str, bucket: str,
+                 export_ids: Optional[List[str]] = None, export_prefix: str = "exports/",
+                 snapshot_prefix: Optional[str] = None):
+        self.dao = dao
+        self.database = database
+        self.table = table
+        self.bucket = bucket
+        self.export_ids = export_ids or []
+        self.export_prefix = export_prefix
+        # Exports are written under per-day prefixes; partitions point at their own export's location.
+        self.snapshot_prefix = snapshot_prefix or export_prefix
+
+    def export_location(self, export_id: str) -> str:
+        return f"s3://{self.bucket}/{self.snapshot_prefix}AWSDynamoDB/{export_id}/data/"
+
+    def refresh(self):
+        if not self.export_ids:
+            return
+        partitions = [schema.partition_input(e, self.export_location(e)) for e in self.export_ids]
+        location = f"s3://{self.bucket}/{self.export_prefix}"
+        added = add_partitions(self.dao, self.database, schema.table_input(self.table, location), partitions)
+        Logger.log("Catalog partitions registered", table=self.table, added=added)
+
+    def check_ready(self) -> str:
+        return 'READY'
+
+    def wait_ready(self):
+        # Catalog writes are synchronous: the partitions are queryable as soon as refresh returns.
+        return 'READY'
+
+class ParquetCatalogService:
+    """
+    Registers the output of the Parquet conversion stage as `snapshot_date`/`export_id`/`action`
+    partitions of a fixed-schema table, so audits can query it as soon as the conversion returns.
+    """
+    def __init__(self, dao: AbstractCatalogDAO, database: str, table: str, bucket: str, prefix: str = "parquet/"):
+        self.dao = dao
+        self.database = database
+        self.table = table
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def register(self, snapshot_date: str, export_id: str, actions: List[str]) -> list:
+        """Adds one partition per converted action of an export; returns the newly added ones."""
+        base = f"s3://{self.bucket}/{self.prefix}"
+        partitions = [
+            schema.parquet_partition_input(
+                [snapshot_date, export_id, action],
+                f"{base}snapshot_date={snapshot_date}/export_id={export_id}/action={action}/"
+            )
+            for action in actions
+        ]
+        added = add_partitions(self.dao, self.database, schema.parquet_table_input(self.table, base), partitions)
+        Logger.log("Parquet partitions registered", table=self.table, export_id=export_id, added=len(added))
+        return added
@@ -1,7 +1,18 @@
+import asyncio
+import time
+import uuid
+from itertools import islice
+from typing import Any, Dict, Iterator, Optional
+
 from .discovery import AbstractGlueDiscoveryService
 from .analytics import AbstractAthenaAnalyticsService
+from .analytics.dao import TERMINAL_QUERY_STATES
 from .config import AuditConfiguration
-from .utils import Logger
+from .rollup import AbstractRollupStore
+from .scheduler import AbstractResumeScheduler
+from .state import AbstractStateStore
+from .suite import DAILY_ROLLUP, AuditQuery, AuditSuite
+from .utils import Logger, run_sync, span
 
 class ComplianceAuditOrchestrator:
     """Coordinates the compliance audit workflow using abstract Glue and Athena services."""
@@ -14,15 +25,234 @@ class ComplianceAuditOrchestrator:
         Logger.log("Starting Audit: Discovery Phase")
         
         # 1. Trigger Discovery (S3 Catalog Update)
-        self.discovery_service.refresh()
-        self.discovery_service.wait_ready()
+        with span("Discovery"):
+            self.discovery_service.refresh()
+            self.discovery_service.wait_ready()
 
         Logger.log("Starting Audit: Analysis Phase")
 
         # 2. Execute Analysis (Athena Analysis)
-        query = f'SELECT count(*) as total_opt_outs FROM "{config.database_name}"."{config.table_name}" WHERE action = \'opt_out\';'
-        query_id = self.analytics_service.run_query(query, config.database_name, config.athena_output)
-        
-        status = self.analytics_service.wait_completion(query_id)
+        query = f"SELECT count(*) as total_opt_outs FROM {config.relation()} WHERE action = 'opt_out';"
+        with span("Analysis"):
+            query_id = self.analytics_service.run_query(query, config.database_name, config.athena_output)
+            status = self.analytics_service.wait_completion(query_id)
         return query_id, status
 
+    def stream_audit(self, config: AuditConfiguration, audit_query: AuditQuery, **params: Any) -> Iterator[Dict[str, Any]]:
+        """Runs a row-level audit and lazily yields its typed rows to the caller."""
+        with span("Analysis", audit=audit_query.name):
+            query_id = self.analytics_service.run_query(audit_query.render(config, **params),
+                                                        config.database_name, config.athena_output)
+            status = self.analytics_service.wait_completion(query_id)
+        if status != 'SUCCEEDED':
+            raise RuntimeError(f"Audit query {audit_query.name} ended in state {status}")
+        yield from self.analytics_service.stream_results(query_id)
+
+    def materialize_rollup(self, config: AuditConfiguration, rollup_store: AbstractRollupStore,
+                           export_key: str, snapshot_date: str) -> int:
+        """
+        Writes the audited snapshot's signal counts per (day, action, source) to the rollup
+        store. Export-file engines collected them in their own pass; for Athena they cost one
+        GROUP BY query over the same (already discovered) snapshot. Returns the rows written.
+        """
+        with span("Rollup", export_key=export_key):
+            if hasattr(self.analytics_service, 'daily_rollup'):
+                counts = self.analytics_service.daily_rollup()
+                if counts is None:
+                    Logger.log("Rollup unavailable for this engine", level="WARNING", export_key=export_key)
+                    return 0
+            else:
+                query_id = self.analytics_service.run_query(DAILY_ROLLUP.render(config), config.database_name,
+                                                            config.athena_output)
+                status = self.analytics_service.wait_completion(query_id)
+                if status != 'SUCCEEDED':
+                    raise RuntimeError(f"Rollup query ended in state {status}")
+                counts = {(row['day'], row['action'], row['source']): row['signals']
+                          for row in self.analytics_service.stream_results(query_id)}
+            rows = rollup_store.write(export_key, snapshot_date, counts)
+        Logger.log("Audit rollup written", export_key=export_key, snapshot_date=snapshot_date, rows=rows)
+        return rows
+
+    def run_audit_suite(self, config: AuditConfiguration, suite: AuditSuite, max_in_flight: int = 5,
+                        max_rows: int = 100) -> Dict[str, Dict[str, Any]]:
+        """
+        Executes every query of a suite concurrently, with at most `max_in_flight` queries
+        submitted at once (Athena concurrency quota). Wall-clock time tracks the slowest
+        query rather than the sum. Returns per-query id, status, duration and result/error;
+        row results are capped at `max_rows` (`truncated` marks a longer result).
+        """
+        Logger.log("Starting Audit Suite: Discovery Phase", suite=suite.name)
+        with span("Discovery"):
+            self.discovery_service.refresh()
+            self.discovery_service.wait_ready()
+
+        Logger.log("Starting Audit Suite: Analysis Phase", suite=suite.name,
+                   queries=len(suite.queries), max_in_flight=max_in_flight)
+        with span("SuiteAnalysis", suite=suite.name):
+            return run_sync(self._run_suite(suite.render(config), config, max_in_flight, max_rows))
+
+    async def _run_suite(self, queries: Dict[str, str], config: AuditConfiguration, max_in_flight: int, max_rows: int):
+        semaphore = asyncio.Semaphore(max_in_flight)
+        names = list(queries)
+        results = await asyncio.gather(*(self._run_suite_query(queries[n], config, semaphore, max_rows) for n in names))
+        return dict(zip(names, results))
+
+    async def _run_suite_query(self, query: str, config: AuditConfiguration, semaphore: asyncio.Semaphore,
+                               max_rows: int):
+        service = self.analytics_service
+        async with semaphore:
+            start_time = time.time()
+            try:
+                if hasattr(service, 'run_query_async'):
+                    # Async services multiplex all waits onto this loop.
+                    query_id = await service.run_query_async(query, config.database_name, config.athena_output)
+                    status = await service.wait_completion_async(query_id)
+                else:
+                    query_id = await asyncio.to_thread(service.run_query, query, config.database_name, config.athena_output)
+                    status = await asyncio.to_thread(service.wait_completion, query_id)
+            except Exception as e:
+                Logger.log("Suite query failed", level="ERROR", error=str(e))
+                return {'query_id': None, 'status': 'ERROR', 'error': str(e), 'duration': time.time() - start_time}
+
+        result = {'query_id': query_id, 'status': status, 'duration': time.time() - start_time}
+        if status != 'SUCCEEDED':
+            return result
+        if hasattr(service, 'get_result'):
+            result['result'] = service.get_result(query_id)
+        elif hasattr(service, 'stream_results'):
+            # Athena: the first `max_rows` rows (one more tells whether the result was cut).
+            rows = await asyncio.to_thread(lambda: list(islice(service.stream_results(query_id), max_rows + 1)))
+            result.update(result=rows[:max_rows], truncated=len(rows) > max_rows)
+        return result
+
+
+# Per-phase wait backoff (initial, max), matching the blocking Poller settings of each service.
+DISCOVERY_BACKOFF = (10.0, 60.0)
+ANALYSIS_BACKOFF = (2.0, 30.0)
+BACKOFF_FACTOR = 1.5
+
+class ResumableAuditOrchestrator(ComplianceAuditOrchestrator):
+    """
+    Runs the opt-out audit as short, checkpointed steps instead of one blocking call. Short
+    waits are slept inline; a longer wait (or one the invocation has no time left for) saves
+    the checkpoint and asks the scheduler to resume the audit later, so crawl and query time
+    is not billed as idle Lambda time and a slow crawl cannot hit the function timeout.
+    """
+    def __init__(self, discovery_service: AbstractGlueDiscoveryService, analytics_service: AbstractAthenaAnalyticsService,
+                 checkpoints: AbstractStateStore, scheduler: AbstractResumeScheduler, inline_wait: float = 5.0,
+                 max_wait: float = 6 * 3600, checkpoint_ttl: int = 7 * 24 * 3600, clock=None, sleep=None):
+        super().__init__(discovery_service, analytics_service)
+        self.checkpoints = checkpoints
+        self.scheduler = scheduler
+        self.inline_wait = inline_wait
+        self.max_wait = max_wait
+        self.checkpoint_ttl = checkpoint_ttl
+        # Looked up per call by default, so patched clocks (tests, the local simulator) apply.
+        self.clock = clock or (lambda: time.time())
+        self.sleep = sleep or (lambda seconds: time.sleep(seconds))
+
+    @staticmethod
+    def checkpoint_key(audit_id: str) -> str:
+        return f"audit-checkpoint#{audit_id}"
+
+    def load_checkpoint(self, audit_id: str) -> Optional[Dict[str, Any]]:
+        return self.checkpoints.get(self.checkpoint_key(audit_id))
+
+    def start_opt_out_audit(self, config: AuditConfiguration, event: Dict[str, Any], context=None) -> Dict[str, Any]:
+        """Starts a new audit and advances it as far as this invocation allows; returns its checkpoint."""
+        now = self.clock()
+        checkpoint = {'audit_id': uuid.uuid4().hex, 'phase': 'discovery', 'event': event, 'query_id': None,
+                      'delay': None, 'polls': 0, 'phase_started_at': now, 'started_at': now, 'status': 'RUNNING'}
+        Logger.log("Starting resumable audit", audit_id=checkpoint['audit_id'])
+        return self._advance(checkpoint, config, context)
+
+    def resume_opt_out_audit(self, checkpoint: Dict[str, Any], config: AuditConfiguration, context=None,
+                             not_before: Optional[float] = None) -> Dict[str, Any]:
+        """Continues a checkpointed audit (an `AUDIT_RESUME` event); `not_before` is honoured first."""
+        if checkpoint['phase'] == 'done':
+            return checkpoint
+        if not_before is not None:
+            # Lambda re-invocations fire at once; the wait they stand for is served here.
+            wait = not_before - self.clock()
+            if wait > 0:
+                # Same margin as an inline wait: a sleep the invocation cannot afford is rescheduled.
+                if self._time_left(context) <= wait + self.inline_wait:
+                    self.scheduler.schedule(checkpoint['audit_id'], wait)
+                    Logger.log("Audit resume rescheduled", audit_id=checkpoint['audit_id'],
+                               phase=checkpoint['phase'], delay=wait)
+                    return checkpoint
+                self.sleep(wait)
+        Logger.log("Resuming audit", audit_id=checkpoint['audit_id'], phase=checkpoint['phase'])
+        return self._advance(checkpoint, config, context)
+
+    def _advance(self, checkpoint: Dict[str, Any], config: AuditConfiguration, context) -> Dict[str, Any]:
+        while checkpoint['phase'] != 'done':
+            phase = checkpoint['phase']
+            if phase == 'discovery':
+                with span("DiscoveryRefresh"):
+                    self.discovery_service.refresh()
+                self._enter(checkpoint, 'discovery_wait')
+                continue
+            if phase == 'query':
+                query = f"SELECT count(*) as total_opt_outs FROM {config.relation()} WHERE action = 'opt_out';"
+                checkpoint['query_id'] = self.analytics_service.run_query(query, config.database_name, config.athena_output)
+                self._enter(checkpoint, 'query_wait')
+                continue
+
+            checkpoint['polls'] += 1
+            if phase == 'discovery_wait':
+                if self.discovery_service.check_ready() == 'READY':
+                    self._finish_phase(checkpoint, 'Discovery', 'query')
+                    continue
+                initial_delay, max_delay = DISCOVERY_BACKOFF
+            else:
+                status = self.analytics_service.check_state(checkpoint['query_id'])
+                if status in TERMINAL_QUERY_STATES:
+                    self._finish_phase(checkpoint, 'Analysis', 'done')
+                    checkpoint['status'] = status
+                    break
+                initial_delay, max_delay = ANALYSIS_BACKOFF
+
+            if self.clock() - checkpoint['phase_started_at'] > self.max_wait:
+                Logger.log("Resumable audit timed out", level="ERROR", audit_id=checkpoint['audit_id'], phase=phase,
+                           polls=checkpoint['polls'])
+                checkpoint.update(phase='done', status='TIMED_OUT')
+                break
+
+            delay = checkpoint['delay'] or initial_delay
+            checkpoint['delay'] = min(delay * BACKOFF_FACTOR, max_delay)
+            self._save(checkpoint)
+            # Inline only while the invocation keeps a margin for the next check and the checkpoint write.
+            if delay <= self.inline_wait and self._time_left(context) > delay + self.inline_wait:
+                self.sleep(delay)
+                continue
+            self.scheduler.schedule(checkpoint['audit_id'], delay)
+            Logger.log("Audit step scheduled", audit_id=checkpoint['audit_id'], phase=phase, delay=delay,
+                       polls=checkpoint['polls'])
+            return checkpoint
+
+        self._save(checkpoint)
+        return checkpoint
+
+    def _enter(self, checkpoint: Dict[str, Any], phase: str):
+        checkpoint.update(phase=phase, delay=None)
+        self._save(checkpoint)
+
+    def _finish_phase(self, checkpoint: Dict[str, Any], name: str, next_phase: str):
+        """Phase metrics come from checkpoint timestamps, since a phase can span several invocations."""
+        now = self.clock()
+        Logger.metric(f"{name}Duration", "Seconds", now - checkpoint['phase_started_at'])
+        Logger.metric(f"{name}PollCount", "Count", checkpoint['polls'])
+        checkpoint.update(phase=next_phase, delay=None, polls=0, phase_started_at=now)
+        if next_phase != 'done':
+            self._save(checkpoint)
+
+    def _save(self, checkpoint: Dict[str, Any]):
+        self.checkpoints.put(self.checkpoint_key(checkpoint['audit_id']), checkpoint, ttl=self.checkpoint_ttl)
+
+    @staticmethod
+    def _time_left(context) -> float:
+        """Seconds left in this invocation (unbounded outside Lambda)."""
+        if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+            return float('inf')
+        return context.get_remaining_time_in_millis() / 1000
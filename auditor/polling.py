@@ -0,0 +1,71 @@
+"""
+History-aware polling: past completion durations per action (a crawler, a query template)
+are kept in a state store, and waits check densely around the learned p10-p90 window
+instead of following the same geometric backoff every time.
+"""
+import hashlib
+import re
+from typing import Iterator, List
+
+from .state import AbstractStateStore
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    `p` (0-1) percentile as the sample closest to the linear-interpolation position
+    `p * (n - 1)` (no interpolation between samples); 0.0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(p * (len(ordered) - 1))))]
+
+def query_template_key(query: str) -> str:
+    """Action key of a query: its text with literals and whitespace normalized, so per-snapshot ids share one history."""
+    template = ' '.join(re.sub(r"'[^']*'|\b\d+\b", "?", query).split()).rstrip(';').strip()
+    return "query#" + hashlib.sha256(template.encode('utf-8')).hexdigest()[:16]
+
+class CompletionHistory:
+    """
+    Recent completion durations per action, persisted under `poll-history#<action>`.
+    `delays` turns them into a polling schedule; with fewer than `min_samples` durations
+    it is the plain geometric backoff.
+    """
+    def __init__(self, store: AbstractStateStore, max_samples: int = 50, min_samples: int = 5,
+                 dense_checks: int = 4, min_step: float = 1.0):
+        self.store = store
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.dense_checks = dense_checks
+        self.min_step = min_step
+
+    def durations(self, action: str) -> List[float]:
+        entry = self.store.get(f"poll-history#{action}")
+        return entry['durations'] if entry else []
+
+    def record(self, action: str, duration: float):
+        # Last writer wins between concurrent waits; a lost sample only delays learning.
+        durations = (self.durations(action) + [round(duration, 3)])[-self.max_samples:]
+        self.store.put(f"poll-history#{action}", {'durations': durations})
+
+    def delays(self, action: str, initial_delay: float, max_delay: float,
+               backoff_factor: float) -> Iterator[float]:
+        """
+        Sleeps between checks (the first check happens immediately). With enough history:
+        one sleep to the p10 duration, `dense_checks` evenly spaced checks up to the p90,
+        then geometric backoff from `initial_delay` for the slow tail.
+        """
+        durations = self.durations(action)
+        elapsed = 0.0
+        if len(durations) >= self.min_samples:
+            low, high = percentile(durations, 0.1), percentile(durations, 0.9)
+            step = max(self.min_step, (high - low) / self.dense_checks)
+            target = low
+            while target <= high + step / 2:
+                if target > elapsed:
+                    yield target - elapsed
+                    elapsed = target
+                target += step
+        delay = initial_delay
+        while True:
+            yield delay
+            delay = min(delay * backoff_factor, max_delay)
@@ -0,0 +1,184 @@
+"""
+Materialized daily audit rollup: after each successful audit, the audited snapshot's signal
+counts per (day, action, source) are written under its export ARN, so trend questions
+("opt-outs per source over the last 90 days") are answered from a small local file in
+milliseconds instead of re-scanning exports with Athena.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Protocol, Tuple
+
+from .storage import AbstractObjectStore
+
+# Signal counts keyed by (day, action, source); day is the signal's 'YYYY-MM-DD'.
+RollupCounts = Dict[Tuple[str, str, str], int]
+
+class AbstractRollupStore(Protocol):
+    """Structural interface for persisting the rollup of one audited snapshot."""
+    def write(self, export_key: str, snapshot_date: str, counts: RollupCounts) -> int: ...
+
+def rollup_key(export_arns: Iterable[str]) -> str:
+    """Rollups are keyed by the audited export ARN (sorted and comma-joined for a combined cycle)."""
+    return ','.join(sorted(export_arns))
+
+def _day(value) -> str:
+    return value.isoformat() if isinstance(value, date) else str(value)
+
+class SQLiteRollupStore:
+    """
+    The rollup in a local SQLite file: one row per (export, day, action, source) with its
+    signal count, plus the export's totals per (action, source). Writing an export replaces
+    only that export's rows, so re-audits and backfills are idempotent and the rest of the
+    file is never rewritten.
+
+    `snapshot_trend` reports the audited counts as of each snapshot (one point per snapshot
+    date); `daily_trend` reports signals per signal day from the latest snapshot rolled up on
+    or before `as_of`, since every full export already holds the whole history.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS rollup_exports ("
+            "export_key TEXT PRIMARY KEY, snapshot_date TEXT NOT NULL, written_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS rollup_exports_by_date ON rollup_exports (snapshot_date);"
+            "CREATE TABLE IF NOT EXISTS daily_rollup ("
+            "export_key TEXT NOT NULL, day TEXT NOT NULL, action TEXT NOT NULL, source TEXT NOT NULL, "
+            "signals INTEGER NOT NULL, PRIMARY KEY (export_key, day, action, source)) WITHOUT ROWID;"
+            # Snapshot trends read these totals instead of summing a year of day rows per snapshot.
+            "CREATE TABLE IF NOT EXISTS snapshot_rollup ("
+            "export_key TEXT NOT NULL, action TEXT NOT NULL, source TEXT NOT NULL, signals INTEGER NOT NULL, "
+            "PRIMARY KEY (export_key, action, source)) WITHOUT ROWID;"
+        )
+
+    def write(self, export_key: str, snapshot_date: str, counts: RollupCounts) -> int:
+        """Replaces the rollup of one export in a single transaction; returns the rows written."""
+        merged = Counter()
+        for (day, action, source), signals in counts.items():
+            # Items without an action or source are kept under '' (the primary key cannot hold NULL).
+            merged[(_day(day), action or '', source or '')] += signals
+        rows = [(export_key,) + key + (signals,) for key, signals in merged.items() if signals > 0]
+        totals = Counter()
+        for _, _, action, source, signals in rows:
+            totals[(action, source)] += signals
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM daily_rollup WHERE export_key = ?", (export_key,))
+                self._conn.execute("DELETE FROM snapshot_rollup WHERE export_key = ?", (export_key,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rollup_exports (export_key, snapshot_date, written_at) VALUES (?, ?, ?)",
+                    (export_key, _day(snapshot_date), time.time())
+                )
+                self._conn.executemany(
+                    "INSERT INTO daily_rollup (export_key, day, action, source, signals) VALUES (?, ?, ?, ?, ?)", rows
+                )
+                self._conn.executemany(
+                    "INSERT INTO snapshot_rollup (export_key, action, source, signals) VALUES (?, ?, ?, ?)",
+                    [(export_key, action, source, signals) for (action, source), signals in totals.items()]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def load(self, segments: Iterable[Dict[str, Any]]) -> int:
+        """Imports rollup segments (see `ObjectRollupStore.iter_segments`); returns the exports loaded."""
+        loaded = 0
+        for segment in segments:
+            counts = {(d, a, s): n for d, a, s, n in segment['rows']}
+            self.write(segment['export_key'], segment['snapshot_date'], counts)
+            loaded += 1
+        return loaded
+
+    def exports(self, start=None, end=None) -> List[Dict[str, str]]:
+        """Rolled-up exports, oldest snapshot first, optionally limited to a snapshot date range."""
+        rows = self._query(
+            "SELECT export_key, snapshot_date FROM rollup_exports "
+            "WHERE snapshot_date BETWEEN ? AND ? ORDER BY snapshot_date, export_key",
+            (_day(start or '0000-00-00'), _day(end or '9999-99-99'))
+        )
+        return [{'export_key': k, 'snapshot_date': d} for k, d in rows]
+
+    def snapshot_trend(self, start, end, action: Optional[str] = None, source: Optional[str] = None,
+                       by_source: bool = False) -> List[Dict[str, Any]]:
+        """Signals per snapshot date (and action, and source with `by_source`) for snapshots in [start, end]."""
+        return self._trend("snapshot_rollup", "e.snapshot_date", "e.snapshot_date BETWEEN ? AND ?",
+                           [_day(start), _day(end)], action, source, by_source)
+
+    def daily_trend(self, start, end, action: Optional[str] = None, source: Optional[str] = None,
+                    by_source: bool = False, as_of=None) -> List[Dict[str, Any]]:
+        """Signals per signal day in [start, end], from the latest snapshot rolled up on or before `as_of`."""
+        latest = self._query("SELECT max(snapshot_date) FROM rollup_exports WHERE snapshot_date <= ?",
+                             (_day(as_of or '9999-99-99'),))[0][0]
+        if latest is None:
+            return []
+        return self._trend("daily_rollup", "r.day", "e.snapshot_date = ? AND r.day BETWEEN ? AND ?",
+                           [latest, _day(start), _day(end)], action, source, by_source)
+
+    def _trend(self, table: str, period: str, where: str, params: list, action: Optional[str], source: Optional[str],
+               by_source: bool) -> List[Dict[str, Any]]:
+        if action is not None:
+            where += " AND r.action = ?"
+            params.append(action)
+        if source is not None:
+            where += " AND r.source = ?"
+            params.append(source)
+        columns = [period, "r.action"] + (["r.source"] if by_source else [])
+        rows = self._query(
+            f"SELECT {', '.join(columns)}, sum(r.signals) FROM rollup_exports e "
+            f"JOIN {table} r ON r.export_key = e.export_key WHERE {where} "
+            f"GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}",
+            params
+        )
+        names = ['day' if period == 'r.day' else 'snapshot_date', 'action'] + (['source'] if by_source else [])
+        return [dict(zip(names + ['signals'], row)) for row in rows]
+
+    def _query(self, sql: str, params) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+class ObjectRollupStore:
+    """
+    Durable rollup for Lambda, where /tmp does not outlive the container: each export's rows
+    are one small JSON segment under `<prefix>snapshot_date=YYYY-MM-DD/`, so concurrent audits
+    never write the same object. `SQLiteRollupStore.load(store.iter_segments(start, end))`
+    pulls a date range into a local file for querying.
+    """
+    def __init__(self, store: AbstractObjectStore, prefix: str = 'rollups/'):
+        self.store = store
+        self.prefix = prefix
+
+    def segment_key(self, export_key: str, snapshot_date: str) -> str:
+        digest = hashlib.sha256(export_key.encode('utf-8')).hexdigest()[:16]
+        return f"{self.prefix}snapshot_date={_day(snapshot_date)}/{digest}.json"
+
+    def write(self, export_key: str, snapshot_date: str, counts: RollupCounts) -> int:
+        rows = [[_day(d), a, s, n] for (d, a, s), n in sorted(counts.items(), key=str) if n > 0]
+        segment = {'export_key': export_key, 'snapshot_date': _day(snapshot_date), 'rows': rows}
+        fd, path = tempfile.mkstemp(suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as out:
+                json.dump(segment, out)
+            self.store.put_file(self.segment_key(export_key, snapshot_date), path)
+        finally:
+            os.remove(path)
+        return len(rows)
+
+    def iter_segments(self, start: date, end: date) -> Iterator[Dict[str, Any]]:
+        """Yields the segments of snapshots from `start` to `end` (inclusive), oldest first."""
+        day = start
+        while day <= end:
+            for key in sorted(self.store.list_keys(f"{self.prefix}snapshot_date={day:%Y-%m-%d}/")):
+                with self.store.open(key) as raw:
+                    yield json.load(raw)
+            day += timedelta(days=1)
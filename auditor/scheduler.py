@@ -0,0 +1,64 @@
+"""
+Resume schedulers for the resumable orchestrator: each one arranges for the Auditor to be
+invoked again with `{"type": "AUDIT_RESUME", "audit_id": ...}` after a delay, so a long wait
+costs no billed Lambda time and is not bounded by the function timeout.
+"""
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Protocol, Tuple
+
+class AbstractResumeScheduler(Protocol):
+    """Structural interface for scheduling the next step of a resumable audit."""
+    def schedule(self, audit_id: str, delay: float) -> None: ...
+
+def resume_event(audit_id: str, not_before: float = None) -> dict:
+    event = {"type": "AUDIT_RESUME", "audit_id": audit_id}
+    if not_before is not None:
+        event["not_before"] = not_before
+    return event
+
+class EventBridgeResumeScheduler:
+    """
+    One-time EventBridge Scheduler schedules (`at(...)`, deleted after they fire) that invoke
+    the Auditor. The Scheduler fires with roughly minute granularity, which suits crawl waits.
+    """
+    def __init__(self, scheduler_client, target_arn: str, role_arn: str, group: str = 'default'):
+        self.client = scheduler_client
+        self.target_arn = target_arn
+        self.role_arn = role_arn
+        self.group = group
+
+    def schedule(self, audit_id: str, delay: float):
+        at = datetime.now(timezone.utc) + timedelta(seconds=max(1.0, delay))
+        self.client.create_schedule(
+            # Unique per step: a schedule may still exist (pending deletion) when the next step is planned.
+            Name=f"audit-resume-{audit_id}-{int(at.timestamp())}",
+            GroupName=self.group,
+            ScheduleExpression=f"at({at:%Y-%m-%dT%H:%M:%S})",
+            ScheduleExpressionTimezone='UTC',
+            FlexibleTimeWindow={'Mode': 'OFF'},
+            ActionAfterCompletion='DELETE',
+            Target={'Arn': self.target_arn, 'RoleArn': self.role_arn, 'Input': json.dumps(resume_event(audit_id))}
+        )
+
+class LambdaResumeScheduler:
+    """
+    Fallback without a Scheduler role: an asynchronous self-invocation carrying `not_before`.
+    The next invocation still sleeps until then, so this lifts the timeout ceiling but not
+    the idle time.
+    """
+    def __init__(self, invoker, function_name: str):
+        self.invoker = invoker
+        self.function_name = function_name
+
+    def schedule(self, audit_id: str, delay: float):
+        self.invoker.invoke_auditor(self.function_name, resume_event(audit_id, time.time() + delay))
+
+class LocalResumeScheduler:
+    """Records scheduled resumes for tests and local runs, which invoke them explicitly."""
+    def __init__(self):
+        self.scheduled: List[Tuple[str, float]] = []
+
+    def schedule(self, audit_id: str, delay: float):
+        self.scheduled.append((audit_id, delay))
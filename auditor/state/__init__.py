@@ -0,0 +1,5 @@
+from .dao import InMemoryStateStore, SQLiteStateStore, DynamoStateStore
+from .interfaces import AbstractStateStore
+from .ledger import IdempotencyLedger
+
+__all__ = ['InMemoryStateStore', 'SQLiteStateStore', 'DynamoStateStore', 'AbstractStateStore', 'IdempotencyLedger']
@@ -0,0 +1,148 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+def _expiry(ttl: Optional[int]) -> Optional[float]:
+    return time.time() + ttl if ttl else None
+
+def _expired(expires_at: Optional[float]) -> bool:
+    return expires_at is not None and expires_at <= time.time()
+
+class InMemoryStateStore:
+    """Process-local state store with TTL and LRU eviction beyond `max_entries`."""
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            if _expired(entry[1]):
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, value: Dict[str, Any], ttl: Optional[int] = None):
+        with self._lock:
+            self._items[key] = (value, _expiry(ttl))
+            self._items.move_to_end(key)
+            while self.max_entries and len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def put_if_absent(self, key: str, value: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        """Atomically writes `value` unless a live entry exists; returns whether it was written."""
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None and not _expired(entry[1]):
+                return False
+            self._items[key] = (value, _expiry(ttl))
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._items.pop(key, None)
+
+class SQLiteStateStore:
+    """
+    Local-file state store (SQLite) with TTL and least-recently-used eviction beyond `max_entries`.
+    Each `table` is an independent namespace, so evicting cache entries never touches other state.
+    """
+    def __init__(self, path: str, max_entries: Optional[int] = None, table: str = 'state'):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid state table name: {table}")
+        self.path = path
+        self.max_entries = max_entries
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if _expired(row[1]):
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any], ttl: Optional[int] = None):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), _expiry(ttl), time.time())
+            )
+            if self.max_entries:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+
+    def put_if_absent(self, key: str, value: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ? AND expires_at <= ?", (key, time.time()))
+            cursor = self._conn.execute(
+                f"INSERT OR IGNORE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), _expiry(ttl), time.time())
+            )
+            return cursor.rowcount == 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+class DynamoStateStore:
+    """DynamoDB implementation of State Store (partition key `pk`, native TTL on `expires_at`)."""
+    def __init__(self, ddb_client, table_name: str):
+        self.client = ddb_client
+        self.table_name = table_name
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        response = self.client.get_item(TableName=self.table_name, Key={'pk': {'S': key}}, ConsistentRead=True)
+        item = response.get('Item')
+        if item is None:
+            return None
+        # TTL deletion is lazy (up to days), so expiry is enforced on read as well.
+        if 'expires_at' in item and _expired(float(item['expires_at']['N'])):
+            return None
+        return json.loads(item['value']['S'])
+
+    def put(self, key: str, value: Dict[str, Any], ttl: Optional[int] = None):
+        item = {'pk': {'S': key}, 'value': {'S': json.dumps(value)}}
+        if ttl:
+            item['expires_at'] = {'N': str(int(_expiry(ttl)))}
+        self.client.put_item(TableName=self.table_name, Item=item)
+
+    def put_if_absent(self, key: str, value: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        """Conditional put: succeeds when the key is missing or its TTL has passed but not yet been reaped."""
+        item = {'pk': {'S': key}, 'value': {'S': json.dumps(value)}}
+        if ttl:
+            item['expires_at'] = {'N': str(int(_expiry(ttl)))}
+        try:
+            self.client.put_item(
+                TableName=self.table_name, Item=item,
+                ConditionExpression='attribute_not_exists(pk) OR expires_at <= :now',
+                ExpressionAttributeValues={':now': {'N': str(int(time.time()))}}
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+
+    def delete(self, key: str):
+        self.client.delete_item(TableName=self.table_name, Key={'pk': {'S': key}})
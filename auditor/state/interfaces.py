@@ -0,0 +1,8 @@
+from typing import Any, Dict, Optional, Protocol
+
+class AbstractStateStore(Protocol):
+    """Structural interface for small JSON key-value state (caches, checkpoints, ledgers)."""
+    def get(self, key: str) -> Optional[Dict[str, Any]]: ...
+    def put(self, key: str, value: Dict[str, Any], ttl: Optional[int] = None) -> None: ...
+    def put_if_absent(self, key: str, value: Dict[str, Any], ttl: Optional[int] = None) -> bool: ...
+    def delete(self, key: str) -> None: ...
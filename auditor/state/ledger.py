@@ -0,0 +1,38 @@
+import time
+from typing import Any, Dict, Optional
+
+from .interfaces import AbstractStateStore
+
+class IdempotencyLedger:
+    """
+    At-most-once execution per key (an export ARN, or the sorted ARNs of a combined audit) on
+    top of a state store's conditional write: DynamoDB in Lambda, SQLite or memory locally.
+
+    `claim` writes an IN_PROGRESS entry that expires after `lease` seconds, so a crashed
+    claimant is taken over atomically by the next trigger. `complete` replaces it with the
+    result for `ttl` seconds; `release` drops it so a failed run can be retried.
+    """
+    def __init__(self, store: AbstractStateStore, lease: int = 900, ttl: int = 7 * 24 * 3600,
+                 namespace: str = 'ledger'):
+        self.store = store
+        self.lease = lease
+        self.ttl = ttl
+        self.namespace = namespace
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}#{key}"
+
+    def claim(self, key: str) -> Optional[Dict[str, Any]]:
+        """None when this caller now owns `key`; otherwise the existing entry (IN_PROGRESS or COMPLETED)."""
+        if self.store.put_if_absent(self._key(key), {'status': 'IN_PROGRESS', 'claimed_at': time.time()},
+                                    ttl=self.lease):
+            return None
+        # The entry can expire or be released between the failed write and this read.
+        return self.store.get(self._key(key)) or {'status': 'IN_PROGRESS'}
+
+    def complete(self, key: str, result: Dict[str, Any]):
+        self.store.put(self._key(key), {'status': 'COMPLETED', 'result': result, 'completed_at': time.time()},
+                       ttl=self.ttl)
+
+    def release(self, key: str):
+        self.store.delete(self._key(key))
@@ -0,0 +1,8 @@
+from .dao import LocalObjectStore, S3ObjectStore, LocalTableReader, DynamoTableReader
+from .export import (ExportReader, attribute_value, continues_from, converted_bytes, export_id_from_arn,
+                     export_window, find_snapshot_exports, snapshot_prefix, snapshot_date_from_prefix)
+from .interfaces import AbstractObjectStore, AbstractTableReader
+
+__all__ = ['LocalObjectStore', 'S3ObjectStore', 'ExportReader', 'attribute_value', 'continues_from', 'converted_bytes', 'export_id_from_arn',
+           'export_window', 'find_snapshot_exports', 'snapshot_prefix', 'snapshot_date_from_prefix',
+           'LocalTableReader', 'DynamoTableReader', 'AbstractObjectStore', 'AbstractTableReader']
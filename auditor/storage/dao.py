@@ -0,0 +1,84 @@
+import json
+import os
+import shutil
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence
+
+class LocalObjectStore:
+    """Local-directory implementation of Object Store, keyed by POSIX relative paths."""
+    def __init__(self, root: str):
+        self.root = root
+
+    def list_keys(self, prefix: str) -> Iterator[str]:
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in sorted(filenames):
+                key = os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, '/')
+                if key.startswith(prefix):
+                    yield key
+
+    def open(self, key: str) -> BinaryIO:
+        return open(os.path.join(self.root, *key.split('/')), 'rb')
+
+    def put_file(self, key: str, path: str):
+        target = os.path.join(self.root, *key.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(path, target)
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(os.path.join(self.root, *key.split('/')))
+
+class S3ObjectStore:
+    """AWS S3 Implementation of Object Store."""
+    def __init__(self, s3_client, bucket: str):
+        self.client = s3_client
+        self.bucket = bucket
+
+    def list_keys(self, prefix: str) -> Iterator[str]:
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                yield obj['Key']
+
+    def open(self, key: str) -> BinaryIO:
+        # StreamingBody is read incrementally, so objects are never fully buffered.
+        return self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+
+    def put_file(self, key: str, path: str):
+        # upload_file switches to multipart uploads for large files.
+        self.client.upload_file(path, self.bucket, key)
+
+    def size(self, key: str) -> int:
+        return self.client.head_object(Bucket=self.bucket, Key=key)['ContentLength']
+
+class DynamoTableReader:
+    """AWS DynamoDB implementation of Table Reader (DescribeTable plus parallel Scan segments)."""
+    def __init__(self, ddb_client):
+        self.client = ddb_client
+
+    def describe(self, table_name: str) -> Dict[str, int]:
+        # ItemCount/TableSizeBytes are refreshed by DynamoDB roughly every six hours.
+        table = self.client.describe_table(TableName=table_name)['Table']
+        return {'item_count': table.get('ItemCount', 0), 'size_bytes': table.get('TableSizeBytes', 0)}
+
+    def scan_segment(self, table_name: str, segment: int, total_segments: int,
+                     attributes: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        params = {'TableName': table_name, 'Segment': segment, 'TotalSegments': total_segments}
+        if attributes:
+            # 'action' and 'source' are DynamoDB reserved words, so project through placeholders.
+            names = {f"#a{i}": name for i, name in enumerate(attributes)}
+            params.update(ProjectionExpression=", ".join(names), ExpressionAttributeNames=names)
+        paginator = self.client.get_paginator('scan')
+        for page in paginator.paginate(**params):
+            yield from page.get('Items', [])
+
+class LocalTableReader:
+    """In-memory stand-in for a DynamoDB table, holding items in low-level attribute-value form."""
+    def __init__(self, items: List[Dict[str, Any]]):
+        self.items = items
+
+    def describe(self, table_name: str) -> Dict[str, int]:
+        return {'item_count': len(self.items), 'size_bytes': sum(len(json.dumps(i)) for i in self.items)}
+
+    def scan_segment(self, table_name: str, segment: int, total_segments: int,
+                     attributes: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        for item in self.items[segment::total_segments]:
+            yield {k: v for k, v in item.items() if k in attributes} if attributes else item
@@ -0,0 +1,148 @@
+import gzip
+import io
+import json
+import re
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .interfaces import AbstractObjectStore
+
+def export_id_from_arn(export_arn: str) -> str:
+    """Extracts the export id from `arn:aws:dynamodb:<region>:<account>:table/<t>/export/<id>`."""
+    return export_arn.rsplit('/', 1)[-1]
+
+def snapshot_prefix(export_time: datetime, base_prefix: str = "exports/") -> str:
+    """Per-day export prefix (`exports/snapshot_date=YYYY-MM-DD/`); DynamoDB adds `AWSDynamoDB/<export_id>/`."""
+    return f"{base_prefix}snapshot_date={export_time:%Y-%m-%d}/"
+
+def export_window(summary: Dict[str, Any]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    (ExportFromTime, time the data is current as of) of an export's `manifest-summary.json`:
+    (None, ExportTime) for a full export, (ExportFromTime, ExportToTime) for an incremental one.
+    """
+    parse = lambda value: datetime.fromisoformat(value.replace('Z', '+00:00')) if value else None
+    if summary.get('exportType') == 'INCREMENTAL_EXPORT':
+        return parse(summary.get('exportFromTime')), parse(summary.get('exportToTime'))
+    return None, parse(summary.get('exportTime'))
+
+def continues_from(summary: Dict[str, Any], as_of: Optional[datetime]) -> bool:
+    """Whether an incremental export's window starts where data current as of `as_of` ends."""
+    start, _ = export_window(summary)
+    # DynamoDB reports export times with millisecond precision.
+    return start is not None and as_of is not None and abs(start - as_of) <= timedelta(seconds=1)
+
+def snapshot_date_from_prefix(prefix: str) -> Optional[str]:
+    """Inverse of `snapshot_prefix`; None for exports written under the bare prefix."""
+    match = re.search(r'snapshot_date=(\d{4}-\d{2}-\d{2})', prefix or '')
+    return match.group(1) if match else None
+
+def find_snapshot_exports(store: AbstractObjectStore, start: date, end: date,
+                          base_prefix: str = "exports/") -> Iterator[Dict[str, Any]]:
+    """
+    Yields the exports written under the per-day prefixes from `start` to `end` (inclusive),
+    oldest first, as their `manifest-summary.json` plus `snapshot_date` and `prefix`. Exports
+    from before the per-day layout are not dated and are never matched.
+    """
+    day = start
+    while day <= end:
+        prefix = snapshot_prefix(day, base_prefix)
+        summaries = sorted(k for k in store.list_keys(prefix) if k.endswith('/manifest-summary.json'))
+        for key in summaries:
+            with store.open(key) as raw:
+                summary = json.load(raw)
+            summary.update(snapshot_date=f"{day:%Y-%m-%d}", prefix=prefix)
+            yield summary
+        day += timedelta(days=1)
+
+def converted_bytes(store: AbstractObjectStore, export_ids: Sequence[str], snapshot_dates: Sequence[str] = (),
+                    base_prefix: str = "parquet/") -> int:
+    """
+    Size of the Parquet files converted from `export_ids` (`<base_prefix>snapshot_date=<day>/export_id=<id>/`),
+    listing only their snapshot days when those are known.
+    """
+    prefixes = [f"{base_prefix}snapshot_date={day}/" for day in snapshot_dates] or [base_prefix]
+    markers = [f"/export_id={export_id}/" for export_id in export_ids]
+    return sum(store.size(key) for prefix in prefixes for key in store.list_keys(prefix)
+               if key.endswith('.parquet') and any(marker in key for marker in markers))
+
+def attribute_value(item: Dict[str, Any], name: str) -> Optional[str]:
+    """Returns the scalar value of a DYNAMODB_JSON attribute as a string (None if absent)."""
+    attr = item.get(name)
+    if not attr:
+        return None
+    for type_key in ('S', 'N', 'BOOL'):
+        if type_key in attr:
+            return str(attr[type_key])
+    return None
+
+class ExportReader:
+    """
+    Streams items from a DynamoDB Export (DYNAMODB_JSON) stored in an Object Store.
+    Data files are read line by line, so memory is bounded by a single record.
+    """
+    def __init__(self, store: AbstractObjectStore, prefix: str = "exports/"):
+        self.store = store
+        self.prefix = prefix
+
+    def data_keys(self) -> Iterator[str]:
+        """Lists the gzipped data files of every export under the prefix (manifests are skipped)."""
+        for key in self.store.list_keys(self.prefix):
+            if '/data/' in key and key.endswith('.json.gz'):
+                yield key
+
+    def manifest_key(self, export_id: Optional[str] = None) -> Optional[str]:
+        """Locates `manifest-files.json` for an export id, or for the latest export if none is given."""
+        manifests = [k for k in self.store.list_keys(self.prefix) if k.endswith('/manifest-files.json')]
+        if export_id is not None:
+            manifests = [k for k in manifests if f"/{export_id}/" in k]
+        # Export ids start with a millisecond timestamp, so the lexical maximum is the latest export.
+        return max(manifests) if manifests else None
+
+    def manifest_entries(self, manifest_key: str) -> List[Dict[str, Any]]:
+        """Parses the newline-delimited `manifest-files.json` (one entry per data file)."""
+        with self.store.open(manifest_key) as raw:
+            return [json.loads(line) for line in io.TextIOWrapper(raw, encoding='utf-8') if line.strip()]
+
+    def summary(self, export_id: str, manifest_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Loads `manifest-summary.json` (exportTime, itemCount, billedSizeBytes, ...) for an export.
+        A known `manifest_key` skips listing the prefix to locate it.
+        """
+        manifest_key = manifest_key or self.manifest_key(export_id)
+        if manifest_key is None:
+            raise FileNotFoundError(f"No export manifest under {self.prefix} (export_id={export_id})")
+        with self.store.open(manifest_key.rsplit('/', 1)[0] + '/manifest-summary.json') as raw:
+            return json.load(raw)
+
+    def estimated_bytes(self, export_ids: Optional[Sequence[str]] = None) -> int:
+        """
+        Pre-flight size of the exports an audit would read: the summed `billedSizeBytes` of their
+        `manifest-summary.json` files (every export under the prefix when no ids are given).
+        """
+        total = 0
+        for key in self.store.list_keys(self.prefix):
+            if not key.endswith('/manifest-summary.json'):
+                continue
+            if export_ids is not None and not any(f"/{export_id}/" in key for export_id in export_ids):
+                continue
+            with self.store.open(key) as raw:
+                total += int(json.load(raw).get('billedSizeBytes', 0))
+        return total
+
+    def iter_records(self, keys: Optional[Iterable[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Yields each raw export line, one record at a time."""
+        for key in (self.data_keys() if keys is None else keys):
+            with self.store.open(key) as raw, gzip.GzipFile(fileobj=raw) as gz:
+                for line in io.TextIOWrapper(gz, encoding='utf-8'):
+                    if line.strip():
+                        yield json.loads(line)
+
+    def iter_items(self, keys: Optional[Iterable[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Yields each item of a full export (still DynamoDB-typed)."""
+        for record in self.iter_records(keys):
+            yield record['Item']
+
+    def iter_changes(self, keys: Optional[Iterable[str]] = None) -> Iterator[Tuple[Optional[Dict], Optional[Dict]]]:
+        """Yields (OldImage, NewImage) pairs of an incremental export (NEW_AND_OLD_IMAGES view)."""
+        for record in self.iter_records(keys):
+            yield record.get('OldImage'), record.get('NewImage')
@@ -0,0 +1,14 @@
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Protocol, Sequence
+
+class AbstractObjectStore(Protocol):
+    """Structural interface for reading snapshot objects (S3 or local disk)."""
+    def list_keys(self, prefix: str) -> Iterator[str]: ...
+    def open(self, key: str) -> BinaryIO: ...
+    def put_file(self, key: str, path: str) -> None: ...
+    def size(self, key: str) -> int: ...
+
+class AbstractTableReader(Protocol):
+    """Structural interface for reading the live table directly (DynamoDB or an in-memory stand-in)."""
+    def describe(self, table_name: str) -> Dict[str, int]: ...
+    def scan_segment(self, table_name: str, segment: int, total_segments: int,
+                     attributes: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]: ...
@@ -0,0 +1,79 @@
+from typing import Any, Dict, List
+
+from .config import AuditConfiguration
+
+class AuditQuery:
+    """
+    A named audit query; `{relation}` (the table, narrowed to the audited snapshot when the
+    config is scoped), `{database}`, `{table}` and suite parameters are filled at render time.
+    """
+    def __init__(self, name: str, template: str):
+        self.name = name
+        self.template = template
+
+    def render(self, config: AuditConfiguration, **params: Any) -> str:
+        return self.template.format(relation=config.relation(), database=config.database_name,
+                                    table=config.table_name, **params)
+
+class AuditSuite:
+    """A declarative set of audit queries that the orchestrator submits concurrently."""
+    def __init__(self, name: str, queries: List[AuditQuery], params: Dict[str, Any] = None):
+        self.name = name
+        self.queries = queries
+        self.params = params or {}
+
+    def render(self, config: AuditConfiguration) -> Dict[str, str]:
+        return {q.name: q.render(config, **self.params) for q in self.queries}
+
+OPT_OUTS_PER_SOURCE = AuditQuery(
+    'opt_outs_per_source',
+    'SELECT source, count(*) AS opt_outs FROM {relation} '
+    'WHERE action = \'opt_out\' GROUP BY source ORDER BY opt_outs DESC;'
+)
+
+CONFLICTING_SIGNALS = AuditQuery(
+    'conflicting_signals',
+    'SELECT count(*) AS conflicting_users FROM ('
+    'SELECT user_id FROM {relation} WHERE action IN (\'opt_in\', \'opt_out\') '
+    'GROUP BY user_id HAVING count(DISTINCT action) = 2);'
+)
+
+STALE_PREFERENCES = AuditQuery(
+    'stale_preferences',
+    'SELECT count(*) AS stale_users FROM ('
+    'SELECT user_id, max(from_iso8601_timestamp("timestamp")) AS last_seen FROM {relation} '
+    'GROUP BY user_id) WHERE last_seen < current_timestamp - INTERVAL \'{stale_days}\' DAY;'
+)
+
+DAILY_TRENDS = AuditQuery(
+    'daily_trends',
+    'SELECT date(from_iso8601_timestamp("timestamp")) AS day, action, count(*) AS signals '
+    'FROM {relation} GROUP BY 1, 2 ORDER BY 1, 2;'
+)
+
+# Per-day rollup of the audited snapshot, materialized by ComplianceAuditOrchestrator.materialize_rollup.
+DAILY_ROLLUP = AuditQuery(
+    'daily_rollup',
+    'SELECT date(from_iso8601_timestamp("timestamp")) AS day, action, source, count(*) AS signals '
+    'FROM {relation} GROUP BY 1, 2, 3;'
+)
+
+# Row-level audit: one row per user whose latest signal is an opt-out (consume via stream_audit).
+OPTED_OUT_USERS = AuditQuery(
+    'opted_out_users',
+    'SELECT user_id, max_by(source, "timestamp") AS source, max("timestamp") AS last_signal '
+    'FROM {relation} GROUP BY user_id '
+    'HAVING max_by(action, "timestamp") = \'opt_out\';'
+)
+
+# Row-level export of every signal, reduced client-side by ConsentStateIndex.from_rows.
+SIGNAL_HISTORY = AuditQuery(
+    'signal_history',
+    'SELECT user_id, action, source, "timestamp" FROM {relation};'
+)
+
+DEFAULT_SUITE = AuditSuite(
+    'privacy-signals',
+    [OPT_OUTS_PER_SOURCE, CONFLICTING_SIGNALS, STALE_PREFERENCES, DAILY_TRENDS],
+    params={'stale_days': 365}
+)
@@ -1,16 +1,52 @@
 import os
 import time
 import json
-from aws_lambda_powertools import Logger as PTLogger
-from aws_lambda_powertools import Metrics as PTMetrics
-from aws_lambda_powertools import Tracer as PTTracer
-from aws_lambda_powertools.metrics import MetricUnit
+import asyncio
+import contextlib
+import contextvars
+import functools
+import threading
 
 # Core Observability instances
-# service="privacy-auditor" can be overridden by POWERTOOLS_SERVICE_NAME env var
-tracer = PTTracer()
-logger = PTLogger()
-metrics = PTMetrics(namespace="PrivacySignalAnalyzer")
+# service="privacy-auditor" can be overridden by POWERTOOLS_SERVICE_NAME env var.
+# Built on first use, so CLI tools and tests that only need Logger/Poller do not import the
+# X-Ray SDK behind Tracer (~150-200ms). The Lambda handlers still build all three during INIT
+# through their decorators.
+_instances = {}
+_instances_lock = threading.Lock()
+
+def _observability():
+    if not _instances:
+        with _instances_lock:
+            if not _instances:
+                from aws_lambda_powertools import Logger as PTLogger
+                from aws_lambda_powertools import Metrics as PTMetrics
+                from aws_lambda_powertools import Tracer as PTTracer
+                built = {'tracer': PTTracer(), 'logger': PTLogger(),
+                         'metrics': PTMetrics(namespace="PrivacySignalAnalyzer")}
+                _instances.update(built)
+    return _instances
+
+def __getattr__(name):
+    # PEP 562: `from auditor.utils import tracer, logger, metrics, MetricUnit` keeps working lazily.
+    if name in ('tracer', 'logger', 'metrics'):
+        return _observability()[name]
+    if name == 'MetricUnit':
+        from aws_lambda_powertools.metrics import MetricUnit
+        return MetricUnit
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def capture_method(fn):
+    """Lazy `tracer.capture_method`: the Tracer is only built when the method first runs."""
+    traced = None
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        nonlocal traced
+        if traced is None:
+            traced = _observability()['tracer'].capture_method(fn)
+        return traced(*args, **kwargs)
+    return wrapper
 
 class Logger:
     """
@@ -23,6 +59,7 @@ class Logger:
         Maintains backward compatibility with original log() method
         while routing through Powertools Logger.
         """
+        logger = _observability()['logger']
         lvl = level.upper()
         if lvl == "DEBUG":
             logger.debug(message, **kwargs)
@@ -36,35 +73,206 @@ class Logger:
             logger.info(message, **kwargs)
 
     @staticmethod
-    def metric(name, unit, value, **dimensions):
-        """Emits a custom metric using CloudWatch EMF."""
-        metrics.add_metric(name=name, unit=unit, value=value)
+    def set_dimensions(**dimensions):
+        """
+        Adds invocation-level dimensions, skipping ones already set. Dimensions apply to every
+        metric in the EMF batch, and a new dimension makes each metric a new CloudWatch metric.
+        """
+        metrics = _observability()['metrics']
         for d_name, d_val in dimensions.items():
-            metrics.add_dimension(name=d_name, value=str(d_val))
+            if metrics.dimension_set.get(d_name) != str(d_val):
+                metrics.add_dimension(name=d_name, value=str(d_val))
+
+    @staticmethod
+    def metric(name, unit, value, **dimensions):
+        """
+        Buffers a custom metric in the invocation's EMF batch (flushed by `log_metrics`).
+        `dimensions` are added to the whole batch (see `set_dimensions`), as before batching.
+        """
+        _observability()['metrics'].add_metric(name=name, unit=unit, value=value)
+        if dimensions:
+            Logger.set_dimensions(**dimensions)
+
+class PollStats:
+    """Instrumentation for one wait: poll count, when each state was first seen and an over-sleep estimate."""
+    def __init__(self, action_name):
+        self.action_name = action_name
+        self.start_time = time.time()
+        self.polls = 0
+        self.transitions = []
+        self.last_delay = 0
+
+    def observe(self, state):
+        self.polls += 1
+        if not self.transitions or self.transitions[-1][0] != state:
+            self.transitions.append((state, round(time.time() - self.start_time, 3)))
+
+    def state_durations(self):
+        """Time spent in each non-final state, at the resolution of the polling interval."""
+        durations = {}
+        for (state, at), (_, until) in zip(self.transitions, self.transitions[1:]):
+            durations[state] = durations.get(state, 0) + until - at
+        return durations
+
+    @property
+    def over_sleep_estimate(self):
+        # The resource finished at an unknown point during the final sleep; on average half of it.
+        return self.last_delay / 2 if self.polls > 1 else 0.0
+
+    def to_dict(self):
+        return {'polls': self.polls, 'transitions': self.transitions,
+                'state_durations': self.state_durations(), 'over_sleep_estimate': self.over_sleep_estimate}
+
+_active_span = contextvars.ContextVar('active_span', default=None)
+
+@contextlib.contextmanager
+def span(name, **annotations):
+    """
+    Times one workflow phase: an X-Ray subsegment plus `<name>Duration`, and, for every
+    Poller.wait inside it, `<name>PollCount`, `<name>OverSleepEstimate` and per-state times
+    such as `AnalysisQueuedTime` / `AnalysisRunningTime`.
+    """
+    polls = []
+    token = _active_span.set(polls)
+    start_time = time.time()
+    try:
+        with _observability()['tracer'].provider.in_subsegment(f"## {name}") as subsegment:
+            for key, value in annotations.items():
+                subsegment.put_annotation(key, value)
+            yield
+            subsegment.put_metadata('polls', [p.to_dict() for p in polls])
+    finally:
+        _active_span.reset(token)
+        duration = time.time() - start_time
+        Logger.metric(f"{name}Duration", "Seconds", duration)
+        for stats in polls:
+            Logger.metric(f"{name}PollCount", "Count", stats.polls)
+            Logger.metric(f"{name}OverSleepEstimate", "Seconds", stats.over_sleep_estimate)
+            for state, seconds in stats.state_durations().items():
+                Logger.metric(f"{name}{state.title().replace('_', '')}Time", "Seconds", seconds)
+        Logger.log(f"{name} phase completed", duration=duration, polls=[p.to_dict() for p in polls], **annotations)
 
 class Poller:
     """Utility for exponential backoff state polling with execution guardrails."""
     @staticmethod
-    @tracer.capture_method
+    @capture_method
     def wait(action_name, check_fn, success_states, failure_states=None, 
-             initial_delay=2, max_delay=30, backoff_factor=1.5, max_attempts=20):
-        delay = initial_delay
+             initial_delay=2, max_delay=30, backoff_factor=1.5, max_attempts=20, history=None, history_key=None):
+        """
+        `history` (a CompletionHistory) replaces the fixed backoff with a schedule learned from
+        past completions of `history_key`, and records this completion's duration.
+        """
+        delays = history.delays(history_key, initial_delay, max_delay, backoff_factor) if history is not None else None
+        delay = next(delays) if delays else initial_delay
         attempts = 0
         start_time = time.time()
+        stats = PollStats(action_name)
+        # Attached to the enclosing orchestrator span (if any) so phase metrics include this wait.
+        if _active_span.get() is not None:
+            _active_span.get().append(stats)
         
         while attempts < max_attempts:
             state = check_fn()
+            stats.observe(state)
             if state in success_states:
                 duration = time.time() - start_time
-                Logger.log(f"{action_name} completed successfully", state=state, attempts=attempts, duration=duration)
+                Logger.log(f"{action_name} completed successfully", state=state, attempts=attempts, duration=duration,
+                           transitions=stats.transitions, over_sleep_estimate=stats.over_sleep_estimate)
+                if history is not None:
+                    # Midpoint of the last interval: the best estimate of when it actually finished.
+                    history.record(history_key, duration - stats.over_sleep_estimate)
                 return state
             if failure_states and state in failure_states:
-                Logger.log(f"{action_name} failed", level="ERROR", state=state, attempts=attempts)
+                Logger.log(f"{action_name} failed", level="ERROR", state=state, attempts=attempts,
+                           transitions=stats.transitions)
                 return state
                 
             attempts += 1
             Logger.log(f"{action_name} still in progress", state=state, next_wait=delay, attempt=attempts)
             time.sleep(delay)
-            delay = min(delay * backoff_factor, max_delay)
+            stats.last_delay = delay
+            delay = next(delays) if delays else min(delay * backoff_factor, max_delay)
         
         raise TimeoutError(f"{action_name} timed out after {max_attempts} attempts")
+
+def run_sync(coro):
+    """Sync shim: drives a coroutine to completion from synchronous handler code."""
+    return asyncio.run(coro)
+
+class MultiplexedPoller:
+    """
+    Waits on many resources from a single asyncio event loop. Resources are grouped by kind
+    (e.g. 'query', 'crawler'); one task per kind checks every pending resource with a single
+    batch call and resolves each waiter's future as soon as its resource finishes.
+    """
+    def __init__(self, sleep=None):
+        self._kinds = {}
+        self._sleep = sleep or asyncio.sleep
+
+    def register(self, kind, batch_check_fn, initial_delay=2, max_delay=30, backoff_factor=1.5, max_attempts=20):
+        """`batch_check_fn(ids) -> {id: state}` is a blocking call, run off the event loop."""
+        self._kinds[kind] = {
+            'check': batch_check_fn, 'initial_delay': initial_delay, 'max_delay': max_delay,
+            'backoff_factor': backoff_factor, 'max_attempts': max_attempts, 'pending': {}, 'task': None
+        }
+
+    async def wait(self, kind, resource_id, success_states, failure_states=None):
+        spec = self._kinds[kind]
+        loop = asyncio.get_running_loop()
+        entry = spec['pending'].setdefault(resource_id, {
+            'futures': [], 'success': success_states, 'failure': failure_states or [],
+            'attempts': 0, 'start_time': time.time()
+        })
+        future = loop.create_future()
+        entry['futures'].append(future)
+        task = spec['task']
+        if task is None or task.done() or task.get_loop() is not loop:
+            spec['task'] = loop.create_task(self._drive(kind))
+        return await future
+
+    async def _drive(self, kind):
+        spec = self._kinds[kind]
+        pending = spec['pending']
+        delay = spec['initial_delay']
+        while pending:
+            ids = list(pending)
+            try:
+                states = await asyncio.to_thread(spec['check'], ids)
+            except Exception as e:
+                Logger.log(f"Batch {kind} status check failed", level="ERROR", error=str(e))
+                for rid in ids:
+                    self._resolve(pending.pop(rid), exception=e)
+                # Waiters registered while the failed check was in flight keep being polled.
+                ids, states = [], {}
+
+            for rid in ids:
+                entry = pending[rid]
+                state = states.get(rid)
+                entry['attempts'] += 1
+                if state in entry['success'] or state in entry['failure']:
+                    failed = state in entry['failure']
+                    Logger.log(f"{kind} {rid} {'failed' if failed else 'completed successfully'}",
+                               level="ERROR" if failed else "INFO", state=state, attempts=entry['attempts'],
+                               duration=time.time() - entry['start_time'])
+                    self._resolve(pending.pop(rid), state=state)
+                elif entry['attempts'] >= spec['max_attempts']:
+                    self._resolve(pending.pop(rid), exception=TimeoutError(
+                        f"{kind} {rid} timed out after {spec['max_attempts']} attempts"))
+
+            if not pending:
+                break
+            Logger.log(f"{len(pending)} {kind} resources still in progress", next_wait=delay)
+            await self._sleep(delay)
+            delay = min(delay * spec['backoff_factor'], spec['max_delay'])
+        # No await between the emptiness check and here, so new waiters always see a finished task.
+        spec['task'] = None
+
+    @staticmethod
+    def _resolve(entry, state=None, exception=None):
+        for future in entry['futures']:
+            if future.done():
+                continue
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(state)
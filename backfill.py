@@ -0,0 +1,138 @@
+"""
+Historical Backfill Runner
+Role: Re-audits the retained snapshots of a date range (e.g. after the audit logic changes)
+with a bounded pool of in-process workers running the same `run_audit` path as the Lambda.
+Completed snapshots are recorded in the audit state store, so re-running the same command
+after an interruption only audits what is left. Runs locally or as the Fargate task image
+(see Dockerfile and docs/migration.md).
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from auditor.clients import get_client
+from auditor.config import AuditConfiguration
+from auditor.state import IdempotencyLedger
+from auditor.storage import S3ObjectStore, find_snapshot_exports
+from auditor.utils import Logger
+
+class BackfillContext:
+    """Lambda context stand-in for the engines that read it (sharded audits invoke AUDITOR_FUNCTION_NAME)."""
+    def __init__(self):
+        self.function_name = os.environ.get('AUDITOR_FUNCTION_NAME')
+
+class BackfillRunner:
+    """
+    Audits snapshots with at most `workers` in flight. Each snapshot is claimed in the ledger
+    first: completed snapshots are skipped, snapshots claimed by another live runner are left
+    to it, and failures release their claim so the next run retries them.
+    """
+    def __init__(self, audit_fn, ledger: IdempotencyLedger, workers: int = 4, clock=time.time):
+        self.audit_fn = audit_fn
+        self.ledger = ledger
+        self.workers = workers
+        self.clock = clock
+        self._lock = threading.Lock()
+
+    def run(self, snapshots):
+        snapshots = list(snapshots)
+        self.counts = {'total': len(snapshots), 'audited': 0, 'skipped': 0, 'claimed': 0, 'failed': 0}
+        self.failures = []
+        self.start_time = self.clock()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(self._audit, snapshots))
+        return dict(self.summary(), failures=self.failures)
+
+    def _audit(self, snapshot):
+        export_arn = snapshot['exportArn']
+        entry = self.ledger.claim(export_arn)
+        if entry is not None:
+            return self._finish('skipped' if entry['status'] == 'COMPLETED' else 'claimed', snapshot)
+        try:
+            response = self.audit_fn(snapshot)
+        except Exception as e:
+            response = {'statusCode': 500, 'body': str(e)}
+        if response.get('statusCode') == 200:
+            self.ledger.complete(export_arn, response)
+            return self._finish('audited', snapshot)
+        self.ledger.release(export_arn)
+        return self._finish('failed', snapshot, response)
+
+    def _finish(self, outcome, snapshot, response=None):
+        with self._lock:
+            self.counts[outcome] += 1
+            if response is not None:
+                self.failures.append({'export_arn': snapshot['exportArn'], 'response': response})
+            progress = self.summary()
+        Logger.log("Backfill progress", outcome=outcome, export_arn=snapshot['exportArn'],
+                   snapshot_date=snapshot.get('snapshot_date'), **progress)
+
+    def summary(self):
+        """Counts plus throughput (audits per minute) and an ETA from the audit rate so far."""
+        elapsed = max(self.clock() - self.start_time, 1e-9)
+        done = sum(v for k, v in self.counts.items() if k != 'total')
+        rate = self.counts['audited'] / elapsed
+        remaining = self.counts['total'] - done
+        eta = remaining / rate if rate else None
+        return dict(self.counts, done=done, elapsed_seconds=round(elapsed, 1),
+                    throughput_per_minute=round(rate * 60, 2),
+                    eta_seconds=round(eta, 1) if eta is not None else None)
+
+def audit_snapshot(snapshot, suite=False):
+    """Runs one audit in-process, scoped to the snapshot, exactly as the Lambda would for its event."""
+    # Imported here: the handler module builds its Powertools objects and clients on first use.
+    from privacy_auditor import run_audit
+    config = AuditConfiguration()
+    # A backfill worker waits in-process; checkpointed self-rescheduling is a Lambda-only mode.
+    config.audit_mode = 'blocking'
+    event = {"type": "AUDIT_SUITE" if suite else "SNAPSHOT_COMPLETE", "export_arn": snapshot['exportArn']}
+    return run_audit(event, BackfillContext(), config)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Historical Backfill Runner")
+    parser.add_argument("--start", required=True, type=date.fromisoformat, help="First snapshot date (YYYY-MM-DD)")
+    parser.add_argument("--end", required=True, type=date.fromisoformat, help="Last snapshot date (inclusive)")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Audits in flight (keep below the Athena DML concurrency quota)")
+    parser.add_argument("--run-id", default=None,
+                        help="Progress namespace; re-use it to resume, change it to re-audit (default: the date range)")
+    parser.add_argument("--suite", action="store_true", help="Run the default audit suite instead of the opt-out audit")
+    parser.add_argument("--include-incremental", action="store_true", help="Also audit incremental exports")
+    parser.add_argument("--lease", type=int, default=3600,
+                        help="Seconds after which a crashed worker's claim may be taken over")
+    parser.add_argument("--dry-run", action="store_true", help="List the matching snapshots and exit")
+    args = parser.parse_args(argv)
+
+    config = AuditConfiguration()
+    if not config.is_valid() or not config.data_lake_bucket:
+        print("Missing configuration: the Auditor environment (including DATA_LAKE_BUCKET) is required",
+              file=sys.stderr)
+        return 2
+
+    store = S3ObjectStore(get_client('s3'), config.data_lake_bucket)
+    snapshots = [s for s in find_snapshot_exports(store, args.start, args.end, config.export_prefix)
+                 if args.include_incremental or s.get('exportType', 'FULL_EXPORT') == 'FULL_EXPORT']
+    if args.dry_run:
+        for snapshot in snapshots:
+            print(json.dumps({k: snapshot.get(k) for k in ('snapshot_date', 'exportArn', 'exportType', 'itemCount')}))
+        return 0
+
+    from privacy_auditor import build_state_store
+    run_id = args.run_id or f"{args.start}_{args.end}{'_suite' if args.suite else ''}"
+    ledger = IdempotencyLedger(build_state_store(config), lease=args.lease, namespace=f"backfill#{run_id}")
+    Logger.log("Backfill started", run_id=run_id, snapshots=len(snapshots), workers=args.workers)
+    summary = BackfillRunner(lambda s: audit_snapshot(s, args.suite), ledger, args.workers).run(snapshots)
+    Logger.log("Backfill finished", run_id=run_id, **summary)
+    # No handler decorator flushes the audits' EMF metrics here.
+    from auditor.utils import metrics
+    metrics.flush_metrics()
+    return 1 if summary['failed'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Cold-Start Benchmark
+Measures handler import time and first (cold) vs second (warm) invocation latency, each run
+in a fresh interpreter, with boto3 clients mocked as in mock_local_test.py. Compares medians
+against a saved baseline so regressions surface before provisionedConcurrency is lowered.
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from unittest.mock import MagicMock, patch
+
+TARGETS = {
+    'auditor': ('privacy_auditor', 'lambda_handler', {"type": "SNAPSHOT_COMPLETE"}),
+    'snapshot': ('snapshot_entrypoint', 'start_snapshot', {}),
+}
+
+MOCK_ENV = {
+    "AWS_REGION": "us-east-1",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "TABLE_NAME": "mock_table",
+    "DATA_LAKE_BUCKET": "mock-bucket",
+    "CRAWLER_NAME": "mock-crawler",
+    "DATABASE_NAME": "mock_db",
+    "ATHENA_OUTPUT": "s3://mock-results/results/",
+}
+
+def _fake_client(service_name, **kwargs):
+    client = MagicMock()
+    client.get_crawler.return_value = {'Crawler': {'State': 'READY'}}
+    client.start_query_execution.return_value = {'QueryExecutionId': 'q-bench'}
+    client.get_query_execution.return_value = {'QueryExecution': {'Status': {'State': 'SUCCEEDED'}}}
+    client.get_caller_identity.return_value = {'Account': '123456789012'}
+    client.export_table_to_point_in_time.return_value = {'ExportDescription': {'ExportArn': 'arn:bench'}}
+    return client
+
+def measure_once(target):
+    """Child process body: one cold import plus a cold and a warm invocation."""
+    module_name, handler_name, event = TARGETS[target]
+    os.environ.update(MOCK_ENV)
+    context = MagicMock()
+    context.aws_request_id = "bench"
+    context.function_name = "bench"
+    context.invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:bench"
+
+    # Handlers print EMF/JSON logs; keep stdout clean for the measurement line.
+    with patch('boto3.client', side_effect=_fake_client) as boto_client, \
+            contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        handler = getattr(importlib.import_module(module_name), handler_name)
+        imported = time.perf_counter()
+        handler(event, context)
+        first = time.perf_counter()
+        clients_cold = boto_client.call_count
+        handler(event, context)
+        warm = time.perf_counter()
+
+    return {
+        'import_ms': (imported - start) * 1000,
+        'first_invocation_ms': (first - imported) * 1000,
+        'warm_invocation_ms': (warm - first) * 1000,
+        'clients_created_cold': clients_cold,
+        'clients_created_warm': boto_client.call_count - clients_cold,
+    }
+
+def run_benchmark(targets, runs):
+    # Imported here, not at module scope, so the measured child interpreters do not load it.
+    from auditor.polling import percentile
+    results = {}
+    for target in targets:
+        samples = []
+        for _ in range(runs):
+            out = subprocess.run([sys.executable, __file__, '--child', target],
+                                 capture_output=True, text=True, check=True)
+            samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        results[target] = {
+            key: {
+                'p50': statistics.median(s[key] for s in samples),
+                'p95': percentile([s[key] for s in samples], 0.95),
+            }
+            for key in samples[0]
+        }
+    return results
+
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for target, metrics in results.items():
+        for key, stats in metrics.items():
+            reference = baseline.get(target, {}).get(key, {}).get('p50')
+            if reference is None:
+                continue
+            # Client counts must not grow at all; timings get the relative tolerance (plus 1ms of noise).
+            limit = reference if key.startswith('clients') else reference * (1 + tolerance) + 1
+            if stats['p50'] > limit:
+                regressions.append(f"{target}.{key}: p50 {stats['p50']:.2f} > baseline {reference:.2f}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lambda Cold-Start Benchmark")
+    parser.add_argument("--child", choices=list(TARGETS), help=argparse.SUPPRESS)
+    parser.add_argument("--targets", nargs="+", default=list(TARGETS), choices=list(TARGETS))
+    parser.add_argument("--runs", type=int, default=10, help="Fresh interpreters per target")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", help="Write the results as a new baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative p50 regression")
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_once(args.child)))
+        sys.exit(0)
+
+    print(f"--- Cold-Start Benchmark ({args.runs} fresh interpreters per handler) ---")
+    results = run_benchmark(args.targets, args.runs)
+    for target, metrics in results.items():
+        print(f"\n{target}:")
+        for key, stats in metrics.items():
+            print(f"  {key:<24} p50={stats['p50']:>9.2f}  p95={stats['p95']:>9.2f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nREGRESSION DETECTED:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo cold-start regressions against baseline.")
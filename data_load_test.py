@@ -1,64 +1,206 @@
 """
 DynamoDB Volume Load Testing Utility
 Benchmarks Data Catalog discovery and Athena performance by ingesting large record volumes.
+Batches are pre-generated by a producer thread and written by a pool of workers under a
+target-rate limiter; unprocessed items are retried with jittered exponential backoff.
 """
 
 import boto3
 import time
 import argparse
+import queue
 import random
+import threading
 import uuid
-import os
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from botocore.exceptions import ClientError
 
-def create_mock_record():
+from auditor.polling import percentile
+
+BATCH_SIZE = 25 # Maximum allowed by AWS DynamoDB BatchWriteItem
+RETRYABLE_ERRORS = ('ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded')
+DEFAULT_ACTIONS = 'opt_in=0.45,opt_out=0.45,preference_update=0.10'
+
+def parse_weights(spec):
+    """Parses 'opt_in=0.45,opt_out=0.45,...' into parallel value and weight lists."""
+    pairs = [part.split('=') for part in spec.split(',') if part]
+    return [name for name, _ in pairs], [float(weight) for _, weight in pairs]
+
+class RecordGenerator:
     """
-    Generates a realistic synthetic privacy signal record for high-volume testing.
+    Produces record batches in bulk. User ids come from a pre-generated pool (a `hot_key_ratio`
+    share of records hits the first `hot_keys` users) and timestamps are formatted once per
+    second of a synthetic clock, so the sort key stays unique without per-item strftime calls.
     """
-    return {
-        'user_id': {'S': str(uuid.uuid4())},
-        'timestamp': {'S': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())},
-        'action': {'S': random.choice(['opt_in', 'opt_out', 'preference_update'])},
-        'source': {'S': 'mission_critical_load_test'},
-        'is_mock': {'BOOL': True}
-    }
-
-def load_data(table_name, count):
+    def __init__(self, count, distinct_users=None, hot_keys=10, hot_key_ratio=0.0, actions=DEFAULT_ACTIONS, seed=None):
+        self.rng = random.Random(seed)
+        self.count = count
+        self.hot_keys = max(1, hot_keys)
+        self.hot_key_ratio = hot_key_ratio
+        pool_size = max(self.hot_keys, distinct_users or count)
+        self.users = [{'S': str(uuid.UUID(int=self.rng.getrandbits(128), version=4))} for _ in range(pool_size)]
+        names, self.action_weights = parse_weights(actions)
+        # Attribute values are immutable for boto3, so every record shares these dicts.
+        self.actions = [{'S': name} for name in names]
+        self.source = {'S': 'mission_critical_load_test'}
+        self.is_mock = {'BOOL': True}
+        self.base_epoch = int(time.time()) - count // 1000 - 1
+
+    def _timestamps(self, start, size):
+        stamps = []
+        second, prefix = None, None
+        for seq in range(start, start + size):
+            if seq // 1000 != second:
+                second = seq // 1000
+                prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(self.base_epoch + second))
+            stamps.append({'S': f"{prefix}.{seq % 1000:03d}Z"})
+        return stamps
+
+    def batch(self, start, size):
+        hot = self.rng.choices((True, False), weights=(self.hot_key_ratio, 1 - self.hot_key_ratio), k=size)
+        users = [self.users[self.rng.randrange(self.hot_keys)] if h else self.rng.choice(self.users) for h in hot]
+        actions = self.rng.choices(self.actions, weights=self.action_weights, k=size)
+        return [
+            {'PutRequest': {'Item': {'user_id': u, 'timestamp': ts, 'action': a,
+                                     'source': self.source, 'is_mock': self.is_mock}}}
+            for u, ts, a in zip(users, self._timestamps(start, size), actions)
+        ]
+
+    def batches(self):
+        for start in range(0, self.count, BATCH_SIZE):
+            yield self.batch(start, min(BATCH_SIZE, self.count - start))
+
+class RateLimiter:
     """
-    Executes a high-volume batch write operation to the target DynamoDB table.
+    Thread-safe token bucket limiting items per second (rate <= 0 disables limiting). The bucket
+    holds max(rate, n) tokens for a request of n, so a full batch still goes through (one batch
+    every n / rate seconds) when the rate is below the batch size.
     """
-    print(f"--- Data Load Started ---")
-    print(f"Table: {table_name}")
-    print(f"Count: {count}")
-    
-    dynamodb = boto3.client('dynamodb')
-    batch_size = 25 # Maximum allowed by AWS DynamoDB BatchWriteItem
-    loaded = 0
-    start_time = time.time()
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(max(self.rate, n), self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait)
+
+class LoadStats:
+    """Thread-safe counters and per-batch latency samples."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.loaded = 0
+        self.failed = 0
+        self.retries = 0
+
+    def record(self, latency, written, failed, retries):
+        with self.lock:
+            self.latencies.append(latency)
+            self.loaded += written
+            self.failed += failed
+            self.retries += retries
 
-    for i in range(0, count, batch_size):
-        request_items = []
-        for _ in range(min(batch_size, count - loaded)):
-            request_items.append({'PutRequest': {'Item': create_mock_record()}})
-        
+    def percentile(self, p):
+        return percentile(self.latencies, p)
+
+    def histogram(self, buckets_ms=(5, 10, 25, 50, 100, 250, 500, 1000, 2500)):
+        counts = [0] * (len(buckets_ms) + 1)
+        for latency in self.latencies:
+            ms = latency * 1000
+            counts[next((i for i, b in enumerate(buckets_ms) if ms <= b), len(buckets_ms))] += 1
+        labels = [f"<= {b}ms" for b in buckets_ms] + [f"> {buckets_ms[-1]}ms"]
+        return list(zip(labels, counts))
+
+def write_batch(dynamodb, table_name, requests, stats, max_retries=8, base_delay=0.05, max_delay=5.0):
+    """Writes one batch, retrying UnprocessedItems and throttling errors with full-jitter backoff."""
+    start = time.perf_counter()
+    pending, retries = requests, 0
+    for attempt in range(max_retries + 1):
         try:
-            dynamodb.batch_write_item(RequestItems={table_name: request_items})
-            loaded += len(request_items)
-            if loaded % 100 == 0:
-                print(f"Success: Ingested {loaded}/{count} records...")
-        except Exception as e:
-            print(f"CRITICAL ERROR: Batch write failure: {str(e)}")
+            response = dynamodb.batch_write_item(RequestItems={table_name: pending})
+            pending = response.get('UnprocessedItems', {}).get(table_name, [])
+        except ClientError as e:
+            if e.response['Error']['Code'] not in RETRYABLE_ERRORS:
+                print(f"CRITICAL ERROR: Batch write failure: {str(e)}")
+                break
+        if not pending or attempt == max_retries:
             break
+        retries += 1
+        time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+    stats.record(time.perf_counter() - start, len(requests) - len(pending), len(pending), retries)
+
+def load_data(table_name, count, workers=8, rate=0, hot_keys=10, hot_key_ratio=0.0,
+              actions=DEFAULT_ACTIONS, distinct_users=None, max_retries=8, seed=None, dynamodb=None):
+    """
+    Executes a high-volume concurrent batch write load against the target DynamoDB table.
+    """
+    print(f"--- Data Load Started ---")
+    print(f"Table: {table_name}")
+    print(f"Count: {count} (workers={workers}, rate={rate or 'unlimited'} items/s, hot_key_ratio={hot_key_ratio})")
+
+    dynamodb = dynamodb or boto3.client('dynamodb', config=Config(max_pool_connections=workers))
+    generator = RecordGenerator(count, distinct_users, hot_keys, hot_key_ratio, actions, seed)
+    limiter = RateLimiter(rate)
+    stats = LoadStats()
+    # Bounded so the producer stays a few batches ahead of the writers without buffering the whole run.
+    batches = queue.Queue(maxsize=workers * 4)
+
+    def produce():
+        for batch in generator.batches():
+            batches.put(batch)
+        for _ in range(workers):
+            batches.put(None)
+
+    def consume():
+        while (batch := batches.get()) is not None:
+            limiter.acquire(len(batch))
+            write_batch(dynamodb, table_name, batch, stats, max_retries)
+
+    start_time = time.time()
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(consume) for _ in range(workers)]:
+            future.result()
+    producer.join()
 
     total_time = time.time() - start_time
     print(f"\nLoad Test Completed!")
-    print(f"Final Count: {loaded} records")
+    print(f"Final Count: {stats.loaded} records ({stats.failed} failed after retries, {stats.retries} retries)")
     print(f"Duration: {total_time:.2f}s")
-    print(f"Throughput: {loaded / total_time:.2f} items/sec")
+    print(f"Throughput: {stats.loaded / total_time:.2f} items/sec")
+    print(f"Batch Latency: p50={stats.percentile(0.5) * 1000:.1f}ms "
+          f"p95={stats.percentile(0.95) * 1000:.1f}ms p99={stats.percentile(0.99) * 1000:.1f}ms")
+    for label, n in stats.histogram():
+        print(f"  {label:>10} | {n}")
+    return stats
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="DynamoDB Data Loading Utility")
     parser.add_argument("--table", default="privacy-signal-analyzer-logs-dev", help="Target DynamoDB Table Name")
     parser.add_argument("--count", type=int, default=1000, help="Total synthetic record count")
-    
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent BatchWriteItem workers")
+    parser.add_argument("--rate", type=float, default=0, help="Target items/sec (0 = unlimited)")
+    parser.add_argument("--hot-keys", type=int, default=10, help="Size of the hot user_id set")
+    parser.add_argument("--hot-key-ratio", type=float, default=0.0, help="Share of records written to hot users")
+    parser.add_argument("--distinct-users", type=int, default=None, help="User id pool size (default: --count)")
+    parser.add_argument("--actions", default=DEFAULT_ACTIONS, help="Action skew as name=weight pairs")
+    parser.add_argument("--max-retries", type=int, default=8, help="Retries per batch for unprocessed items")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible record streams")
+
     args = parser.parse_args()
-    load_data(args.table, args.count)
+    load_data(args.table, args.count, args.workers, args.rate, args.hot_keys, args.hot_key_ratio,
+              args.actions, args.distinct_users, args.max_retries, args.seed)
@@ -0,0 +1,168 @@
+"""
+Synthetic DynamoDB Export Generator
+Writes a realistic full-export tree (manifest-summary.json, manifest-files.json and gzipped
+DYNAMODB_JSON data files) to local disk for offline scale testing of the audit engines.
+Each data file is produced by its own worker process and streamed to disk in chunks, so
+memory stays flat regardless of the total record count. The export time is an input (a fixed
+default), so the same seed reproduces the same export.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from auditor.storage import snapshot_prefix
+from data_load_test import DEFAULT_ACTIONS, parse_weights
+
+DEFAULT_SOURCES = 'mission_critical_load_test=1'
+# 2026-01-01T00:00:00Z; exports default to this time rather than the wall clock.
+DEFAULT_EXPORT_TIME = 1_767_225_600
+CHUNK_SIZE = 10000
+# Odd multiplier: (index * MULTIPLIER + salt) mod 2^128 is a bijection, so distinct user
+# indexes always map to distinct UUID-shaped ids without keeping a pool in memory.
+MULTIPLIER = 0x9E3779B97F4A7C15F39CC0605CEDC835
+MASK_128 = (1 << 128) - 1
+
+# Same item shape as data_load_test.RecordGenerator (millisecond timestamps), serialized
+# without per-item json.dumps.
+LINE_TEMPLATE = ('{"Item":{"user_id":{"S":"%s"},"timestamp":{"S":"%s"},"action":{"S":%s},'
+                 '"source":{"S":%s},"is_mock":{"BOOL":true}}}\n')
+
+def user_id(index, salt):
+    h = f"{(index * MULTIPLIER + salt) & MASK_128:032x}"
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+def write_data_file(path, file_index, start, end, spec):
+    """Writes records [start, end) to one gzipped data file and returns its manifest entry."""
+    rng = random.Random(f"{spec['seed']}:{file_index}")
+    actions = [json.dumps(a) for a in spec['actions']]
+    sources = [json.dumps(s) for s in spec['sources']]
+    distinct_users = spec['distinct_users']
+    span, count = spec['days'] * 86400 * 1000, spec['count']
+    second, prefix = None, None
+    raw_bytes = 0
+
+    with gzip.open(path, 'wt', encoding='utf-8', compresslevel=spec['compresslevel']) as f:
+        for chunk_start in range(start, end, CHUNK_SIZE):
+            size = min(CHUNK_SIZE, end - chunk_start)
+            users = ([rng.randrange(distinct_users) for _ in range(size)] if distinct_users
+                     else range(chunk_start, chunk_start + size))
+            chunk_actions = rng.choices(actions, weights=spec['action_weights'], k=size)
+            chunk_sources = rng.choices(sources, weights=spec['source_weights'], k=size)
+            lines = []
+            for offset, (user, action, source) in enumerate(zip(users, chunk_actions, chunk_sources)):
+                # Records are spread evenly over the window in index order, so each second is formatted once.
+                millis = spec['start_epoch'] * 1000 + (chunk_start + offset) * span // count
+                if millis // 1000 != second:
+                    second = millis // 1000
+                    prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))
+                stamp = f"{prefix}.{millis % 1000:03d}Z"
+                lines.append(LINE_TEMPLATE % (user_id(user, spec['salt']), stamp, action, source))
+            block = ''.join(lines)
+            raw_bytes += len(block)
+            f.write(block)
+
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            md5.update(block)
+    return {'itemCount': end - start, 'md5Checksum': md5.hexdigest(), 'rawBytes': raw_bytes}
+
+def parse_export_time(value):
+    """Epoch seconds from `--export-time`: epoch seconds or an ISO-8601 time (UTC unless it has an offset)."""
+    try:
+        return int(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        return int((parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp())
+
+def generate_export(output, count, files=8, workers=None, seed=0, actions=DEFAULT_ACTIONS, sources=DEFAULT_SOURCES,
+                    distinct_users=None, days=1, prefix="exports/", table="privacy-signal-analyzer-logs-dev",
+                    compresslevel=6, export_time=DEFAULT_EXPORT_TIME, daily_prefix=False):
+    """
+    Generates one full export under `<output>/<prefix>AWSDynamoDB/<export_id>/` and returns its
+    summary. With `daily_prefix` the export goes under the per-day `<prefix>snapshot_date=YYYY-MM-DD/`
+    prefix of its export time, as the snapshot stage writes it.
+    """
+    export_time = int(export_time)
+    if daily_prefix:
+        prefix = snapshot_prefix(datetime.fromtimestamp(export_time, tz=timezone.utc), prefix)
+    seeded = random.Random(seed)
+    export_id = f"{export_time * 1000:014d}-{seeded.getrandbits(32):08x}"
+    export_key = f"{prefix}AWSDynamoDB/{export_id}"
+    export_dir = os.path.join(output, *export_key.split('/'))
+    os.makedirs(os.path.join(export_dir, 'data'), exist_ok=True)
+
+    action_names, action_weights = parse_weights(actions)
+    source_names, source_weights = parse_weights(sources)
+    spec = {
+        'seed': seed, 'salt': seeded.getrandbits(128), 'count': count, 'days': days,
+        'start_epoch': export_time - days * 86400, 'distinct_users': distinct_users,
+        'actions': action_names, 'action_weights': action_weights,
+        'sources': source_names, 'source_weights': source_weights, 'compresslevel': compresslevel,
+    }
+
+    files = max(1, min(files, count or 1))
+    bounds = [count * i // files for i in range(files + 1)]
+    keys = [f"{export_key}/data/part-{i:05d}.json.gz" for i in range(files)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(write_data_file, os.path.join(output, *key.split('/')), i, bounds[i], bounds[i + 1], spec)
+                   for i, key in enumerate(keys)]
+        entries = [future.result() for future in futures]
+
+    with open(os.path.join(export_dir, 'manifest-files.json'), 'w') as f:
+        for key, entry in zip(keys, entries):
+            f.write(json.dumps({'itemCount': entry['itemCount'], 'md5Checksum': entry['md5Checksum'],
+                                'etag': entry['md5Checksum'], 'dataFileS3Key': key}) + "\n")
+
+    region, account = "us-east-1", "123456789012"
+    table_arn = f"arn:aws:dynamodb:{region}:{account}:table/{table}"
+    iso = lambda epoch: time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(epoch))
+    summary = {
+        'version': '2020-06-30', 'exportArn': f"{table_arn}/export/{export_id}",
+        'startTime': iso(export_time), 'endTime': iso(export_time),
+        'tableArn': table_arn, 'exportTime': iso(export_time), 's3Bucket': 'local', 's3Prefix': prefix.rstrip('/'),
+        's3SseAlgorithm': 'AES256', 'manifestFilesS3Key': f"{export_key}/manifest-files.json",
+        'billedSizeBytes': sum(e['rawBytes'] for e in entries), 'itemCount': count,
+        'outputFormat': 'DYNAMODB_JSON', 'exportType': 'FULL_EXPORT',
+    }
+    with open(os.path.join(export_dir, 'manifest-summary.json'), 'w') as f:
+        json.dump(summary, f)
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic DynamoDB Export Generator")
+    parser.add_argument("--output", default="./synthetic-lake", help="Local directory standing in for the data lake bucket")
+    parser.add_argument("--count", type=int, default=1000000, help="Total record count")
+    parser.add_argument("--files", type=int, default=16, help="Number of gzipped data files")
+    parser.add_argument("--workers", type=int, default=None, help="Writer processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed; the same seed reproduces the same export")
+    parser.add_argument("--actions", default=DEFAULT_ACTIONS, help="Action distribution as name=weight pairs")
+    parser.add_argument("--sources", default=DEFAULT_SOURCES, help="Source distribution as name=weight pairs")
+    parser.add_argument("--distinct-users", type=int, default=None,
+                        help="Draw user ids from this many users (duplicates); default is one user per record")
+    parser.add_argument("--days", type=int, default=1, help="Timestamp window ending at the export time")
+    parser.add_argument("--prefix", default="exports/", help="Export prefix inside the output directory")
+    parser.add_argument("--compresslevel", type=int, default=6, help="gzip level (1 is fastest)")
+    parser.add_argument("--export-time", type=parse_export_time, default=DEFAULT_EXPORT_TIME,
+                        help="Export time as epoch seconds or ISO-8601 (default 2026-01-01T00:00:00Z)")
+    parser.add_argument("--daily-prefix", action="store_true",
+                        help="Write under the per-day snapshot_date=YYYY-MM-DD/ prefix of the export time")
+    args = parser.parse_args()
+
+    print(f"--- Generating {args.count} records into {args.output} ---")
+    start = time.time()
+    summary = generate_export(args.output, args.count, args.files, args.workers, args.seed, args.actions,
+                              args.sources, args.distinct_users, args.days, args.prefix,
+                              compresslevel=args.compresslevel, export_time=args.export_time,
+                              daily_prefix=args.daily_prefix)
+    duration = time.time() - start
+    print(f"Export: {summary['exportArn']}")
+    print(f"Duration: {duration:.2f}s ({args.count / duration:.0f} records/sec)")
+    print(f"Uncompressed Size: {summary['billedSizeBytes'] / 1e6:.1f} MB")
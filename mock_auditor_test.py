@@ -0,0 +1,1085 @@
+import os
+
+# Mock environment initialization (MUST be before imports that initialize boto3)
+os.environ["AWS_REGION"] = "us-east-1"
+os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+import asyncio
+import gzip
+import threading
+import time
+import io
+import json
+import random
+import re
+import tempfile
+import uuid
+import unittest
+from unittest.mock import MagicMock, patch
+
+from auditor.analytics import (StreamingAnalyticsService, AuditAggregate, ShardedAnalyticsService,
+                               ProcessPoolShardExecutor, LambdaShardExecutor, audit_shard)
+from auditor.config import AuditConfiguration
+from botocore.exceptions import ClientError
+from auditor.discovery import (StaticDiscoveryService, CatalogDiscoveryService, GlueDAO,
+                               AsyncGlueDiscoveryService)
+from auditor.discovery import schema
+from auditor.analytics import (AthenaDAO, AsyncAthenaAnalyticsService, AthenaAnalyticsService, CachedAnalyticsService,
+                               IncrementalAnalyticsService, ScanAnalyticsService, EffectiveConsentService,
+                               ConsentStateIndex)
+from auditor.analytics.cache import pending_key
+from auditor.state import InMemoryStateStore, SQLiteStateStore
+from auditor.utils import Logger, MultiplexedPoller, Poller, run_sync
+from auditor.polling import CompletionHistory, query_template_key
+from auditor.suite import AuditQuery, AuditSuite, DAILY_ROLLUP, DEFAULT_SUITE
+from auditor.orchestrator import ComplianceAuditOrchestrator, ResumableAuditOrchestrator
+from auditor.scheduler import LocalResumeScheduler
+from auditor.rollup import SQLiteRollupStore, ObjectRollupStore
+from auditor.storage import LocalObjectStore, ExportReader, LocalTableReader, DynamoTableReader, find_snapshot_exports
+
+def make_item(user_id, action, source="web", timestamp="2026-01-01T00:00:00Z"):
+    return {
+        'user_id': {'S': user_id},
+        'timestamp': {'S': timestamp},
+        'action': {'S': action},
+        'source': {'S': source},
+        'is_mock': {'BOOL': True}
+    }
+
+def write_export(root, export_id, files, prefix="exports/", export_type="FULL_EXPORT", summary=None):
+    """
+    Writes a DYNAMODB_JSON export tree (gzipped data files plus manifests) under root.
+    Incremental exports take (old_item, new_item) pairs instead of items; `summary` adds
+    manifest summary fields (exportTime, exportFromTime, exportToTime, ...).
+    """
+    export_key = f"{prefix}AWSDynamoDB/{export_id}"
+    export_dir = os.path.join(root, *export_key.split('/'))
+    os.makedirs(os.path.join(export_dir, 'data'), exist_ok=True)
+    entries = []
+    billed_bytes = 0
+    for i, items in enumerate(files):
+        key = f"{export_key}/data/part-{i}.json.gz"
+        with gzip.open(os.path.join(root, *key.split('/')), 'wt') as f:
+            for item in items:
+                if export_type == "INCREMENTAL_EXPORT":
+                    old_item, new_item = item
+                    record = {"Keys": {"user_id": (new_item or old_item)["user_id"]}}
+                    record.update({k: v for k, v in (("OldImage", old_item), ("NewImage", new_item)) if v})
+                else:
+                    record = {"Item": item}
+                billed_bytes += f.write(json.dumps(record) + "\n")
+        entries.append({"itemCount": len(items), "dataFileS3Key": key})
+    with open(os.path.join(export_dir, 'manifest-files.json'), 'w') as f:
+        f.writelines(json.dumps(e) + "\n" for e in entries)
+    with open(os.path.join(export_dir, 'manifest-summary.json'), 'w') as f:
+        json.dump({"exportArn": f"arn:aws:dynamodb:us-east-1:123456789012:table/t/export/{export_id}",
+                   "exportType": export_type,
+                   "itemCount": sum(e["itemCount"] for e in entries),
+                   "billedSizeBytes": billed_bytes,
+                   "manifestFilesS3Key": f"{export_key}/manifest-files.json", **(summary or {})}, f)
+    return export_dir
+
+class TestStreamingAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        write_export(self.tmp.name, "01700000000000-aaaa", [
+            [make_item("u1", "opt_out"), make_item("u2", "opt_in")],
+            [make_item("u3", "opt_out", source="app"), make_item("u4", "preference_update")],
+        ])
+        self.service = StreamingAnalyticsService(ExportReader(LocalObjectStore(self.tmp.name)))
+
+    def test_opt_out_audit_matches_athena_count(self):
+        env = {"CRAWLER_NAME": "c", "DATABASE_NAME": "db", "TABLE_NAME": "t", "ATHENA_OUTPUT": "s3://out/"}
+        with patch.dict(os.environ, env):
+            config = AuditConfiguration()
+        orchestrator = ComplianceAuditOrchestrator(StaticDiscoveryService(), self.service)
+        query_id, status = orchestrator.run_opt_out_audit(config)
+
+        self.assertEqual(status, 'SUCCEEDED')
+        self.assertEqual(self.service.get_result(query_id), 2)
+
+    def test_filters_and_unsupported_queries(self):
+        query_id = self.service.run_query(
+            "SELECT count(*) FROM \"db\".\"t\" WHERE action = 'opt_out' AND source = 'app'", "db", "")
+        self.assertEqual(self.service.get_result(query_id), 1)
+
+        query_id = self.service.run_query("SELECT user_id FROM t", "db", "")
+        self.assertEqual(self.service.wait_completion(query_id), 'FAILED')
+
+    def test_aggregate_round_trip_and_merge(self):
+        aggregate = AuditAggregate.from_dict(self.service.aggregate().to_dict())
+        aggregate.merge(self.service.aggregate())
+        self.assertEqual(aggregate.total, 8)
+        self.assertEqual(aggregate.count(action='opt_out'), 4)
+
+class TestScanAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        self.items = [make_item(f"u{i}", ("opt_out", "opt_in", "preference_update")[i % 3],
+                                source=("web", "app")[i % 2]) for i in range(30)]
+
+    def test_segments_cover_table_once(self):
+        service = ScanAnalyticsService(LocalTableReader(self.items), "t", segments=4)
+        aggregate = service.aggregate()
+
+        self.assertEqual(aggregate.total, 30)
+        self.assertEqual(aggregate.count(action='opt_out'), 10)
+        query_id = service.run_query("SELECT count(*) FROM t WHERE action = 'opt_out' AND source = 'web'", "db", "")
+        self.assertEqual(service.get_result(query_id), 5)
+
+    def test_adaptive_engine_switches_on_table_size(self):
+        from privacy_auditor import resolve_audit_engine
+        env = {"AUDIT_ENGINE": "adaptive", "TABLE_NAME": "t", "SCAN_MAX_ITEMS": "30"}
+        with patch.dict(os.environ, env):
+            config = AuditConfiguration()
+        self.assertEqual(resolve_audit_engine(config, LocalTableReader(self.items)), 'scan')
+        self.assertEqual(resolve_audit_engine(config, LocalTableReader(self.items * 2)), 'athena')
+
+    def test_dynamo_reader_projects_reserved_words(self):
+        ddb = MagicMock()
+        ddb.get_paginator.return_value.paginate.return_value = [{'Items': self.items[:2]}, {'Items': []}]
+        items = list(DynamoTableReader(ddb).scan_segment("t", 1, 4, attributes=("action", "source")))
+
+        self.assertEqual(len(items), 2)
+        ddb.get_paginator.return_value.paginate.assert_called_once_with(
+            TableName="t", Segment=1, TotalSegments=4, ProjectionExpression="#a0, #a1",
+            ExpressionAttributeNames={"#a0": "action", "#a1": "source"})
+
+class TestExportGenerator(unittest.TestCase):
+
+    def test_generated_export_is_readable_and_deterministic(self):
+        from data_load_test import RecordGenerator
+        from export_generator import generate_export
+        trees = []
+        for workers in (1, 2):
+            tmp = tempfile.TemporaryDirectory()
+            self.addCleanup(tmp.cleanup)
+            summary = generate_export(tmp.name, 1000, files=3, workers=workers, seed=7, actions="opt_out=1",
+                                      distinct_users=50, export_time=1_700_000_000)
+            trees.append((tmp.name, summary))
+
+        reader = ExportReader(LocalObjectStore(trees[0][0]))
+        items = list(reader.iter_items())
+        self.assertEqual(len(items), 1000)
+        load_item = RecordGenerator(1, seed=7).batch(0, 1)[0]['PutRequest']['Item']
+        self.assertEqual(set(items[0]), set(load_item))
+        self.assertRegex(items[1]['timestamp']['S'], r'^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}Z$')
+        self.assertEqual(len(items[0]['timestamp']['S']), len(load_item['timestamp']['S']))
+        self.assertLessEqual(len({item['user_id']['S'] for item in items}), 50)
+        self.assertEqual(StreamingAnalyticsService(reader).aggregate().count(action='opt_out'), 1000)
+        self.assertEqual(trees[0][1]['exportArn'], trees[1][1]['exportArn'])
+        self.assertEqual(items, list(ExportReader(LocalObjectStore(trees[1][0])).iter_items()))
+
+    def test_export_time_and_daily_prefix(self):
+        from datetime import date
+        from auditor.storage import find_snapshot_exports
+        from export_generator import generate_export, parse_export_time
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.assertEqual(generate_export(tmp.name, 10, files=1, workers=1, seed=3),
+                         generate_export(tmp.name, 10, files=1, workers=1, seed=3))
+
+        export_time = parse_export_time("2026-03-04T05:06:07Z")
+        summary = generate_export(tmp.name, 10, files=1, workers=1, export_time=export_time, daily_prefix=True)
+        self.assertEqual((summary['exportTime'], summary['s3Prefix']),
+                         ("2026-03-04T05:06:07.000Z", "exports/snapshot_date=2026-03-04"))
+        found = list(find_snapshot_exports(LocalObjectStore(tmp.name), date(2026, 3, 4), date(2026, 3, 4)))
+        self.assertEqual([e['exportArn'] for e in found], [summary['exportArn']])
+
+class TestEffectiveConsent(unittest.TestCase):
+
+    def test_counts_users_by_latest_signal(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        write_export(tmp.name, "01700000000000-aaaa", [
+            [make_item("u1", "opt_in", timestamp="2026-01-02T00:00:00Z"),
+             make_item("u2", "opt_out", source="app"),
+             make_item("u3", "opt_in", timestamp="2026-01-01T00:00:00.500Z")],
+            # Files are not in time order: u1's opt-out is older than its opt-in.
+            [make_item("u1", "opt_out", timestamp="2026-01-01T00:00:00Z"),
+             make_item("u3", "opt_out", timestamp="2026-01-01T00:00:00.900Z")],
+        ])
+        service = EffectiveConsentService(ExportReader(LocalObjectStore(tmp.name)), "01700000000000-aaaa")
+
+        query_id = service.run_query("SELECT count(*) FROM t WHERE action = 'opt_out'", "db", "")
+        self.assertEqual(service.get_result(query_id), 2)
+        self.assertEqual(service.aggregate().counts, {('opt_in', 'web'): 1, ('opt_out', 'app'): 1, ('opt_out', 'web'): 1})
+        self.assertEqual(service.consent_index().get("u1")[0], 'opt_in')
+        self.assertIsNone(service.consent_index().get("u9"))
+
+    def test_athena_rows_and_growth(self):
+        rows = [{'user_id': f"00000000-0000-4000-8000-{i:012d}", 'action': 'opt_out', 'source': 'web',
+                 'timestamp': "2026-01-01T00:00:00Z"} for i in range(5000)]
+        rows += [dict(rows[0], action='opt_in', timestamp="2026-02-01T00:00:00Z")]
+        index = ConsentStateIndex.from_rows(rows, capacity=16)
+
+        self.assertEqual(len(index), 5000)
+        self.assertEqual(index.counts(), {('opt_out', 'web'): 4999, ('opt_in', 'web'): 1})
+        self.assertLess(index.memory_bytes() / len(index), 64)
+
+class TestShardedAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = LocalObjectStore(self.tmp.name)
+        files = [[make_item(f"u{f}-{i}", "opt_out" if i % 3 == 0 else "opt_in") for i in range(f + 3)]
+                 for f in range(5)]
+        write_export(self.tmp.name, "01700000000000-old", files[:1])
+        write_export(self.tmp.name, "01700000009999-new", files)
+
+    def test_process_pool_reducer_matches_single_pass(self):
+        expected = StreamingAnalyticsService(ExportReader(self.store, "exports/AWSDynamoDB/01700000009999-new/"))
+        sharded = ShardedAnalyticsService(ExportReader(self.store), ProcessPoolShardExecutor(self.store, 2), 3)
+
+        self.assertEqual(sharded.aggregate().counts, expected.aggregate().counts)
+
+    def test_lambda_workers_receive_shard_events(self):
+        store = self.store
+
+        class InlineInvoker:
+            calls = []
+            def invoke_auditor(self, function_name, payload, invocation_type='Event'):
+                self.calls.append(payload)
+                body = {"statusCode": 200, "aggregate": audit_shard(store, payload["keys"])}
+                return {"Payload": io.BytesIO(json.dumps(body).encode())}
+
+        invoker = InlineInvoker()
+        executor = LambdaShardExecutor(invoker, "auditor-fn", "bucket", max_workers=4)
+        sharded = ShardedAnalyticsService(ExportReader(store), executor, 4, export_id="01700000000000-old")
+
+        self.assertEqual(sharded.aggregate().total, 3)
+        self.assertEqual([c["type"] for c in invoker.calls], ["AUDIT_SHARD"])
+
+class StubGlueClient:
+    """Records catalog calls; mimics Glue's missing-table and duplicate-partition behaviour."""
+    def __init__(self):
+        self.calls = []
+        self.tables = {}
+
+    def create_table(self, DatabaseName, TableInput):
+        self.calls.append('create_table')
+        self.tables[TableInput['Name']] = set()
+
+    def batch_create_partition(self, DatabaseName, TableName, PartitionInputList):
+        self.calls.append('batch_create_partition')
+        if TableName not in self.tables:
+            raise ClientError({'Error': {'Code': 'EntityNotFoundException'}}, 'BatchCreatePartition')
+        errors = []
+        for partition in PartitionInputList:
+            values = tuple(partition['Values'])
+            if values in self.tables[TableName]:
+                errors.append({'PartitionValues': partition['Values'],
+                               'ErrorDetail': {'ErrorCode': 'AlreadyExistsException'}})
+            self.tables[TableName].add(values)
+        return {'Errors': errors}
+
+    def start_crawler(self, **kwargs):
+        raise AssertionError("catalog discovery must not crawl")
+
+class TestCatalogDiscovery(unittest.TestCase):
+
+    def test_registers_table_once_then_one_call_per_export(self):
+        glue = StubGlueClient()
+        first = CatalogDiscoveryService(GlueDAO(glue), "db", "logs", "lake", ["0170-a"])
+        first.refresh()
+        self.assertEqual(first.wait_ready(), 'READY')
+        self.assertEqual(glue.calls, ['batch_create_partition', 'create_table', 'batch_create_partition'])
+
+        glue.calls.clear()
+        CatalogDiscoveryService(GlueDAO(glue), "db", "logs", "lake", ["0171-b"]).refresh()
+        CatalogDiscoveryService(GlueDAO(glue), "db", "logs", "lake", ["0171-b"]).refresh()
+        self.assertEqual(glue.calls, ['batch_create_partition', 'batch_create_partition'])
+        self.assertEqual(glue.tables["logs"], {("0170-a",), ("0171-b",)})
+
+SQL_WORDS = {'select', 'from', 'where', 'as', 'and', 'in', 'group', 'by', 'order', 'desc', 'having', 'distinct',
+             'interval', 'day', 'current_timestamp'}
+
+def referenced_columns(query, relation):
+    """Columns a query reads from its relation: identifiers outside it that are not keywords, calls or aliases."""
+    outer = re.sub(r"'[^']*'", "''", query.replace(relation, ''))
+    aliases = {a.lower() for a in re.findall(r'\bAS\s+"?(\w+)"?', outer, re.IGNORECASE)}
+    names = {(quoted or bare) for quoted, bare in re.findall(r'"(\w+)"|\b([A-Za-z_]\w*)\b(?!\s*\()', outer)}
+    return {n for n in names if n.lower() not in SQL_WORDS | aliases}
+
+class TestCatalogSchema(unittest.TestCase):
+
+    def test_audit_queries_resolve_against_catalog_schema(self):
+        env = {"CRAWLER_NAME": "c", "DATABASE_NAME": "db", "TABLE_NAME": "t", "ATHENA_OUTPUT": "s3://out/",
+               "DISCOVERY_MODE": "catalog"}
+        with patch.dict(os.environ, env):
+            config = AuditConfiguration()
+        config.scope_to_export("01767312000000-aaaa", "exports/snapshot_date=2026-01-02")
+        relation = config.relation()
+
+        # The subquery only dereferences attributes the registered struct declares...
+        item_type = schema.table_input("t", "s3://lake/exports/")['StorageDescriptor']['Columns'][0]['Type']
+        declared = set(re.findall(r'(\w+):struct<(\w+):', item_type))
+        self.assertTrue(set(re.findall(r'item\."(\w+)"\.(\w+)', relation)) <= declared)
+        columns = set(re.findall(r'AS "(\w+)"', relation)) | {key['Name'] for key in schema.PARTITION_KEYS}
+
+        # ...and exposes every column the opt-out audit, the default suite and the rollup read.
+        analytics = MagicMock()
+        analytics.wait_completion.return_value = 'SUCCEEDED'
+        ComplianceAuditOrchestrator(StaticDiscoveryService(), analytics).run_opt_out_audit(config)
+        queries = [analytics.run_query.call_args.args[0], DAILY_ROLLUP.render(config)]
+        queries += DEFAULT_SUITE.render(config).values()
+        for query in queries:
+            self.assertIn(relation, query)
+            self.assertLessEqual(referenced_columns(query, relation), columns, query)
+        self.assertEqual(referenced_columns(queries[0], relation), {'action'})
+
+class TestSnapshotScope(unittest.TestCase):
+
+    def setUp(self):
+        env = {"CRAWLER_NAME": "c", "DATABASE_NAME": "db", "TABLE_NAME": "t", "ATHENA_OUTPUT": "s3://out/"}
+        with patch.dict(os.environ, env):
+            self.config = AuditConfiguration()
+
+    def test_queries_target_only_the_audited_partition(self):
+        self.config.scope_to_export("01767312000000-aaaa", "exports/snapshot_date=2026-01-02")
+        self.assertEqual(self.config.snapshot_prefix, "exports/snapshot_date=2026-01-02/")
+        rendered = DEFAULT_SUITE.render(self.config)
+        self.assertTrue(all("WHERE snapshot_date = '2026-01-02')" in q for q in rendered.values()))
+
+        self.config.discovery_mode = 'catalog'
+        self.assertTrue(self.config.relation().startswith('(SELECT item."user_id".s AS "user_id", '))
+        self.assertTrue(self.config.relation().endswith("FROM \"db\".\"t\" WHERE export_id = '01767312000000-aaaa')"))
+        self.config.scope_to_export("01767312000000-dddd", "exports/snapshot_date=2026-01-02/")
+        self.assertEqual(self.config.snapshot_prefix, "exports/snapshot_date=2026-01-02/")
+        self.assertTrue(self.config.relation().endswith("IN ('01767312000000-aaaa', '01767312000000-dddd'))"))
+        self.config.scope_to_export("01767398400000-eeee", "exports/snapshot_date=2026-01-03/")
+        self.assertEqual(self.config.snapshot_prefix, "exports/")
+        self.assertIsNone(self.config.export_id)
+        with self.assertRaises(ValueError):
+            self.config.scope_to_export("x' OR '1'='1")
+
+    def test_export_prefix_is_per_day_and_streaming_reads_one_export(self):
+        from snapshot.dao import BotoSnapshotDAO
+        from datetime import datetime, timezone
+        ddb, sts = MagicMock(), MagicMock()
+        sts.get_caller_identity.return_value = {'Account': '123456789012'}
+        BotoSnapshotDAO(ddb, sts_client=sts).export_table("t", "lake", "us-east-1",
+                                                          export_time=datetime(2026, 1, 2, 1, tzinfo=timezone.utc))
+        prefix = ddb.export_table_to_point_in_time.call_args.kwargs['S3Prefix']
+        self.assertEqual(prefix, "exports/snapshot_date=2026-01-02/")
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        write_export(tmp.name, "01767225600000-aaaa", [[make_item("u0", "opt_out")]],
+                     prefix="exports/snapshot_date=2026-01-01/")
+        for export_id in ("01767312000000-bbbb", "01767315600000-cccc"):
+            write_export(tmp.name, export_id, [[make_item("u1", "opt_out"), make_item("u2", "opt_in")]], prefix=prefix)
+        self.config.scope_to_export("01767312000000-bbbb", prefix)
+        service = StreamingAnalyticsService(ExportReader(LocalObjectStore(tmp.name), self.config.snapshot_prefix),
+                                            self.config.export_id)
+        query_id, status = ComplianceAuditOrchestrator(StaticDiscoveryService(), service).run_opt_out_audit(self.config)
+
+        self.assertEqual(status, 'SUCCEEDED')
+        self.assertEqual(service.get_result(query_id), 1)
+
+class TestScanBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.prefix = "exports/snapshot_date=2026-01-02/"
+        write_export(self.tmp.name, "01767312000000-aaaa", [[make_item(f"u{i}", "opt_out") for i in range(10)]],
+                     prefix=self.prefix)
+        write_export(self.tmp.name, "01767315600000-bbbb", [[make_item(f"u{i}", "opt_in") for i in range(30)]],
+                     prefix=self.prefix)
+        env = {"CRAWLER_NAME": "c", "DATABASE_NAME": "db", "TABLE_NAME": "t", "ATHENA_OUTPUT": "s3://out/",
+               "DATA_LAKE_BUCKET": "lake", "SCAN_BUDGET_BYTES": "2000"}
+        with patch.dict(os.environ, env):
+            self.config = AuditConfiguration()
+
+    def test_estimate_covers_only_the_exports_in_scope(self):
+        reader = ExportReader(LocalObjectStore(self.tmp.name), self.prefix)
+        one, everything = reader.estimated_bytes(["01767312000000-aaaa"]), reader.estimated_bytes()
+        self.assertGreater(one, 0)
+        self.assertGreater(everything, 3 * one)
+
+    def test_over_budget_audits_are_refused_or_downgraded(self):
+        import privacy_auditor
+        from auditor.utils import metrics
+        self.addCleanup(metrics.clear_metrics)
+        store = LocalObjectStore(self.tmp.name)
+        with patch.object(privacy_auditor, 'get_client'), \
+                patch.object(privacy_auditor, 'S3ObjectStore', return_value=store):
+            self.config.scope_to_export("01767312000000-aaaa", self.prefix)
+            self.assertEqual(privacy_auditor.enforce_scan_budget(self.config, 'athena'), 'athena')
+
+            self.config.scope_to_export("01767315600000-bbbb", self.prefix)
+            self.assertIsNone(privacy_auditor.enforce_scan_budget(self.config, 'athena'))
+            self.config.scan_budget_fallback = 'sharded'
+            self.assertEqual(privacy_auditor.enforce_scan_budget(self.config, 'athena'), 'sharded')
+            # Engines that Athena does not bill are never checked.
+            self.assertEqual(privacy_auditor.enforce_scan_budget(self.config, 'streaming'), 'streaming')
+        self.assertEqual(metrics.metric_set['AuditBudgetExceeded']['Value'], [1.0, 1.0])
+
+class StubBatchAthenaClient:
+    """Queries finish after a per-query number of status checks."""
+    def __init__(self, checks_until_done):
+        self.remaining = dict(checks_until_done)
+        self.batch_calls = []
+
+    def batch_get_query_execution(self, QueryExecutionIds):
+        self.batch_calls.append(list(QueryExecutionIds))
+        executions = []
+        for qid in QueryExecutionIds:
+            self.remaining[qid] -= 1
+            state = 'RUNNING' if self.remaining[qid] > 0 else ('FAILED' if qid == 'q-bad' else 'SUCCEEDED')
+            execution = {'QueryExecutionId': qid, 'Status': {'State': state}}
+            if state != 'RUNNING':
+                execution['Statistics'] = {'DataScannedInBytes': 1024, 'EngineExecutionTimeInMillis': 900,
+                                           'QueryQueueTimeInMillis': 150}
+            executions.append(execution)
+        return {'QueryExecutions': executions}
+
+class TestMultiplexedPoller(unittest.TestCase):
+
+    @staticmethod
+    async def no_sleep(_):
+        await asyncio.sleep(0)
+
+    def test_one_batch_call_per_tick_for_many_queries(self):
+        athena = StubBatchAthenaClient({'q-1': 1, 'q-2': 3, 'q-bad': 2})
+        service = AsyncAthenaAnalyticsService(AthenaDAO(athena), MultiplexedPoller(sleep=self.no_sleep))
+
+        states = service.wait_all(['q-1', 'q-2', 'q-bad'])
+
+        self.assertEqual(states, {'q-1': 'SUCCEEDED', 'q-2': 'SUCCEEDED', 'q-bad': 'FAILED'})
+        self.assertEqual(athena.batch_calls, [['q-1', 'q-2', 'q-bad'], ['q-2', 'q-bad'], ['q-2']])
+
+    @patch('auditor.analytics.service.Logger.metric')
+    def test_statistics_are_kept_from_the_status_calls(self, metric):
+        athena = StubBatchAthenaClient({'q-1': 2, 'q-bad': 1})
+        service = AsyncAthenaAnalyticsService(AthenaDAO(athena), MultiplexedPoller(sleep=self.no_sleep))
+
+        service.wait_all(['q-1', 'q-bad'])
+
+        # The stub has no GetQueryExecution: statistics must come from the batch status responses.
+        self.assertEqual(service.query_statistics('q-1')['DataScannedInBytes'], 1024)
+        self.assertEqual(service.query_statistics('q-bad')['QueryQueueTimeInMillis'], 150)
+        emitted = [call.args[0] for call in metric.call_args_list]
+        self.assertEqual(emitted.count('QueryDataScanned'), 2)
+        self.assertEqual(emitted.count('QueryEngineExecutionTime'), 2)
+
+    def test_crawlers_and_queries_share_one_loop(self):
+        poller = MultiplexedPoller(sleep=self.no_sleep)
+        glue = MagicMock()
+        glue.batch_get_crawlers.side_effect = [
+            {'Crawlers': [{'Name': 'c', 'State': 'RUNNING'}]},
+            {'Crawlers': [{'Name': 'c', 'State': 'READY'}]},
+        ]
+        discovery = AsyncGlueDiscoveryService(GlueDAO(glue), 'c', poller)
+        analytics = AsyncAthenaAnalyticsService(AthenaDAO(StubBatchAthenaClient({'q-1': 2})), poller)
+
+        async def both():
+            return await asyncio.gather(discovery.wait_ready_async(), analytics.wait_completion_async('q-1'))
+
+        self.assertEqual(run_sync(both()), ['READY', 'SUCCEEDED'])
+
+    def test_failed_check_keeps_polling_late_waiters(self):
+        poller = MultiplexedPoller(sleep=self.no_sleep)
+        checked = threading.Event()
+        release = threading.Event()
+
+        def check(ids):
+            if 'q-1' in ids:
+                checked.set()
+                release.wait(5)
+                raise RuntimeError("throttled")
+            return {rid: 'SUCCEEDED' for rid in ids}
+        poller.register('query', check)
+
+        async def scenario():
+            first = asyncio.ensure_future(poller.wait('query', 'q-1', ['SUCCEEDED']))
+            await asyncio.to_thread(checked.wait, 5)
+            late = asyncio.ensure_future(poller.wait('query', 'q-2', ['SUCCEEDED']))
+            await asyncio.sleep(0)
+            release.set()
+            return await asyncio.gather(first, late, return_exceptions=True)
+
+        first, late = run_sync(asyncio.wait_for(scenario(), 5))
+        self.assertIsInstance(first, RuntimeError)
+        self.assertEqual(late, 'SUCCEEDED')
+
+class TestPhaseInstrumentation(unittest.TestCase):
+
+    @patch('auditor.utils.Logger.metric')
+    @patch('auditor.utils.time.sleep')
+    def test_phases_report_polls_transitions_and_over_sleep(self, sleep, metric):
+        dao = MagicMock()
+        dao.start_execution.return_value = 'q-1'
+        dao.fetch_execution_state.side_effect = ['QUEUED', 'RUNNING', 'RUNNING', 'SUCCEEDED']
+        dao.fetch_execution_statistics.return_value = {'DataScannedInBytes': 4096, 'QueryQueueTimeInMillis': 1200}
+        env = {"CRAWLER_NAME": "c", "DATABASE_NAME": "db", "TABLE_NAME": "t", "ATHENA_OUTPUT": "s3://out/"}
+        with patch.dict(os.environ, env):
+            config = AuditConfiguration()
+
+        orchestrator = ComplianceAuditOrchestrator(StaticDiscoveryService(), AthenaAnalyticsService(dao))
+        self.assertEqual(orchestrator.run_opt_out_audit(config), ('q-1', 'SUCCEEDED'))
+
+        emitted = {call.args[0]: call.args[2] for call in metric.call_args_list}
+        self.assertEqual(emitted['AnalysisPollCount'], 4)
+        # Backoff 2s -> 3s -> 4.5s: the query finished somewhere inside the last 4.5s sleep.
+        self.assertEqual(emitted['AnalysisOverSleepEstimate'], 2.25)
+        self.assertIn('AnalysisQueuedTime', emitted)
+        self.assertIn('AnalysisRunningTime', emitted)
+        self.assertIn('DiscoveryDuration', emitted)
+        self.assertNotIn('DiscoveryPollCount', emitted)
+        self.assertEqual((emitted['QueryDataScanned'], emitted['QueryQueueTime']), (4096, 1200))
+        self.assertNotIn('QueryEngineExecutionTime', emitted)
+
+    def test_dimensions_are_set_once_per_invocation(self):
+        from auditor.utils import metrics
+        metrics.clear_metrics()
+        with patch.object(metrics, 'add_dimension', wraps=metrics.add_dimension) as add_dimension:
+            for _ in range(3):
+                Logger.metric("AuditSuccess", "Count", 1, engine='athena')
+
+        self.assertEqual(add_dimension.call_count, 1)
+        # Repeated metrics share one entry in the batch instead of one EMF blob each.
+        self.assertEqual(metrics.metric_set['AuditSuccess']['Value'], [1.0, 1.0, 1.0])
+        metrics.clear_metrics()
+
+class StubCrawlDiscovery:
+    """Discovery stand-in whose crawl stays RUNNING for the first `running_checks` checks."""
+    def __init__(self, running_checks):
+        self.running_checks = running_checks
+        self.refreshes = 0
+
+    def refresh(self):
+        self.refreshes += 1
+
+    def check_ready(self):
+        self.running_checks -= 1
+        return 'RUNNING' if self.running_checks >= 0 else 'READY'
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+class TestResumableAudit(unittest.TestCase):
+
+    def setUp(self):
+        env = {"CRAWLER_NAME": "c", "DATABASE_NAME": "db", "TABLE_NAME": "t", "ATHENA_OUTPUT": "s3://out/"}
+        with patch.dict(os.environ, env):
+            self.config = AuditConfiguration()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.clock = FakeClock()
+        self.dao = MagicMock()
+        self.dao.start_execution.return_value = 'q-1'
+        self.dao.fetch_execution_state.side_effect = ['RUNNING', 'SUCCEEDED']
+        self.scheduler = LocalResumeScheduler()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_orchestrator(self, discovery):
+        # A fresh store handle per invocation: each step only sees what the previous one checkpointed.
+        store = SQLiteStateStore(os.path.join(self.tmp.name, 'state.sqlite'))
+        return ResumableAuditOrchestrator(discovery, AthenaAnalyticsService(self.dao), store, self.scheduler,
+                                          inline_wait=5.0, clock=self.clock, sleep=self.clock.sleep)
+
+    @patch('auditor.orchestrator.Logger.metric')
+    def test_long_waits_are_rescheduled_and_resumed_from_checkpoint(self, metric):
+        discovery = StubCrawlDiscovery(running_checks=2)
+        checkpoint = self.make_orchestrator(discovery).start_opt_out_audit(self.config, {'type': 'SNAPSHOT_COMPLETE'})
+        audit_id = checkpoint['audit_id']
+        self.assertEqual(checkpoint['phase'], 'discovery_wait')
+        self.assertEqual(self.scheduler.scheduled, [(audit_id, 10.0)])
+
+        for _ in range(2):
+            delay = self.scheduler.scheduled[-1][1]
+            self.clock.sleep(delay)
+            orchestrator = self.make_orchestrator(discovery)
+            checkpoint = orchestrator.resume_opt_out_audit(orchestrator.load_checkpoint(audit_id), self.config)
+
+        # Second crawl wait backs off to 15s; the 2s query wait is slept inline.
+        self.assertEqual([d for _, d in self.scheduler.scheduled], [10.0, 15.0])
+        self.assertEqual(discovery.refreshes, 1)
+        self.assertEqual((checkpoint['phase'], checkpoint['status'], checkpoint['query_id']), ('done', 'SUCCEEDED', 'q-1'))
+        self.assertEqual(self.make_orchestrator(discovery).load_checkpoint(audit_id)['status'], 'SUCCEEDED')
+        emitted = {call.args[0]: call.args[2] for call in metric.call_args_list}
+        self.assertEqual((emitted['DiscoveryDuration'], emitted['DiscoveryPollCount']), (25.0, 3))
+        self.assertEqual((emitted['AnalysisDuration'], emitted['AnalysisPollCount']), (2.0, 2))
+
+    def test_exhausted_invocation_schedules_instead_of_sleeping(self):
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = 3000
+        checkpoint = self.make_orchestrator(StaticDiscoveryService()).start_opt_out_audit(self.config, {}, context)
+        self.assertEqual(checkpoint['phase'], 'query_wait')
+        self.assertEqual(self.scheduler.scheduled, [(checkpoint['audit_id'], 2.0)])
+
+    @patch('auditor.orchestrator.Logger.metric')
+    def test_resume_reschedules_a_wait_the_invocation_cannot_afford(self, _):
+        checkpoint = self.make_orchestrator(StubCrawlDiscovery(running_checks=2)).start_opt_out_audit(self.config, {})
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = 12000
+        orchestrator = self.make_orchestrator(StubCrawlDiscovery(running_checks=0))
+        start = self.clock.now
+        resumed = orchestrator.resume_opt_out_audit(checkpoint, self.config, context, not_before=start + 10.0)
+
+        self.assertEqual(self.clock.now, start)
+        self.assertEqual(resumed['phase'], 'discovery_wait')
+        self.assertEqual(self.scheduler.scheduled[-1], (checkpoint['audit_id'], 10.0))
+
+        context.get_remaining_time_in_millis.return_value = 60000
+        resumed = orchestrator.resume_opt_out_audit(checkpoint, self.config, context, not_before=start + 10.0)
+        self.assertEqual(self.clock.now, start + 10.0 + 2.0)
+        self.assertEqual((resumed['phase'], resumed['status']), ('done', 'SUCCEEDED'))
+
+class TestAdaptivePolling(unittest.TestCase):
+
+    def simulate(self, durations, history=None):
+        """One crawler wait per duration on a fake clock; returns the (checks, detection latency) of each."""
+        clock = FakeClock()
+        results = []
+        with patch('auditor.utils.time.time', clock), patch('auditor.utils.time.sleep', side_effect=clock.sleep):
+            for duration in durations:
+                start, checks = clock.now, []
+                def check():
+                    checks.append(clock.now)
+                    return 'READY' if clock.now - start >= duration else 'RUNNING'
+                Poller.wait("Crawler c", check, ['READY'], initial_delay=10, max_delay=60,
+                            history=history, history_key="crawler#c")
+                results.append((len(checks), clock.now - start - duration))
+        return results
+
+    def test_learned_schedule_cuts_checks_and_detection_latency(self):
+        rng = random.Random(7)
+        durations = [rng.gauss(90, 8) for _ in range(40)]
+        history = CompletionHistory(InMemoryStateStore())
+
+        fixed = self.simulate(durations[10:])
+        # The first waits fall back to the fixed backoff while the history fills up.
+        learned = self.simulate(durations, history)[10:]
+
+        mean = lambda values: sum(values) / len(values)
+        self.assertLess(mean([c for c, _ in learned]), mean([c for c, _ in fixed]))
+        self.assertLess(mean([l for _, l in learned]), mean([l for _, l in fixed]) / 4)
+        self.assertEqual(len(history.durations("crawler#c")), 40)
+
+    def test_query_templates_ignore_literals(self):
+        relation = "(SELECT * FROM \"db\".\"t\" WHERE export_id = '{}')"
+        first = query_template_key(f"SELECT count(*) FROM {relation.format('01767312000000-aaaa')} WHERE action = 'opt_out';")
+        second = query_template_key(f"SELECT count(*)  FROM {relation.format('01767398400000-bbbb')} WHERE action = 'opt_out'")
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, query_template_key("SELECT count(*) FROM \"db\".\"t\""))
+
+class TestBackfill(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for day in range(1, 7):
+            write_export(self.tmp.name, f"0176{day}000000000-aaaa", [[make_item("u1", "opt_out")]],
+                         prefix=f"exports/snapshot_date=2026-01-0{day}/")
+        write_export(self.tmp.name, "01767398400000-bbbb", [[(None, make_item("u1", "opt_in"))]],
+                     prefix="exports/snapshot_date=2026-01-03/", export_type="INCREMENTAL_EXPORT")
+        # Written before the per-day layout: never matched by a date range.
+        write_export(self.tmp.name, "01760000000000-cccc", [[make_item("u1", "opt_out")]])
+
+    def test_finds_exports_in_date_range(self):
+        from datetime import date
+        found = list(find_snapshot_exports(LocalObjectStore(self.tmp.name), date(2026, 1, 2), date(2026, 1, 4)))
+        self.assertEqual([s['snapshot_date'] for s in found], ['2026-01-02', '2026-01-03', '2026-01-03', '2026-01-04'])
+        self.assertEqual(sum(s['exportType'] == 'INCREMENTAL_EXPORT' for s in found), 1)
+
+    def test_bounded_parallel_run_resumes_after_failures(self):
+        from datetime import date
+        from backfill import BackfillRunner
+        from auditor.state import IdempotencyLedger
+        snapshots = list(find_snapshot_exports(LocalObjectStore(self.tmp.name), date(2026, 1, 1), date(2026, 1, 6)))
+        ledger = IdempotencyLedger(SQLiteStateStore(os.path.join(self.tmp.name, 'state.sqlite')), namespace='backfill#t')
+        lock, active, peak, calls = threading.Lock(), [0], [0], []
+
+        def audit(snapshot, fail=('2026-01-04',)):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+                calls.append(snapshot['snapshot_date'])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return {'statusCode': 500 if snapshot['snapshot_date'] in fail else 200}
+
+        first = BackfillRunner(audit, ledger, workers=3).run(snapshots)
+        self.assertEqual((first['audited'], first['failed'], first['done']), (6, 1, 7))
+        self.assertEqual(peak[0], 3)
+        self.assertGreater(first['throughput_per_minute'], 0)
+        self.assertEqual(first['failures'][0]['response'], {'statusCode': 500})
+
+        # Re-running the same backfill only retries what did not complete.
+        calls.clear()
+        second = BackfillRunner(lambda s: audit(s, fail=()), ledger, workers=3).run(snapshots)
+        self.assertEqual(calls, ['2026-01-04'])
+        self.assertEqual((second['audited'], second['skipped'], second['failed']), (1, 6, 0))
+
+class TestAuditRollup(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        env = {"CRAWLER_NAME": "c", "DATABASE_NAME": "db", "TABLE_NAME": "t", "ATHENA_OUTPUT": "s3://out/"}
+        with patch.dict(os.environ, env):
+            self.config = AuditConfiguration()
+        self.rollup = SQLiteRollupStore(os.path.join(self.tmp.name, 'rollup.sqlite'))
+        history = [make_item("u1", "opt_out", timestamp="2026-01-01T08:00:00Z"),
+                   make_item("u2", "opt_out", source="app", timestamp="2026-01-01T09:00:00Z"),
+                   make_item("u3", "opt_in", timestamp="2026-01-02T10:00:00Z")]
+        write_export(self.tmp.name, "01767312000000-aaaa", [history], prefix="exports/snapshot_date=2026-01-02/")
+        write_export(self.tmp.name, "01767398400000-bbbb",
+                     [history[:2], [make_item("u4", "opt_out", timestamp="2026-01-03T11:00:00Z")]],
+                     prefix="exports/snapshot_date=2026-01-03/")
+
+    def materialize(self, export_id, snapshot_date):
+        service = StreamingAnalyticsService(ExportReader(LocalObjectStore(self.tmp.name)), export_id)
+        orchestrator = ComplianceAuditOrchestrator(StaticDiscoveryService(), service)
+        orchestrator.run_opt_out_audit(self.config)
+        return orchestrator.materialize_rollup(self.config, self.rollup, f"arn:export/{export_id}", snapshot_date)
+
+    def test_streaming_audits_roll_up_into_trends(self):
+        self.assertEqual(self.materialize("01767312000000-aaaa", "2026-01-02"), 3)
+        self.assertEqual(self.materialize("01767398400000-bbbb", "2026-01-03"), 3)
+        # Re-auditing a snapshot replaces its rows instead of adding to them.
+        self.materialize("01767398400000-bbbb", "2026-01-03")
+
+        self.assertEqual(self.rollup.snapshot_trend("2026-01-01", "2026-01-31", action="opt_out"), [
+            {'snapshot_date': '2026-01-02', 'action': 'opt_out', 'signals': 2},
+            {'snapshot_date': '2026-01-03', 'action': 'opt_out', 'signals': 3}])
+        self.assertEqual(self.rollup.daily_trend("2026-01-01", "2026-01-31", action="opt_out", by_source=True), [
+            {'day': '2026-01-01', 'action': 'opt_out', 'source': 'app', 'signals': 1},
+            {'day': '2026-01-01', 'action': 'opt_out', 'source': 'web', 'signals': 1},
+            {'day': '2026-01-03', 'action': 'opt_out', 'source': 'web', 'signals': 1}])
+        # As of the first snapshot, u3's opt-in was still in the table.
+        self.assertEqual(self.rollup.daily_trend("2026-01-02", "2026-01-02", as_of="2026-01-02"),
+                         [{'day': '2026-01-02', 'action': 'opt_in', 'signals': 1}])
+        self.assertEqual(len(self.rollup.exports()), 2)
+
+    def test_daily_counts_survive_sharding_but_not_legacy_aggregates(self):
+        service = StreamingAnalyticsService(ExportReader(LocalObjectStore(self.tmp.name)), "01767398400000-bbbb")
+        partials = [audit_shard(LocalObjectStore(self.tmp.name), [e['dataFileS3Key']])
+                    for e in service.manifest_entries()]
+        from auditor.analytics.sharding import reduce_aggregates
+        self.assertEqual(reduce_aggregates(partials).days, service.daily_rollup())
+
+        legacy = AuditAggregate.from_dict({"counts": [["opt_out", "web", 2]]})
+        self.assertIsNone(legacy.days)
+        self.assertIsNone(AuditAggregate().merge(legacy).days)
+
+    def test_athena_engine_runs_rollup_query(self):
+        from datetime import date
+
+        class RollupQueryService:
+            def run_query(self, query, database, output):
+                self.query = query
+                return 'q-rollup'
+
+            def wait_completion(self, query_id):
+                return 'SUCCEEDED'
+
+            def stream_results(self, query_id):
+                yield {'day': date(2026, 1, 1), 'action': 'opt_out', 'source': 'web', 'signals': 4}
+
+        service = RollupQueryService()
+        orchestrator = ComplianceAuditOrchestrator(StaticDiscoveryService(), service)
+        self.assertEqual(orchestrator.materialize_rollup(self.config, self.rollup, "arn:export/x", "2026-01-01"), 1)
+        self.assertIn("GROUP BY 1, 2, 3", service.query)
+        self.assertEqual(self.rollup.daily_trend(date(2026, 1, 1), date(2026, 1, 1)),
+                         [{'day': '2026-01-01', 'action': 'opt_out', 'signals': 4}])
+
+    def test_object_segments_load_into_local_store(self):
+        from datetime import date
+        segments = ObjectRollupStore(LocalObjectStore(self.tmp.name))
+        segments.write("arn:export/a", "2026-01-02", {("2026-01-01", "opt_out", "web"): 2})
+        segments.write("arn:export/b", "2026-01-03", {("2026-01-01", "opt_out", "web"): 3})
+
+        loaded = self.rollup.load(segments.iter_segments(date(2026, 1, 1), date(2026, 1, 2)))
+        self.assertEqual(loaded, 1)
+        self.assertEqual(self.rollup.snapshot_trend("2026-01-01", "2026-01-31"),
+                         [{'snapshot_date': '2026-01-02', 'action': 'opt_out', 'signals': 2}])
+
+    def test_handler_rollup_failures_never_fail_the_audit(self):
+        import privacy_auditor
+        from auditor.utils import metrics
+        self.addCleanup(metrics.clear_metrics)
+        self.config.rollup_store, self.config.rollup_path = 'sqlite', self.rollup.path
+        orchestrator = MagicMock()
+        orchestrator.materialize_rollup.side_effect = RuntimeError("Rollup query ended in state FAILED")
+
+        # Undated (pre per-day layout) snapshots are skipped before any query runs.
+        privacy_auditor.write_rollup(orchestrator, self.config, ["arn:export/x"])
+        orchestrator.materialize_rollup.assert_not_called()
+
+        self.config.scope_to_export("01767312000000-aaaa", "exports/snapshot_date=2026-01-02/")
+        privacy_auditor.write_rollup(orchestrator, self.config, ["arn:export/x"])
+        self.assertEqual(orchestrator.materialize_rollup.call_args[0][2:], ("arn:export/x", "2026-01-02"))
+        self.assertEqual(metrics.metric_set['RollupFailure']['Value'], [1.0])
+
+class SlowAnalyticsService:
+    """Sync analytics stand-in: each query takes `latency` seconds; records peak concurrency."""
+    def __init__(self, latency):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    def run_query(self, query, database, output):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        return query
+
+    def wait_completion(self, query_id):
+        time.sleep(self.latency)
+        with self.lock:
+            self.in_flight -= 1
+        return 'FAILED' if 'fail' in query_id else 'SUCCEEDED'
+
+class TestAuditSuite(unittest.TestCase):
+
+    def setUp(self):
+        env = {"CRAWLER_NAME": "c", "DATABASE_NAME": "db", "TABLE_NAME": "t", "ATHENA_OUTPUT": "s3://out/"}
+        with patch.dict(os.environ, env):
+            self.config = AuditConfiguration()
+
+    def test_default_suite_renders_every_query(self):
+        rendered = DEFAULT_SUITE.render(self.config)
+        self.assertEqual(set(rendered), {'opt_outs_per_source', 'conflicting_signals', 'stale_preferences', 'daily_trends'})
+        self.assertIn("INTERVAL '365' DAY", rendered['stale_preferences'])
+        self.assertTrue(all('"db"."t"' in q for q in rendered.values()))
+
+    def test_queries_run_concurrently_under_in_flight_cap(self):
+        analytics = SlowAnalyticsService(latency=0.2)
+        suite = AuditSuite('s', [AuditQuery(f'q{i}', f'q{i}' + (' fail' if i == 3 else '')) for i in range(6)])
+        orchestrator = ComplianceAuditOrchestrator(StaticDiscoveryService(), analytics)
+
+        start = time.time()
+        results = orchestrator.run_audit_suite(self.config, suite, max_in_flight=3)
+
+        self.assertLess(time.time() - start, 0.2 * 6 * 0.75)
+        self.assertEqual(analytics.peak, 3)
+        self.assertEqual(results['q3']['status'], 'FAILED')
+        self.assertEqual(sum(r['status'] == 'SUCCEEDED' for r in results.values()), 5)
+
+    def test_athena_suite_returns_capped_result_rows(self):
+        class SuiteAthenaClient(StubResultsAthenaClient):
+            def start_query_execution(self, QueryString, **kwargs):
+                return {'QueryExecutionId': f"q-{QueryString}"}
+
+            def batch_get_query_execution(self, QueryExecutionIds):
+                return {'QueryExecutions': [{'QueryExecutionId': q, 'Status': {'State': 'SUCCEEDED'}}
+                                            for q in QueryExecutionIds]}
+
+        async def no_sleep(_):
+            await asyncio.sleep(0)
+        athena = SuiteAthenaClient([("u1", 3), ("u2", 2), ("u3", 1)])
+        analytics = AsyncAthenaAnalyticsService(AthenaDAO(athena), MultiplexedPoller(sleep=no_sleep))
+        suite = AuditSuite('s', [AuditQuery('top', 'top'), AuditQuery('all', 'all')])
+
+        results = ComplianceAuditOrchestrator(StaticDiscoveryService(), analytics).run_audit_suite(
+            self.config, suite, max_rows=2)
+
+        self.assertEqual(results['top']['status'], 'SUCCEEDED')
+        self.assertEqual(results['top']['result'], [{'user_id': 'u1', 'signals': 3}, {'user_id': 'u2', 'signals': 2}])
+        self.assertTrue(results['all']['truncated'])
+
+    def test_handler_suite_streams_large_results_from_the_result_csv(self):
+        import privacy_auditor
+        class SuiteAthenaClient(StubResultsAthenaClient):
+            def start_query_execution(self, QueryString, **kwargs):
+                return {'QueryExecutionId': f"q-{uuid.uuid4().hex[:8]}"}
+
+            def batch_get_query_execution(self, QueryExecutionIds):
+                return {'QueryExecutions': [{'QueryExecutionId': q, 'Status': {'State': 'SUCCEEDED'}}
+                                            for q in QueryExecutionIds]}
+
+        # More rows than one GetQueryResults page, so results are read from the CSV in ATHENA_OUTPUT.
+        rows = [(f"u{i}", i) for i in range(1500)]
+        csv_body = "user_id,signals\n" + "".join(f"{u},{n}\n" for u, n in rows)
+        clients = {'athena': SuiteAthenaClient(rows), 'glue': MagicMock(), 's3': MagicMock(), 'dynamodb': MagicMock()}
+        clients['glue'].get_crawler.return_value = {'Crawler': {'State': 'READY'}}
+        clients['s3'].get_object.side_effect = lambda **kw: {'Body': io.BytesIO(csv_body.encode('utf-8'))}
+
+        real_sleep = asyncio.sleep
+        with patch.object(privacy_auditor, 'get_client', side_effect=lambda name, **kw: clients[name]), \
+                patch('asyncio.sleep', side_effect=lambda delay, result=None: real_sleep(0)):
+            response = privacy_auditor.run_audit({'type': 'AUDIT_SUITE'}, MagicMock(), self.config)
+
+        self.assertEqual(response['statusCode'], 200)
+        result = response['results']['daily_trends']
+        self.assertEqual((len(result['result']), result['truncated']), (self.config.suite_max_rows, True))
+        self.assertEqual(result['result'][1], {'user_id': 'u1', 'signals': 1})
+        clients['s3'].get_object.assert_any_call(Bucket='results', Key=f"{result['query_id']}.csv")
+        self.assertLessEqual(clients['athena'].pages_served, len(DEFAULT_SUITE.queries))
+
+    def test_handler_suite_response_is_json_safe(self):
+        import privacy_auditor
+        from datetime import date
+        orchestrator = MagicMock()
+        orchestrator.run_audit_suite.return_value = {
+            'daily_trends': {'query_id': 'q-1', 'status': 'SUCCEEDED', 'duration': 1.0, 'truncated': False,
+                             'result': [{'day': date(2026, 1, 1), 'action': 'opt_out', 'signals': 4}]}}
+
+        response = privacy_auditor.run_suite(orchestrator, self.config)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(json.loads(json.dumps(response))['results']['daily_trends']['result'],
+                         [{'day': '2026-01-01', 'action': 'opt_out', 'signals': 4}])
+        self.assertEqual(orchestrator.run_audit_suite.call_args.args[3], self.config.suite_max_rows)
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.athena = MagicMock()
+        self.athena.start_query_execution.return_value = {'QueryExecutionId': 'q-1'}
+        self.athena.get_query_execution.return_value = {'QueryExecution': {'Status': {'State': 'SUCCEEDED'}}}
+
+    def cached(self, store, export_arn="arn:export/1"):
+        return CachedAnalyticsService(AthenaAnalyticsService(AthenaDAO(self.athena)), store, export_arn)
+
+    @patch('auditor.analytics.cache.Logger.metric')
+    def test_hit_skips_query_for_same_snapshot(self, metric):
+        store = InMemoryStateStore()
+        first = self.cached(store)
+        self.assertEqual(first.wait_completion(first.run_query("SELECT 1 ;", "db", "out")), 'SUCCEEDED')
+
+        second = self.cached(store)
+        query_id = second.run_query("SELECT   1", "db", "out")
+        self.assertEqual((query_id, second.wait_completion(query_id)), ('q-1', 'SUCCEEDED'))
+        self.assertEqual(self.athena.start_query_execution.call_count, 1)
+
+        self.cached(store, "arn:export/2").run_query("SELECT 1", "db", "out")
+        self.assertEqual(self.athena.start_query_execution.call_count, 2)
+        self.assertEqual([c.args[0] for c in metric.call_args_list], ['QueryCacheMiss', 'QueryCacheHit', 'QueryCacheMiss'])
+
+    @patch('auditor.analytics.cache.Logger.metric')
+    def test_resumed_invocation_caches_the_query_it_sees_finish(self, metric):
+        store = InMemoryStateStore()
+        self.athena.get_query_execution.return_value = {'QueryExecution': {'Status': {'State': 'RUNNING'}}}
+        started = self.cached(store)
+        query_id = started.run_query("SELECT 1", "db", "out")
+        self.assertEqual(started.check_state(query_id), 'RUNNING')
+
+        # The resumable path polls from a later invocation with a fresh service instance.
+        self.athena.get_query_execution.return_value = {'QueryExecution': {'Status': {'State': 'SUCCEEDED'}}}
+        resumed = self.cached(store)
+        self.assertEqual(resumed.check_state(query_id), 'SUCCEEDED')
+        self.assertIsNone(store.get(pending_key(query_id)))
+
+        self.assertEqual(self.cached(store).run_query("SELECT 1", "db", "out"), query_id)
+        self.assertEqual(self.athena.start_query_execution.call_count, 1)
+
+    def test_sqlite_store_ttl_and_size_eviction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SQLiteStateStore(os.path.join(tmp, "cache.sqlite"), max_entries=2)
+            store.put("a", {"v": 1})
+            store.put("b", {"v": 2})
+            store.get("a")
+            store.put("c", {"v": 3})
+            self.assertEqual(store.get("a"), {"v": 1})
+            self.assertIsNone(store.get("b"))
+
+            store.put("expired", {"v": 4}, ttl=-1)
+            self.assertIsNone(store.get("expired"))
+
+class TestIncrementalAnalytics(unittest.TestCase):
+
+    def test_delta_applies_changes_to_previous_aggregate(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            reader = ExportReader(LocalObjectStore(tmp))
+            store = InMemoryStateStore()
+            write_export(tmp, "0001-full", [[make_item("u1", "opt_out"), make_item("u2", "opt_in")]],
+                         summary={"exportTime": "2026-01-01T00:00:00.000Z"})
+            write_export(tmp, "0002-incr", [[
+                (make_item("u2", "opt_in"), make_item("u2", "opt_out")),
+                (None, make_item("u3", "opt_out", source="app")),
+                (make_item("u1", "opt_out"), None),
+            ]], export_type="INCREMENTAL_EXPORT", summary={"exportFromTime": "2026-01-01T00:00:00.000Z",
+                                                           "exportToTime": "2026-01-02T00:00:00.000Z"})
+
+            baseline = IncrementalAnalyticsService(reader, store, "0001-full", "logs").aggregate()
+            self.assertEqual(baseline.count(action='opt_out'), 1)
+
+            delta = IncrementalAnalyticsService(reader, store, "0002-incr", "logs")
+            self.assertEqual(delta.aggregate().counts, {('opt_out', 'web'): 1, ('opt_out', 'app'): 1})
+
+            # A rerun of the same export must not apply the delta twice.
+            rerun = IncrementalAnalyticsService(reader, store, "0002-incr", "logs")
+            self.assertEqual(rerun.aggregate().total, 2)
+
+    def test_delta_that_does_not_chain_from_the_stored_aggregate_fails(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            reader = ExportReader(LocalObjectStore(tmp))
+            store = InMemoryStateStore()
+            write_export(tmp, "0001-full", [[make_item("u1", "opt_out")]],
+                         summary={"exportTime": "2026-01-01T00:00:00.000Z"})
+            # Starts an hour after the baseline: changes in between would be missing from the aggregate.
+            write_export(tmp, "0002-incr", [[(None, make_item("u2", "opt_out"))]], export_type="INCREMENTAL_EXPORT",
+                         summary={"exportFromTime": "2026-01-01T01:00:00.000Z",
+                                  "exportToTime": "2026-01-02T01:00:00.000Z"})
+            IncrementalAnalyticsService(reader, store, "0001-full", "logs").aggregate()
+
+            with self.assertRaisesRegex(RuntimeError, "full export is required"):
+                IncrementalAnalyticsService(reader, store, "0002-incr", "logs").aggregate()
+            self.assertEqual(store.get("aggregate#logs")['export_id'], "0001-full")
+
+class StubResultsAthenaClient:
+    """Serves a two-column result set through GetQueryResults pages and a result CSV."""
+    COLUMNS = [{'Name': 'user_id', 'Type': 'varchar'}, {'Name': 'signals', 'Type': 'bigint'}]
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.pages_served = 0
+
+    def get_query_results(self, QueryExecutionId, MaxResults, NextToken=None):
+        self.pages_served += 1
+        start = int(NextToken or 0)
+        # Like Athena, the first page starts with a header row.
+        data = ([{'Data': [{'VarCharValue': c['Name']} for c in self.COLUMNS]}] if start == 0 else [])
+        chunk = self.rows[start:start + MaxResults]
+        data += [{'Data': [{'VarCharValue': u}, {'VarCharValue': str(n)} if n is not None else {}]} for u, n in chunk]
+        response = {'ResultSet': {'Rows': data, 'ResultSetMetadata': {'ColumnInfo': self.COLUMNS}}}
+        if start + MaxResults < len(self.rows):
+            response['NextToken'] = str(start + MaxResults)
+        return response
+
+    def get_query_execution(self, QueryExecutionId):
+        return {'QueryExecution': {'ResultConfiguration': {'OutputLocation': f's3://results/{QueryExecutionId}.csv'}}}
+
+class TestResultStreaming(unittest.TestCase):
+
+    ROWS = [("u1", 3), ("u2", None), ("u3", 1)]
+
+    def test_pages_lazily_with_typed_rows(self):
+        athena = StubResultsAthenaClient(self.ROWS)
+        rows = AthenaAnalyticsService(AthenaDAO(athena)).stream_results('q-1', page_size=2)
+
+        self.assertEqual(next(rows), {'user_id': 'u1', 'signals': 3})
+        self.assertEqual(athena.pages_served, 1)
+        self.assertEqual(list(rows), [{'user_id': 'u2', 'signals': None}, {'user_id': 'u3', 'signals': 1}])
+
+    def test_large_results_switch_to_result_csv(self):
+        athena = StubResultsAthenaClient(self.ROWS)
+        s3 = MagicMock()
+        s3.get_object.return_value = {'Body': io.BytesIO(b'"user_id","signals"\n"u1","3"\n"u2",\n"u3","1"\n')}
+        rows = list(AthenaAnalyticsService(AthenaDAO(athena, s3)).stream_results('q-1', page_size=2))
+
+        self.assertEqual(rows, [{'user_id': 'u1', 'signals': 3}, {'user_id': 'u2', 'signals': None},
+                                {'user_id': 'u3', 'signals': 1}])
+        self.assertEqual(athena.pages_served, 1)
+        s3.get_object.assert_called_once_with(Bucket='results', Key='q-1.csv')
+
+if __name__ == "__main__":
+    unittest.main()
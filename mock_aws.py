@@ -0,0 +1,430 @@
+"""
+Latency-Modeled Fake AWS Backends
+In-process stand-ins for the Glue, Athena, DynamoDB, Lambda, S3 and STS calls made by the DAOs.
+Unlike bare MagicMocks, resources move through time-based state machines (crawler
+RUNNING -> READY, query QUEUED -> RUNNING -> SUCCEEDED, export IN_PROGRESS -> COMPLETED), API
+calls take log-normally distributed latency and are throttled above a per-service rate.
+
+Time is virtual: durations are given in service seconds and `time_scale` maps them onto
+wall-clock time, so a 90s crawl at time_scale=0.005 takes 0.45s. `FakeAWS.patch()` scales
+`time.sleep`/`asyncio.sleep` by the same factor, so pollers see realistic delays.
+"""
+
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from unittest.mock import patch
+
+from botocore.exceptions import ClientError
+
+_real_sleep = time.sleep
+_real_async_sleep = asyncio.sleep
+
+class LatencyModel:
+    """Log-normal distribution in virtual seconds, parameterized by its median and p99."""
+    def __init__(self, median, p99=None):
+        self.median = median
+        # p99 sits 2.326 standard deviations above the median of the underlying normal.
+        self.sigma = math.log((p99 or median) / median) / 2.326 if median > 0 else 0.0
+
+    def sample(self, rng):
+        if self.median <= 0:
+            return 0.0
+        return self.median * math.exp(rng.gauss(0, self.sigma)) if self.sigma else self.median
+
+DEFAULT_LATENCY = {
+    'api': LatencyModel(0.03, 0.25),          # any control-plane call
+    'crawl': LatencyModel(90, 240),           # crawler RUNNING time
+    'query_queue': LatencyModel(0.5, 5),      # Athena QUEUED time
+    'query_run': LatencyModel(4, 20),         # Athena RUNNING time
+    'export': LatencyModel(600, 1500),        # DynamoDB export IN_PROGRESS time
+}
+
+class _Timeline:
+    """A resource's state over virtual time: a list of (state, duration) phases then a final state."""
+    def __init__(self, start, phases, final):
+        self.phases = []
+        at = start
+        for state, duration in phases:
+            at += duration
+            self.phases.append((state, at))
+        self.final = final
+        self.ready_at = at
+        self.observed_at = None
+
+    def state(self, now):
+        for state, until in self.phases:
+            if now < until:
+                return state
+        return self.final
+
+class FakeAWS:
+    """Shared virtual clock, call accounting and client factory for the fake services."""
+    def __init__(self, time_scale=0.005, seed=0, latency=None, throttle_tps=None, query_failure_rate=0.0,
+                 table_items=100000, table_bytes=20 * 1024 * 1024, max_sdk_attempts=10):
+        self.time_scale = time_scale
+        self.rng = random.Random(seed)
+        self.latency = dict(DEFAULT_LATENCY, **(latency or {}))
+        # {'athena': 20, ...}: API calls per virtual second before ThrottlingException.
+        self.throttle_tps = throttle_tps or {}
+        self.query_failure_rate = query_failure_rate
+        self.table_items = table_items
+        self.table_bytes = table_bytes
+        self.max_sdk_attempts = max_sdk_attempts
+        self.lock = threading.Lock()
+        # Serializes fake state transitions (e.g. two StartCrawler calls racing on one crawler).
+        self.state_lock = threading.RLock()
+        self.calls = Counter()
+        self.throttles = Counter()
+        self.over_sleep = defaultdict(list)
+        self._buckets = {}
+        self._clients = {}
+        self._start = time.monotonic()
+
+    # --- virtual time -------------------------------------------------------------------------
+    def now(self):
+        return (time.monotonic() - self._start) / self.time_scale
+
+    def sleep(self, seconds):
+        _real_sleep(max(0.0, seconds) * self.time_scale)
+
+    def sample(self, name):
+        with self.lock:
+            return self.latency[name].sample(self.rng)
+
+    def chance(self, p):
+        with self.lock:
+            return self.rng.random() < p
+
+    # --- accounting ---------------------------------------------------------------------------
+    def _take_token(self, service):
+        tps = self.throttle_tps.get(service)
+        if not tps:
+            return True
+        with self.lock:
+            now = self.now()
+            tokens, updated = self._buckets.get(service, (tps, now))
+            tokens = min(tps, tokens + (now - updated) * tps)
+            if tokens < 1:
+                self._buckets[service] = (tokens, now)
+                return False
+            self._buckets[service] = (tokens - 1, now)
+            return True
+
+    def call(self, service, op, fn):
+        """Runs one API call: SDK-style retry on throttling, modeled latency, then `fn()`."""
+        for attempt in range(self.max_sdk_attempts):
+            with self.lock:
+                self.calls[f"{service}.{op}"] += 1
+            if self._take_token(service):
+                self.sleep(self.sample('api'))
+                with self.state_lock:
+                    return fn()
+            with self.lock:
+                self.throttles[f"{service}.{op}"] += 1
+                backoff = self.rng.uniform(0, min(20.0, 0.05 * 2 ** attempt))
+            self.sleep(backoff)
+        raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, op)
+
+    def observe(self, kind, timeline, state):
+        """Records poll over-sleep: virtual time between a resource finishing and a caller noticing."""
+        if state == timeline.final and timeline.observed_at is None:
+            timeline.observed_at = self.now()
+            with self.lock:
+                self.over_sleep[kind].append(max(0.0, timeline.observed_at - timeline.ready_at))
+
+    def report(self):
+        return {
+            'api_calls': dict(sorted(self.calls.items())),
+            'throttled_calls': dict(sorted(self.throttles.items())),
+            'over_sleep': {kind: {'resources': len(v), 'total': sum(v), 'mean': sum(v) / len(v)}
+                           for kind, v in self.over_sleep.items() if v},
+        }
+
+    # --- boto3 replacement --------------------------------------------------------------------
+    def client(self, service_name, **kwargs):
+        factories = {'glue': FakeGlueClient, 'athena': FakeAthenaClient, 'dynamodb': FakeDynamoDBClient,
+                     'lambda': FakeLambdaClient, 's3': FakeS3Client, 'sts': FakeSTSClient}
+        with self.lock:
+            if service_name not in self._clients:
+                self._clients[service_name] = factories[service_name](self)
+            return self._clients[service_name]
+
+    @contextlib.contextmanager
+    def patch(self):
+        """Routes boto3.client to the fakes and scales sleeps onto the virtual clock."""
+        from auditor.clients import reset_clients
+        import snapshot.dao
+
+        async def scaled_async_sleep(delay, result=None):
+            return await _real_async_sleep(delay * self.time_scale, result)
+
+        reset_clients()
+        snapshot.dao._account_id_cache.clear()
+        with patch('boto3.client', side_effect=self.client), \
+                patch('time.sleep', side_effect=self.sleep), \
+                patch('asyncio.sleep', side_effect=scaled_async_sleep):
+            try:
+                yield self
+            finally:
+                reset_clients()
+                snapshot.dao._account_id_cache.clear()
+
+def _client_error(code, op, message=''):
+    return ClientError({'Error': {'Code': code, 'Message': message or code}}, op)
+
+class FakeGlueClient:
+    """Glue crawler (RUNNING -> READY) and catalog calls."""
+    def __init__(self, aws):
+        self.aws = aws
+        self.crawls = {}
+        self.tables = set()
+        self.partitions = set()
+
+    def _crawler_state(self, name):
+        crawl = self.crawls.get(name)
+        if crawl is None:
+            return 'READY'
+        state = crawl.state(self.aws.now())
+        self.aws.observe('crawler', crawl, state)
+        return state
+
+    def start_crawler(self, Name):
+        def op():
+            if self._crawler_state(Name) != 'READY':
+                raise _client_error('CrawlerRunningException', 'StartCrawler')
+            self.crawls[Name] = _Timeline(self.aws.now(), [('RUNNING', self.aws.sample('crawl'))], 'READY')
+            return {}
+        return self.aws.call('glue', 'StartCrawler', op)
+
+    def get_crawler(self, Name):
+        return self.aws.call('glue', 'GetCrawler', lambda: {'Crawler': {'Name': Name, 'State': self._crawler_state(Name)}})
+
+    def batch_get_crawlers(self, CrawlerNames):
+        return self.aws.call('glue', 'BatchGetCrawlers', lambda: {
+            'Crawlers': [{'Name': n, 'State': self._crawler_state(n)} for n in CrawlerNames], 'CrawlersNotFound': []})
+
+    def create_table(self, DatabaseName, TableInput):
+        def op():
+            key = (DatabaseName, TableInput['Name'])
+            if key in self.tables:
+                raise _client_error('AlreadyExistsException', 'CreateTable')
+            self.tables.add(key)
+            return {}
+        return self.aws.call('glue', 'CreateTable', op)
+
+    def batch_create_partition(self, DatabaseName, TableName, PartitionInputList):
+        def op():
+            if (DatabaseName, TableName) not in self.tables:
+                raise _client_error('EntityNotFoundException', 'BatchCreatePartition')
+            errors = []
+            for partition in PartitionInputList:
+                key = (DatabaseName, TableName, tuple(partition['Values']))
+                if key in self.partitions:
+                    errors.append({'PartitionValues': partition['Values'],
+                                   'ErrorDetail': {'ErrorCode': 'AlreadyExistsException'}})
+                self.partitions.add(key)
+            return {'Errors': errors}
+        return self.aws.call('glue', 'BatchCreatePartition', op)
+
+class FakeAthenaClient:
+    """Athena queries (QUEUED -> RUNNING -> SUCCEEDED/FAILED) with a one-row count result."""
+    def __init__(self, aws):
+        self.aws = aws
+        self.queries = {}
+
+    def _execution(self, query_id):
+        query = self.queries[query_id]
+        state = query['timeline'].state(self.aws.now())
+        self.aws.observe('query', query['timeline'], state)
+        execution = {'QueryExecutionId': query_id, 'Query': query['sql'], 'Status': {'State': state},
+                     'ResultConfiguration': {'OutputLocation': f"{query['output']}{query_id}.csv"}}
+        if state == query['timeline'].final:
+            # Virtual durations; every modeled query scans the whole table.
+            execution['Statistics'] = {'DataScannedInBytes': self.aws.table_bytes,
+                                       'QueryQueueTimeInMillis': int(query['queue'] * 1000),
+                                       'EngineExecutionTimeInMillis': int(query['run'] * 1000)}
+        return execution
+
+    def start_query_execution(self, QueryString, QueryExecutionContext=None, ResultConfiguration=None, **kwargs):
+        def op():
+            query_id = str(uuid.uuid4())
+            final = 'FAILED' if self.aws.chance(self.aws.query_failure_rate) else 'SUCCEEDED'
+            queue, run = self.aws.sample('query_queue'), self.aws.sample('query_run')
+            timeline = _Timeline(self.aws.now(), [('QUEUED', queue), ('RUNNING', run)], final)
+            self.queries[query_id] = {'sql': QueryString, 'timeline': timeline, 'queue': queue, 'run': run,
+                                      'output': (ResultConfiguration or {}).get('OutputLocation', 's3://results/')}
+            return {'QueryExecutionId': query_id}
+        return self.aws.call('athena', 'StartQueryExecution', op)
+
+    def get_query_execution(self, QueryExecutionId):
+        return self.aws.call('athena', 'GetQueryExecution',
+                             lambda: {'QueryExecution': self._execution(QueryExecutionId)})
+
+    def batch_get_query_execution(self, QueryExecutionIds):
+        return self.aws.call('athena', 'BatchGetQueryExecution', lambda: {
+            'QueryExecutions': [self._execution(q) for q in QueryExecutionIds if q in self.queries],
+            'UnprocessedQueryExecutionIds': []})
+
+    def get_query_results(self, QueryExecutionId, MaxResults=1000, NextToken=None):
+        return self.aws.call('athena', 'GetQueryResults', lambda: {'ResultSet': {
+            'Rows': [{'Data': [{'VarCharValue': 'total_opt_outs'}]}, {'Data': [{'VarCharValue': '0'}]}],
+            'ResultSetMetadata': {'ColumnInfo': [{'Name': 'total_opt_outs', 'Type': 'bigint'}]}}})
+
+class FakeDynamoDBClient:
+    """Table metadata, point-in-time exports (IN_PROGRESS -> COMPLETED) and item calls for state tables."""
+    def __init__(self, aws):
+        self.aws = aws
+        self.exports = {}
+        self.prefixes = {}
+        self.items = defaultdict(dict)
+
+    def describe_table(self, TableName):
+        return self.aws.call('dynamodb', 'DescribeTable', lambda: {'Table': {
+            'TableName': TableName, 'ItemCount': self.aws.table_items, 'TableSizeBytes': self.aws.table_bytes}})
+
+    def export_table_to_point_in_time(self, TableArn, **kwargs):
+        def op():
+            export_id = f"{int(time.time() * 1000):014d}-{uuid.uuid4().hex[:8]}"
+            export_arn = f"{TableArn}/export/{export_id}"
+            self.exports[export_arn] = _Timeline(self.aws.now(), [('IN_PROGRESS', self.aws.sample('export'))], 'COMPLETED')
+            self.prefixes[export_arn] = kwargs.get('S3Prefix')
+            return {'ExportDescription': {'ExportArn': export_arn, 'ExportStatus': 'IN_PROGRESS'}}
+        return self.aws.call('dynamodb', 'ExportTableToPointInTime', op)
+
+    def describe_export(self, ExportArn):
+        def op():
+            timeline = self.exports.get(ExportArn)
+            if timeline is None:
+                # Audits of exports this fake never started (direct handler benchmarks) find them already done.
+                return {'ExportDescription': {'ExportArn': ExportArn, 'ExportStatus': 'COMPLETED'}}
+            state = timeline.state(self.aws.now())
+            self.aws.observe('export', timeline, state)
+            return {'ExportDescription': {'ExportArn': ExportArn, 'ExportStatus': state,
+                                          'S3Prefix': self.prefixes.get(ExportArn)}}
+        return self.aws.call('dynamodb', 'DescribeExport', op)
+
+    def export_ready_at(self, export_arn):
+        return self.exports[export_arn].ready_at
+
+    def get_item(self, TableName, Key, **kwargs):
+        def op():
+            item = self.items[TableName].get(json.dumps(Key, sort_keys=True))
+            return {'Item': item} if item else {}
+        return self.aws.call('dynamodb', 'GetItem', op)
+
+    def put_item(self, TableName, Item, ConditionExpression=None, **kwargs):
+        def op():
+            key = {'pk': Item['pk']} if 'pk' in Item else {k: Item[k] for k in ('user_id', 'timestamp') if k in Item}
+            key = json.dumps(key, sort_keys=True)
+            existing = self.items[TableName].get(key)
+            # Only the state store's put-if-absent condition is modeled (expired items count as absent).
+            if ConditionExpression and existing and float(existing.get('expires_at', {}).get('N', 'inf')) > time.time():
+                raise _client_error('ConditionalCheckFailedException', 'PutItem')
+            self.items[TableName][key] = Item
+            return {}
+        return self.aws.call('dynamodb', 'PutItem', op)
+
+    def delete_item(self, TableName, Key, **kwargs):
+        def op():
+            self.items[TableName].pop(json.dumps(Key, sort_keys=True), None)
+            return {}
+        return self.aws.call('dynamodb', 'DeleteItem', op)
+
+    def batch_write_item(self, RequestItems):
+        def op():
+            for table, requests in RequestItems.items():
+                for request in requests:
+                    item = request['PutRequest']['Item']
+                    self.items[table][json.dumps({k: item[k] for k in ('user_id', 'timestamp')}, sort_keys=True)] = item
+            return {'UnprocessedItems': {}}
+        return self.aws.call('dynamodb', 'BatchWriteItem', op)
+
+class FakeLambdaClient:
+    """
+    Lambda invocations routed to in-process handlers (`register(name, fn)`). 'Event' invocations
+    run on a background thread like real async invokes; `join()` waits for them.
+    """
+    def __init__(self, aws):
+        self.aws = aws
+        self.handlers = {}
+        self.invocations = []
+        self._ids = itertools.count()
+
+    def register(self, function_name, handler):
+        self.handlers[function_name] = handler
+
+    def _run(self, record):
+        handler = self.handlers.get(record['function'])
+        if handler is not None:
+            try:
+                record['result'] = handler(record['payload'], FakeContext(record['function']))
+            except Exception as e:
+                record['error'] = str(e)
+        record['finished_at'] = self.aws.now()
+
+    def invoke(self, FunctionName, InvocationType='RequestResponse', Payload='{}', **kwargs):
+        def op():
+            record = {'function': FunctionName.rsplit(':', 1)[-1], 'payload': json.loads(Payload),
+                      'type': InvocationType, 'started_at': self.aws.now(), 'id': next(self._ids)}
+            self.invocations.append(record)
+            return record
+        # The handler runs outside the API call so nested fake calls are not serialized behind it.
+        record = self.aws.call('lambda', 'Invoke', op)
+        if InvocationType == 'Event':
+            record['thread'] = threading.Thread(target=self._run, args=(record,), daemon=True)
+            record['thread'].start()
+            return {'StatusCode': 202}
+        self._run(record)
+        return {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(record.get('result')).encode())}
+
+    def join(self):
+        """Waits for every asynchronous invocation, including ones started by other invocations."""
+        joined = 0
+        while joined < len(self.invocations):
+            record = self.invocations[joined]
+            if 'thread' in record:
+                record['thread'].join()
+            joined += 1
+        return self.invocations
+
+class FakeS3Client:
+    """Result CSVs that FakeAthenaClient writes to each query's OutputLocation."""
+    def __init__(self, aws):
+        self.aws = aws
+
+    def get_object(self, Bucket, Key):
+        def op():
+            athena = self.aws.client('athena')
+            query_id = Key.rsplit('/', 1)[-1][:-len('.csv')]
+            if not Key.endswith('.csv') or query_id not in athena.queries:
+                raise _client_error('NoSuchKey', 'GetObject')
+            return {'Body': io.BytesIO(b'"total_opt_outs"\n"0"\n')}
+        return self.aws.call('s3', 'GetObject', op)
+
+class FakeSTSClient:
+    def __init__(self, aws):
+        self.aws = aws
+
+    def get_caller_identity(self):
+        return self.aws.call('sts', 'GetCallerIdentity', lambda: {'Account': '123456789012'})
+
+class FakeContext:
+    """Minimal Lambda context accepted by the Powertools decorators."""
+    def __init__(self, function_name="privacy-signal-analyzer-dev-PrivacySignalAuditor"):
+        self.function_name = function_name
+        self.function_version = "$LATEST"
+        self.memory_limit_in_mb = 512
+        self.aws_request_id = str(uuid.uuid4())
+        self.invoked_function_arn = f"arn:aws:lambda:us-east-1:123456789012:function:{function_name}"
+
+    def get_remaining_time_in_millis(self):
+        return 300000
@@ -0,0 +1,148 @@
+"""
+End-to-End Audit Benchmark (Fake AWS Backends)
+Runs `lambda_handler` and the snapshot entrypoints against the latency-modeled fakes in
+mock_aws.py, reporting end-to-end latency, API call counts, poll over-sleep and throughput
+under concurrency. All durations are virtual (service) seconds.
+"""
+
+import os
+
+# Mock environment initialization (MUST be before imports that initialize Powertools)
+os.environ.setdefault("AWS_REGION", "us-east-1")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("POWERTOOLS_LOG_LEVEL", "WARNING")
+
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import json
+import sys
+import time
+import warnings
+from unittest.mock import patch
+
+from auditor.polling import percentile
+from mock_aws import FakeAWS, FakeContext
+from privacy_auditor import lambda_handler
+from snapshot_entrypoint import start_snapshot, on_export_complete
+
+AUDITOR_FUNCTION = "privacy-signal-analyzer-dev-PrivacySignalAuditor"
+BASE_ENV = {
+    "SLS_STAGE": "dev",
+    "CRAWLER_NAME": "mock-crawler",
+    "DATABASE_NAME": "mock_db",
+    "TABLE_NAME": "mock_table",
+    "ATHENA_OUTPUT": "s3://mock-results/results/",
+    "DATA_LAKE_BUCKET": "mock-lake",
+    "AUDITOR_FUNCTION_NAME": AUDITOR_FUNCTION,
+}
+# Powertools warns on every invocation that publishes only the cold-start metric.
+warnings.filterwarnings("ignore", message="No application metrics to publish")
+EXPORT_ARN = "arn:aws:dynamodb:us-east-1:123456789012:table/mock_table/export/{:014d}-bench"
+
+def run_audit(aws, i, event):
+    start = aws.now()
+    response = lambda_handler(dict(event, export_arn=EXPORT_ARN.format(i)), FakeContext())
+    return response['statusCode'] == 200, aws.now() - start
+
+def run_snapshot_to_audit(aws, i):
+    """SnapshotStart -> export completes -> completion handler -> async Auditor invoke."""
+    start = aws.now()
+    started = start_snapshot({}, FakeContext("SnapshotStart"))
+    if started.get('status') != 'STARTED':
+        return False, aws.now() - start
+    export_arn = started['export_arn']
+    aws.sleep(aws.client('dynamodb').export_ready_at(export_arn) - aws.now())
+
+    on_export_complete({"detail": {"exportArn": export_arn, "exportStatus": "COMPLETED"}},
+                       FakeContext("SnapshotCompletionHandler"))
+    lambda_client = aws.client('lambda')
+    record = next(r for r in lambda_client.invocations if r['payload'].get('export_arn') == export_arn)
+    record['thread'].join()
+    return (record.get('result') or {}).get('statusCode') == 200, record['finished_at'] - start
+
+SCENARIOS = {
+    'audit-crawler': ({}, lambda aws, i: run_audit(aws, i, {"type": "SNAPSHOT_COMPLETE"})),
+    'audit-catalog': ({"DISCOVERY_MODE": "catalog"}, lambda aws, i: run_audit(aws, i, {"type": "SNAPSHOT_COMPLETE"})),
+    'audit-suite': ({}, lambda aws, i: run_audit(aws, i, {"type": "AUDIT_SUITE"})),
+    'snapshot-to-audit': ({}, run_snapshot_to_audit),
+}
+
+def run_scenario(name, audits, concurrency, aws_options):
+    env, runner = SCENARIOS[name]
+    aws = FakeAWS(**aws_options)
+    aws.client('lambda').register(AUDITOR_FUNCTION, lambda_handler)
+    results = []
+    wall_start = time.time()
+    # Handlers emit EMF/JSON to stdout; keep the report readable.
+    with aws.patch(), patch.dict(os.environ, dict(BASE_ENV, **env)), contextlib.redirect_stdout(io.StringIO()):
+        virtual_start = aws.now()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(runner, aws, i) for i in range(audits)]
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append((False, 0.0))
+                    print(f"{name}: {e}", file=sys.stderr)
+        aws.client('lambda').join()
+        virtual_duration = aws.now() - virtual_start
+
+    latencies = [latency for _, latency in results]
+    report = aws.report()
+    over_sleep_total = sum(kind['total'] for kind in report['over_sleep'].values())
+    return dict(report, **{
+        'scenario': name,
+        'audits': audits,
+        'succeeded': sum(1 for ok, _ in results if ok),
+        'latency': {'p50': percentile(latencies, 0.5), 'p95': percentile(latencies, 0.95), 'max': max(latencies)},
+        'over_sleep_share': over_sleep_total / sum(latencies) if sum(latencies) else 0.0,
+        'throughput_per_hour': audits / virtual_duration * 3600 if virtual_duration else 0.0,
+        'virtual_duration': virtual_duration,
+        'wall_duration': time.time() - wall_start,
+    })
+
+def print_report(result):
+    print(f"\n--- {result['scenario']} ---")
+    print(f"Succeeded: {result['succeeded']}/{result['audits']}")
+    lat = result['latency']
+    print(f"End-to-End Latency: p50={lat['p50']:.1f}s p95={lat['p95']:.1f}s max={lat['max']:.1f}s")
+    print(f"Throughput: {result['throughput_per_hour']:.1f} audits/hour "
+          f"(virtual {result['virtual_duration']:.0f}s, wall {result['wall_duration']:.2f}s)")
+    for kind, stats in result['over_sleep'].items():
+        print(f"Poll Over-Sleep [{kind}]: total={stats['total']:.1f}s mean={stats['mean']:.2f}s "
+              f"over {stats['resources']} resources")
+    print(f"Over-Sleep Share of Latency: {result['over_sleep_share'] * 100:.1f}%")
+    print("API Calls:")
+    for op, count in result['api_calls'].items():
+        throttled = result['throttled_calls'].get(op, 0)
+        print(f"  {op:<40} {count:>6}" + (f"  ({throttled} throttled)" if throttled else ""))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-End Audit Benchmark on Fake AWS Backends")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--audits", type=int, default=20, help="Audits per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent handler invocations")
+    parser.add_argument("--time-scale", type=float, default=0.005, help="Wall seconds per virtual second")
+    parser.add_argument("--throttle-tps", type=float, default=0, help="Per-service API rate limit (0 = none)")
+    parser.add_argument("--query-failure-rate", type=float, default=0.0, help="Share of Athena queries that FAIL")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the full results to this file")
+    args = parser.parse_args()
+
+    throttle = {s: args.throttle_tps for s in ('glue', 'athena', 'dynamodb', 'lambda')} if args.throttle_tps else None
+    aws_options = {'time_scale': args.time_scale, 'seed': args.seed, 'throttle_tps': throttle,
+                   'query_failure_rate': args.query_failure_rate}
+
+    print(f"--- Audit Benchmark: {args.audits} audits x {args.concurrency} workers per scenario ---")
+    results = [run_scenario(name, args.audits, args.concurrency, aws_options) for name in args.scenarios]
+    for result in results:
+        print_report(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if any(r['succeeded'] != r['audits'] for r in results) and not args.query_failure_rate:
+        print("\nFAILED: some audits did not complete successfully.")
+        sys.exit(1)
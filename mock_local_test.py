@@ -10,6 +10,7 @@ import unittest
 from unittest.mock import MagicMock, patch
 from snapshot_entrypoint import start_snapshot, on_export_complete
 from privacy_auditor import lambda_handler
+from auditor.clients import reset_clients
 
 # Mock environment initialization
 os.environ["SLS_STAGE"] = "dev"
@@ -24,6 +25,10 @@ os.environ["AUDITOR_FUNCTION_NAME"] = "MockAuditorFunction"
 
 class TestSweepArchitecture(unittest.TestCase):
 
+    def setUp(self):
+        # Clients are cached at module scope; drop them so this test's boto3 patch applies.
+        reset_clients()
+
     @patch('boto3.session.Session')
     @patch('boto3.client')
     def test_full_snapshot_flow(self, mock_boto, mock_session):
@@ -98,5 +103,90 @@ class TestSweepArchitecture(unittest.TestCase):
 
         print("\nSUCCESS: Batch Snapshot orchestration verified.")
 
+class TestFakeAWSBackends(unittest.TestCase):
+
+    def test_audit_waits_through_modeled_state_machines(self):
+        from mock_aws import FakeAWS, FakeContext
+        aws = FakeAWS(time_scale=0.0005, seed=1)
+        with aws.patch():
+            response = lambda_handler({"type": "SNAPSHOT_COMPLETE"}, FakeContext())
+        report = aws.report()
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(report['api_calls']['glue.StartCrawler'], 1)
+        self.assertGreater(report['api_calls']['glue.GetCrawler'], 1)
+        self.assertEqual(report['over_sleep']['query']['resources'], 1)
+
+    def test_resumable_audit_reschedules_itself_until_done(self):
+        import tempfile
+        from mock_aws import FakeAWS, FakeContext
+        aws = FakeAWS(time_scale=0.0005, seed=1)
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.dict(os.environ, {"AUDIT_MODE": "resumable", "STATE_PATH": os.path.join(tmp, "state.sqlite")}), \
+                aws.patch():
+            aws.client('lambda').register("privacy-signal-analyzer-dev-PrivacySignalAuditor", lambda_handler)
+            response = lambda_handler({"type": "SNAPSHOT_COMPLETE"}, FakeContext())
+            invocations = aws.client('lambda').join()
+
+        self.assertEqual(response['statusCode'], 202)
+        # Each crawl wait longer than the inline threshold is one asynchronous re-invocation.
+        self.assertTrue(invocations and all(i['payload']['type'] == 'AUDIT_RESUME' for i in invocations))
+        self.assertEqual([i['result']['statusCode'] for i in invocations][-1], 200)
+        self.assertTrue(all(i['result']['statusCode'] == 202 for i in invocations[:-1]))
+        self.assertEqual(aws.report()['api_calls']['glue.StartCrawler'], 1)
+
+    def test_duplicate_triggers_collapse_into_one_audit(self):
+        import tempfile
+        from concurrent.futures import ThreadPoolExecutor
+        from mock_aws import FakeAWS, FakeContext
+        aws = FakeAWS(time_scale=0.0005, seed=2)
+        event = {"type": "SNAPSHOT_COMPLETE",
+                 "export_arn": "arn:aws:dynamodb:us-east-1:123456789012:table/mock_table/export/01767312000000-aaaa"}
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.dict(os.environ, {"AUDIT_IDEMPOTENCY": "true", "STATE_PATH": os.path.join(tmp, "state.sqlite")}), \
+                aws.patch():
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                responses = list(pool.map(lambda _: lambda_handler(dict(event), FakeContext()), range(3)))
+            later = lambda_handler(dict(event), FakeContext())
+
+        completed = [r for r in responses if not r.get('duplicate')]
+        self.assertEqual(len(completed), 1)
+        self.assertEqual(aws.report()['api_calls']['glue.StartCrawler'], 1)
+        self.assertEqual(aws.report()['api_calls']['athena.StartQueryExecution'], 1)
+        self.assertEqual((later['duplicate'], later['query_id']), (True, completed[0]['query_id']))
+
+class TestDataLoad(unittest.TestCase):
+
+    def test_rate_limiter_admits_batches_larger_than_the_rate(self):
+        import data_load_test
+        clock = [0.0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+        with patch.object(data_load_test.time, 'monotonic', side_effect=lambda: clock[0]), \
+                patch.object(data_load_test.time, 'sleep', side_effect=sleep):
+            limiter = data_load_test.RateLimiter(10)
+            for _ in range(4):
+                limiter.acquire(data_load_test.BATCH_SIZE)
+
+        # 100 items at 10 items/s, less the 10 tokens the bucket starts with.
+        self.assertAlmostEqual(clock[0], 9.0)
+
+    def test_unprocessed_items_are_retried(self):
+        import data_load_test
+        requests = [{'PutRequest': {'Item': {'user_id': {'S': f"u{i}"}}}} for i in range(3)]
+        dynamodb = MagicMock()
+        dynamodb.batch_write_item.side_effect = [
+            {'UnprocessedItems': {'logs': requests[1:]}},
+            {'UnprocessedItems': {'logs': requests[2:]}},
+            {'UnprocessedItems': {}},
+        ]
+        stats = data_load_test.LoadStats()
+        data_load_test.write_batch(dynamodb, 'logs', requests, stats, base_delay=0)
+
+        self.assertEqual([c.kwargs['RequestItems']['logs'] for c in dynamodb.batch_write_item.call_args_list],
+                         [requests, requests[1:], requests[2:]])
+        self.assertEqual((stats.loaded, stats.failed, stats.retries), (3, 0, 2))
+
 if __name__ == "__main__":
     unittest.main()
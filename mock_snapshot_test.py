@@ -0,0 +1,349 @@
+import os
+
+# Mock environment initialization (MUST be before imports that initialize boto3)
+os.environ["AWS_REGION"] = "us-east-1"
+os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+from auditor.state import IdempotencyLedger, InMemoryStateStore
+from auditor.analytics import ConsentLookupIndex, ConsentStateIndex, write_lookup_index
+from auditor.analytics.consent import pack_user_id
+from auditor.storage import LocalObjectStore
+from snapshot.service import SnapshotService, parse_table_specs
+from mock_auditor_test import make_item, write_export
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+EXPORT_ID = "01760572800000-abcd1234"
+EXPORT_ARN = f"arn:aws:dynamodb:us-east-1:123456789012:table/t/export/{EXPORT_ID}"
+
+@unittest.skipUnless(pq, "pyarrow not installed")
+class TestParquetConversion(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        write_export(self.tmp.name, EXPORT_ID, [
+            [make_item(f"u{i}", "opt_out" if i % 2 else "opt_in") for i in range(7)],
+            [make_item("u7", "preference_update", timestamp="2026-01-02T03:04:05Z")],
+        ])
+        self.store = LocalObjectStore(self.tmp.name)
+
+    def test_converts_into_partitioned_row_groups(self):
+        from snapshot.parquet import ParquetExportConverter
+        result = ParquetExportConverter(self.store, batch_size=2).convert(EXPORT_ID)
+
+        self.assertEqual(result["rows"], 8)
+        self.assertEqual(result["prefix"], f"parquet/snapshot_date=2025-10-16/export_id={EXPORT_ID}/")
+        opt_out = os.path.join(self.tmp.name, "parquet", "snapshot_date=2025-10-16", f"export_id={EXPORT_ID}",
+                               "action=opt_out", "part-0000.parquet")
+        parquet_file = pq.ParquetFile(opt_out)
+        self.assertEqual(parquet_file.metadata.num_rows, 3)
+        self.assertEqual(parquet_file.metadata.num_row_groups, 2)
+        self.assertEqual(str(parquet_file.schema_arrow.field('timestamp').type), 'timestamp[ms, tz=UTC]')
+        self.assertEqual(result["bytes"], sum(self.store.size(k) for k in result["keys"]))
+
+    def test_staged_files_roll_over_at_the_tmp_cap(self):
+        from snapshot.parquet import ParquetExportConverter
+        result = ParquetExportConverter(self.store, batch_size=2, max_staged_bytes=1).convert(EXPORT_ID)
+
+        opt_out = sorted(k for k in result["keys"] if "/action=opt_out/" in k)
+        self.assertEqual([k.rsplit('/', 1)[1] for k in opt_out], ["part-0000.parquet", "part-0001.parquet"])
+        self.assertEqual(sum(pq.ParquetFile(os.path.join(self.tmp.name, *k.split('/'))).metadata.num_rows
+                             for k in result["keys"]), 8)
+
+    def test_completion_runs_stage_before_auditor(self):
+        from snapshot.parquet import ParquetExportConverter
+        dao = MagicMock()
+        dao.describe_export.return_value = {'S3Prefix': 'exports/'}
+        service = SnapshotService(dao, ParquetExportConverter(self.store))
+        event = {"detail": {"exportArn": EXPORT_ARN, "exportStatus": "COMPLETED"}}
+
+        self.assertEqual(service.handle_export_completion(event, "auditor")["status"], "AUDIT_TRIGGERED")
+        payload = dao.invoke_auditor.call_args.kwargs["payload"]
+        self.assertEqual(payload["parquet_prefix"], f"parquet/snapshot_date=2025-10-16/export_id={EXPORT_ID}/")
+        self.assertNotIn("parquet_table", payload)
+
+    def test_completion_lists_only_the_exports_own_prefix(self):
+        from snapshot.lookup import ConsentIndexBuilder
+        from snapshot.parquet import ParquetExportConverter
+        daily_id, daily_prefix = "01760659200000-bcde2345", "exports/snapshot_date=2025-10-17/"
+        write_export(self.tmp.name, daily_id, [[make_item("u1", "opt_out")]], prefix=daily_prefix)
+        dao = MagicMock()
+        dao.describe_export.return_value = {'S3Prefix': daily_prefix}
+        listed = []
+        list_keys = self.store.list_keys
+        with patch.object(self.store, 'list_keys', side_effect=lambda p: listed.append(p) or list_keys(p)):
+            service = SnapshotService(dao, ParquetExportConverter(self.store), indexer=ConsentIndexBuilder(self.store))
+            service.handle_export_completion({"detail": {"exportArn": EXPORT_ARN.replace(EXPORT_ID, daily_id),
+                                                         "exportStatus": "COMPLETED"}}, "auditor")
+
+        payload = dao.invoke_auditor.call_args.kwargs["payload"]
+        self.assertEqual(payload["parquet_prefix"], f"parquet/snapshot_date=2025-10-17/export_id={daily_id}/")
+        self.assertEqual(payload["consent_index_key"], f"consent-index/{daily_id}.idx")
+        # One manifest lookup per stage, never the whole export history.
+        self.assertEqual(listed, [daily_prefix, daily_prefix])
+
+    def test_incremental_exports_go_to_the_audit_unconverted(self):
+        from snapshot.parquet import ParquetExportConverter
+        incremental_id = "01760659200000-bcde2345"
+        write_export(self.tmp.name, incremental_id, [[(None, make_item("u8", "opt_out"))]],
+                     export_type="INCREMENTAL_EXPORT")
+        dao = MagicMock()
+        dao.describe_export.return_value = {'S3Prefix': 'exports/'}
+        service = SnapshotService(dao, ParquetExportConverter(self.store))
+        arn = EXPORT_ARN.replace(EXPORT_ID, incremental_id)
+
+        self.assertEqual(service.handle_export_completion({"detail": {"exportArn": arn, "exportStatus": "COMPLETED"}},
+                                                          "auditor")["status"], "AUDIT_TRIGGERED")
+        self.assertEqual(dao.invoke_auditor.call_args.kwargs["payload"], {"type": "SNAPSHOT_COMPLETE", "export_arn": arn})
+        self.assertEqual([k for k in self.store.list_keys("parquet/")], [])
+
+    def test_registered_parquet_table_is_what_the_audit_queries(self):
+        import privacy_auditor
+        from auditor.config import AuditConfiguration
+        from auditor.discovery import GlueDAO, ParquetCatalogService
+        from snapshot.parquet import ParquetExportConverter
+        from mock_auditor_test import StubGlueClient
+        glue, dao = StubGlueClient(), MagicMock()
+        dao.describe_export.return_value = {'S3Prefix': 'exports/'}
+        catalog = ParquetCatalogService(GlueDAO(glue), "db", "logs_parquet", "lake")
+        service = SnapshotService(dao, ParquetExportConverter(self.store, catalog=catalog))
+        service.handle_export_completion({"detail": {"exportArn": EXPORT_ARN, "exportStatus": "COMPLETED"}}, "auditor")
+        payload = dao.invoke_auditor.call_args.kwargs["payload"]
+
+        self.assertEqual(payload["parquet_table"], "logs_parquet")
+        self.assertEqual(glue.calls, ['batch_create_partition', 'create_table', 'batch_create_partition'])
+        self.assertEqual(glue.tables["logs_parquet"], {("2025-10-16", EXPORT_ID, a)
+                                                       for a in ("opt_in", "opt_out", "preference_update")})
+
+        clients = {'athena': MagicMock(), 'glue': MagicMock(), 'dynamodb': MagicMock(), 's3': MagicMock()}
+        clients['athena'].start_query_execution.return_value = {'QueryExecutionId': 'q-1'}
+        clients['athena'].get_query_execution.return_value = {'QueryExecution': {'Status': {'State': 'SUCCEEDED'}}}
+        clients['dynamodb'].describe_export.return_value = {'ExportDescription': {}}
+        env = {"CRAWLER_NAME": "c", "DATABASE_NAME": "db", "TABLE_NAME": "logs", "ATHENA_OUTPUT": "s3://out/",
+               "DATA_LAKE_BUCKET": "lake"}
+        with patch.dict(os.environ, env), \
+                patch.object(privacy_auditor, 'get_client', side_effect=lambda name, **kw: clients[name]):
+            response = privacy_auditor.run_audit(payload, MagicMock(), AuditConfiguration())
+
+        self.assertEqual(response['statusCode'], 200)
+        query = clients['athena'].start_query_execution.call_args.kwargs['QueryString']
+        self.assertIn(f'FROM "db"."logs_parquet" WHERE export_id = \'{EXPORT_ID}\'', query)
+        clients['glue'].start_crawler.assert_not_called()
+
+class TestConsentLookupIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        write_export(self.tmp.name, EXPORT_ID, [
+            [make_item("u1", "opt_out", timestamp="2026-01-01T00:00:00Z"), make_item("u2", "opt_in", source="app")],
+            [make_item("u1", "opt_in", timestamp="2026-01-02T03:04:05.250Z")],
+        ], summary={"exportTime": "2025-10-16T00:00:00.000Z"})
+        self.store = LocalObjectStore(self.tmp.name)
+
+    def test_completion_builds_index_and_lookups_read_latest_signal(self):
+        from snapshot.lookup import ConsentIndexBuilder
+        dao = MagicMock()
+        dao.describe_export.return_value = {'S3Prefix': 'exports/'}
+        service = SnapshotService(dao, indexer=ConsentIndexBuilder(self.store))
+        event = {"detail": {"exportArn": EXPORT_ARN, "exportStatus": "COMPLETED"}}
+
+        self.assertEqual(service.handle_export_completion(event, "auditor")["status"], "AUDIT_TRIGGERED")
+        key = dao.invoke_auditor.call_args.kwargs["payload"]["consent_index_key"]
+        self.assertEqual(key, ConsentLookupIndex.latest_key(self.store))
+
+        with ConsentLookupIndex.from_store(self.store, key, cache_dir=os.path.join(self.tmp.name, "cache")) as index:
+            self.assertEqual(len(index), 2)
+            self.assertEqual(tuple(index.get("u1")), ("opt_in", "web", "2026-01-02T03:04:05.250Z"))
+            self.assertIsNone(index.get("u9"))
+            self.assertEqual(index.get_many(["u2", "u9", "u1"]),
+                             {"u1": index.get("u1"), "u2": index.get("u2"), "u9": None})
+
+    def test_incremental_exports_are_merged_into_the_previous_index(self):
+        from snapshot.lookup import ConsentIndexBuilder
+        builder = ConsentIndexBuilder(self.store)
+        builder.convert(EXPORT_ID)
+        write_export(self.tmp.name, "01760659200000-bcde2345", [[
+            (make_item("u2", "opt_in", source="app"), make_item("u2", "opt_out", source="app")),
+            (None, make_item("u3", "opt_out", timestamp="2026-01-03T00:00:00Z")),
+            # u1 is erased: both of their signals are deleted.
+            (make_item("u1", "opt_out", timestamp="2026-01-01T00:00:00Z"), None),
+            (make_item("u1", "opt_in", timestamp="2026-01-02T03:04:05.250Z"), None),
+        ]], export_type="INCREMENTAL_EXPORT", summary={"exportFromTime": "2025-10-16T00:00:00.000Z",
+                                                       "exportToTime": "2025-10-17T00:00:00.000Z"})
+
+        key = builder.convert("01760659200000-bcde2345")["key"]
+        self.assertEqual(key, ConsentLookupIndex.latest_key(self.store))
+        with ConsentLookupIndex.from_store(self.store, key, cache_dir=os.path.join(self.tmp.name, "cache")) as index:
+            self.assertEqual(len(index), 2)
+            self.assertIsNone(index.get("u1"))
+            self.assertEqual(index.get("u2").action, "opt_out")
+            self.assertEqual(tuple(index.get("u3")), ("opt_out", "web", "2026-01-03T00:00:00.000Z"))
+
+        # A window that does not start where the newest index ends cannot be merged.
+        write_export(self.tmp.name, "01760745600000-cdef3456", [[(None, make_item("u4", "opt_out"))]],
+                     export_type="INCREMENTAL_EXPORT", summary={"exportFromTime": "2025-10-17T06:00:00.000Z",
+                                                                "exportToTime": "2025-10-18T06:00:00.000Z"})
+        with self.assertRaisesRegex(RuntimeError, "full export is required"):
+            builder.convert("01760745600000-cdef3456")
+        self.assertEqual(ConsentLookupIndex.latest_key(self.store), key)
+
+    def test_sorted_records_and_bloom_filter_at_scale(self):
+        rows = [{'user_id': f"user-{i}", 'action': 'opt_out' if i % 3 else 'opt_in', 'source': 'web',
+                 'timestamp': "2026-01-01T00:00:00Z"} for i in range(20000)]
+        path = os.path.join(self.tmp.name, "users.idx")
+        write_lookup_index(ConsentStateIndex.from_rows(rows), path)
+
+        with ConsentLookupIndex(path) as index:
+            self.assertTrue(all(index.get(f"user-{i}").action == ('opt_out' if i % 3 else 'opt_in')
+                                for i in range(0, 20000, 7)))
+            misses = [f"absent-{i}" for i in range(5000)]
+            self.assertEqual(set(index.get_many(misses).values()), {None})
+            false_positives = sum(index.might_contain(index_key) for index_key in map(pack_user_id, misses))
+            self.assertLess(false_positives / len(misses), 0.03)
+
+class TestIncrementalSnapshots(unittest.TestCase):
+
+    def setUp(self):
+        self.dao = MagicMock()
+        self.dao.export_table.return_value = {'ExportDescription': {'ExportArn': EXPORT_ARN}}
+        self.state = InMemoryStateStore()
+        self.service = SnapshotService(self.dao, state_store=self.state)
+
+    def complete(self):
+        event = {"detail": {"exportArn": EXPORT_ARN, "exportStatus": "COMPLETED"}}
+        self.service.handle_export_completion(event, "auditor")
+
+    def test_first_snapshot_is_full_then_incremental_from_last_completion(self):
+        first = self.service.start_snapshot("t", "bucket", "us-east-1", incremental=True)
+        self.assertEqual(first["export_type"], "FULL_EXPORT")
+        self.assertIsNone(self.dao.export_table.call_args.kwargs["incremental_from"])
+        self.complete()
+
+        last = self.state.get("last-export#t")
+        last["export_time"] = (datetime.now(timezone.utc) - timedelta(hours=23)).isoformat()
+        self.state.put("last-export#t", last)
+
+        second = self.service.start_snapshot("t", "bucket", "us-east-1", incremental=True)
+        self.assertEqual(second["export_type"], "INCREMENTAL_EXPORT")
+        self.assertEqual(self.dao.export_table.call_args.kwargs["incremental_from"].isoformat(), last["export_time"])
+
+    def test_windows_chain_from_the_previous_export_and_clamp_to_a_day(self):
+        start = datetime.now(timezone.utc) - timedelta(hours=30)
+        self.state.put("last-export#t", {"table_name": "t", "export_time": start.isoformat()})
+
+        self.assertEqual(self.service.start_snapshot("t", "bucket", "us-east-1", incremental=True)["export_type"],
+                         "INCREMENTAL_EXPORT")
+        kwargs = self.dao.export_table.call_args.kwargs
+        self.assertEqual((kwargs["incremental_from"], kwargs["export_time"]), (start, start + timedelta(hours=24)))
+
+        # The next window starts where this one ended, not 24 hours before "now".
+        self.complete()
+        self.service.start_snapshot("t", "bucket", "us-east-1", incremental=True)
+        self.assertEqual(self.dao.export_table.call_args.kwargs["incremental_from"], start + timedelta(hours=24))
+
+    def test_uncompleted_or_stale_exports_force_full_export(self):
+        self.service.start_snapshot("t", "bucket", "us-east-1", incremental=True)
+        # Never completed: the next snapshot cannot be incremental.
+        self.assertEqual(self.service.start_snapshot("t", "bucket", "us-east-1", incremental=True)["export_type"],
+                         "FULL_EXPORT")
+
+        self.state.put("last-export#t", {"export_time": (datetime.now(timezone.utc) - timedelta(days=3)).isoformat()})
+        self.assertEqual(self.service.start_snapshot("t", "bucket", "us-east-1", incremental=True)["export_type"],
+                         "FULL_EXPORT")
+
+class TestSnapshotCycle(unittest.TestCase):
+
+    def setUp(self):
+        self.dao = MagicMock()
+        self.dao.export_table.side_effect = lambda table, *args, **kwargs: {'ExportDescription': {
+            'ExportArn': f"arn:aws:dynamodb:{args[1]}:123456789012:table/{table}/export/0176-{table}"}}
+        self.service = SnapshotService(self.dao, state_store=InMemoryStateStore())
+        tables = parse_table_specs("consent-a, us-east-1:consent-b,consent-c", "us-east-1")
+        self.assertEqual(tables[1], ("consent-b", "us-east-1"))
+        self.started = self.service.start_snapshot_cycle(tables, "lake", max_in_flight=2)
+
+    def complete(self, table, status="COMPLETED"):
+        arn = f"arn:aws:dynamodb:us-east-1:123456789012:table/{table}/export/0176-{table}"
+        return self.service.handle_export_completion({"detail": {"exportArn": arn, "exportStatus": status}}, "auditor")
+
+    def test_bounded_exports_then_one_combined_audit(self):
+        self.assertEqual(self.started["status"], "STARTED")
+        self.assertEqual(set(self.started["exports"]), {"consent-a", "consent-b"})
+        self.assertEqual(self.started["queued"], 1)
+
+        self.assertEqual(self.complete("consent-b")["status"], "CYCLE_PENDING")
+        self.assertEqual(self.dao.export_table.call_count, 3)
+        self.assertEqual(self.complete("consent-c")["remaining"], 1)
+        self.dao.invoke_auditor.assert_not_called()
+
+        self.assertEqual(self.complete("consent-a")["status"], "AUDIT_TRIGGERED")
+        payload = self.dao.invoke_auditor.call_args.kwargs["payload"]
+        self.assertEqual(payload["cycle_id"], self.started["cycle_id"])
+        self.assertEqual([arn.rsplit('-', 1)[-1] for arn in payload["export_arns"]], ["a", "b", "c"])
+        # Duplicate completion events must not audit the cycle twice.
+        self.complete("consent-a")
+        self.assertEqual(self.dao.invoke_auditor.call_count, 1)
+
+    def test_tables_outside_the_stack_region_are_rejected(self):
+        with self.assertRaisesRegex(ValueError, "outside the stack's region"):
+            parse_table_specs("consent-a,eu-west-1:consent-b", "us-east-1")
+
+    def test_state_stores_claim_keys_once(self):
+        from auditor.state import SQLiteStateStore
+        for store in (InMemoryStateStore(), SQLiteStateStore(":memory:")):
+            self.assertTrue(store.put_if_absent("claim", {"owner": 1}))
+            self.assertFalse(store.put_if_absent("claim", {"owner": 2}))
+            self.assertEqual(store.get("claim"), {"owner": 1})
+            store.put("expired", {}, ttl=-1)
+            self.assertTrue(store.put_if_absent("expired", {"owner": 3}))
+
+    def test_failed_export_closes_its_table(self):
+        self.complete("consent-a", status="FAILED")
+        self.complete("consent-b")
+        self.assertEqual(self.complete("consent-c")["status"], "AUDIT_TRIGGERED")
+        payload = self.dao.invoke_auditor.call_args.kwargs["payload"]
+        self.assertEqual(payload["failed_tables"], ["consent-a"])
+        self.assertEqual(len(payload["export_arns"]), 2)
+
+class TestDuplicateDeliveries(unittest.TestCase):
+
+    def setUp(self):
+        self.dao = MagicMock()
+        self.service = SnapshotService(self.dao, state_store=InMemoryStateStore())
+        self.event = {"detail": {"exportArn": EXPORT_ARN, "exportStatus": "COMPLETED"}}
+
+    def test_concurrent_deliveries_trigger_one_audit(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: self.service.handle_export_completion(self.event, "auditor"), range(8)))
+
+        self.assertEqual(self.dao.invoke_auditor.call_count, 1)
+        self.assertEqual(sorted(r["status"] for r in results), ["AUDIT_TRIGGERED"] + ["DUPLICATE"] * 7)
+        later = self.service.handle_export_completion(self.event, "auditor")
+        self.assertEqual((later["ledger_status"], later["result"]), ("COMPLETED", {"status": "AUDIT_TRIGGERED"}))
+
+    def test_failed_trigger_is_released_for_retry(self):
+        self.dao.invoke_auditor.side_effect = [RuntimeError("throttled"), {}]
+        self.assertEqual(self.service.handle_export_completion(self.event, "auditor")["status"], "FAILED")
+        self.assertEqual(self.service.handle_export_completion(self.event, "auditor")["status"], "AUDIT_TRIGGERED")
+
+    def test_expired_claims_are_taken_over(self):
+        ledger = IdempotencyLedger(InMemoryStateStore(), lease=-1)
+        self.assertIsNone(ledger.claim("arn"))
+        # The first claimant's lease has run out (it crashed): the next trigger owns the key.
+        self.assertIsNone(ledger.claim("arn"))
+        ledger.complete("arn", {"statusCode": 200})
+        self.assertEqual(ledger.claim("arn")["result"], {"statusCode": 200})
+
+if __name__ == "__main__":
+    unittest.main()
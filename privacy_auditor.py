@@ -4,20 +4,183 @@ Role: Orchestrates multi-stage privacy audits by coordinating AWS Glue and Amazo
 Design Pattern: SOLID Principles (SRP, OCP, LSP, ISP, DIP).
 """
 
-import boto3
-from botocore.config import Config
-
+from auditor.clients import get_client
 from auditor.utils import Logger, tracer, logger, metrics, MetricUnit
 from auditor.config import AuditConfiguration
-from auditor.discovery import GlueDAO, GlueDiscoveryService
-from auditor.analytics import AthenaDAO, AthenaAnalyticsService
-from auditor.orchestrator import ComplianceAuditOrchestrator
+from auditor.discovery import GlueDAO, GlueDiscoveryService, StaticDiscoveryService, CatalogDiscoveryService
+# The non-Athena engines are imported in their run_audit branch; they are small next to
+# boto3 and the X-Ray SDK (pulled in by the handler decorators), so this is not a cold-start win.
+from auditor.analytics import AthenaDAO, AthenaAnalyticsService, AsyncAthenaAnalyticsService, CachedAnalyticsService
+from auditor.state import InMemoryStateStore, SQLiteStateStore, DynamoStateStore, IdempotencyLedger
+from auditor.storage import S3ObjectStore, ExportReader, DynamoTableReader, converted_bytes, export_id_from_arn
+from auditor.polling import CompletionHistory
+from auditor.rollup import SQLiteRollupStore, ObjectRollupStore, rollup_key
+from auditor.orchestrator import ComplianceAuditOrchestrator, ResumableAuditOrchestrator
+from auditor.scheduler import EventBridgeResumeScheduler, LambdaResumeScheduler
+from auditor.suite import DEFAULT_SUITE
+from auditor.analytics.results import encode_value
+from snapshot.dao import BotoSnapshotDAO
 import time
 
-# Adaptive retry configuration for high-throughput resilience.
-BOTO_CONFIG = Config(
-    retries={'mode': 'adaptive', 'max_attempts': 10}
-)
+# Module scope so warm containers keep cached query results across invocations.
+MEMORY_RESULT_CACHE = InMemoryStateStore(max_entries=256)
+
+def build_state_store(config):
+    """Durable audit state: DynamoDB when STATE_TABLE is configured, otherwise a local SQLite file."""
+    if config.state_table:
+        return DynamoStateStore(get_client('dynamodb'), config.state_table)
+    return SQLiteStateStore(config.state_path)
+
+def build_result_cache(config):
+    """Selects the query result cache backend (None disables caching)."""
+    if config.result_cache == 'memory':
+        return MEMORY_RESULT_CACHE
+    if config.result_cache == 'sqlite':
+        return SQLiteStateStore(config.state_path, max_entries=1024, table='query_cache')
+    if config.result_cache == 'dynamodb' and config.state_table:
+        return build_state_store(config)
+    return None
+
+def resolve_audit_engine(config, table_reader):
+    """Maps AUDIT_ENGINE=adaptive to 'scan' for tables under the SCAN_MAX_* limits, else the export pipeline."""
+    if config.audit_engine != 'adaptive':
+        return config.audit_engine
+    from auditor.analytics import fits_direct_scan
+    description = table_reader.describe(config.table_name)
+    engine = 'scan' if fits_direct_scan(description, config.scan_max_items, config.scan_max_bytes) else 'athena'
+    Logger.log("Adaptive audit engine selected", engine=engine, **description)
+    return engine
+
+def event_export_arns(event):
+    """Exports an audit event covers: `export_arns` of a combined snapshot cycle, or a single `export_arn`."""
+    return event.get('export_arns') or ([event['export_arn']] if event.get('export_arn') else [])
+
+def resolve_snapshot_scope(config, export_arns):
+    """Scopes the audit to the event's exports: their ids, and their per-day prefixes from DescribeExport."""
+    for export_arn in export_arns:
+        try:
+            description = BotoSnapshotDAO(ddb_client=get_client('dynamodb')).describe_export(export_arn)
+        except Exception as e:
+            # Still scoped by export id; only the date partition (crawler mode) and prefix narrowing are lost.
+            Logger.log("Export description unavailable", level="WARNING", export_arn=export_arn, error=str(e))
+            description = {}
+        config.scope_to_export(export_id_from_arn(export_arn), description.get('S3Prefix'))
+    if export_arns:
+        Logger.log("Audit scoped to snapshot", export_ids=config.export_ids, snapshot_dates=config.snapshot_dates,
+                   prefix=config.snapshot_prefix)
+
+def enforce_scan_budget(config, engine):
+    """
+    Pre-flight cost guard for the Athena engine: estimates the audit's scan from the export
+    manifests (or converted Parquet files) in scope and, over SCAN_BUDGET_BYTES, returns the
+    fallback engine (None refuses).
+    """
+    if engine != 'athena' or not config.scan_budget_bytes:
+        return engine
+    store = S3ObjectStore(get_client('s3'), config.data_lake_bucket)
+    if config.parquet_table and config.export_ids:
+        # Converted snapshots are queried from their Parquet files, not the JSON export.
+        estimate = converted_bytes(store, config.export_ids, config.snapshot_dates, config.parquet_prefix)
+    else:
+        estimate = ExportReader(store, config.snapshot_prefix).estimated_bytes(config.export_ids or None)
+    metrics.add_metric(name="EstimatedScanBytes", unit=MetricUnit.Bytes, value=estimate)
+    if estimate <= config.scan_budget_bytes:
+        return engine
+    fallback = config.scan_budget_fallback or None
+    Logger.log("Audit exceeds scan budget", level="WARNING", estimated_bytes=estimate,
+               budget_bytes=config.scan_budget_bytes, fallback=fallback)
+    metrics.add_metric(name="AuditBudgetExceeded", unit=MetricUnit.Count, value=1)
+    return fallback
+
+def build_ledger(config):
+    """Idempotency ledger over the durable state store, unless AUDIT_IDEMPOTENCY is disabled."""
+    if not config.audit_idempotency:
+        return None
+    return IdempotencyLedger(build_state_store(config), lease=config.idempotency_lease, namespace='audit-ledger')
+
+def build_rollup_store(config):
+    """Selects the daily rollup backend (None disables the rollup)."""
+    if config.rollup_store == 'sqlite':
+        return SQLiteRollupStore(config.rollup_path)
+    if config.rollup_store == 's3':
+        return ObjectRollupStore(S3ObjectStore(get_client('s3'), config.data_lake_bucket), config.rollup_prefix)
+    return None
+
+def write_rollup(orchestrator, config, export_arns):
+    """Materializes the audited snapshot's daily rollup; a failure is logged and never fails the audit."""
+    rollup_store = build_rollup_store(config)
+    if rollup_store is None or not export_arns:
+        return
+    if not config.snapshot_dates:
+        # Exports from before the per-day layout have no snapshot date to file the rollup under.
+        Logger.log("Rollup skipped for undated snapshot", level="WARNING", export_arns=export_arns)
+        return
+    try:
+        rows = orchestrator.materialize_rollup(config, rollup_store, rollup_key(export_arns),
+                                               max(config.snapshot_dates))
+        metrics.add_metric(name="RollupRowsWritten", unit=MetricUnit.Count, value=rows)
+    except Exception as e:
+        Logger.log("Rollup write failed", level="ERROR", error=str(e), export_arns=export_arns)
+        metrics.add_metric(name="RollupFailure", unit=MetricUnit.Count, value=1)
+
+def run_audit_shard(event):
+    """Worker path of the sharded engine: aggregates the data files listed in an AUDIT_SHARD event."""
+    from auditor.analytics import audit_shard
+    store = S3ObjectStore(get_client('s3'), event['bucket'])
+    return {'statusCode': 200, 'aggregate': audit_shard(store, event['keys'])}
+
+def build_resume_scheduler(config, context):
+    """EventBridge Scheduler when a scheduler role is configured, otherwise an asynchronous self-invocation."""
+    if config.scheduler_role_arn:
+        return EventBridgeResumeScheduler(get_client('scheduler'), context.invoked_function_arn, config.scheduler_role_arn)
+    return LambdaResumeScheduler(BotoSnapshotDAO(lambda_client=get_client('lambda')), context.function_name)
+
+def report_audit(query_id, status, duration):
+    """Audit SLIs and the handler response for a finished opt-out audit."""
+    # SLI: Audit Duration
+    metrics.add_metric(name="AuditDuration", unit=MetricUnit.Seconds, value=duration)
+
+    if status == 'SUCCEEDED':
+        Logger.log("Privacy Audit Successful", query_id=query_id, duration=duration)
+        metrics.add_metric(name="AuditSuccess", unit=MetricUnit.Count, value=1)
+        return {'statusCode': 200, 'query_id': query_id, 'status': 'COMPLETED'}
+
+    Logger.log("Privacy Audit Failed", level="ERROR", query_id=query_id, status=status)
+    metrics.add_metric(name="AuditFailure", unit=MetricUnit.Count, value=1)
+    return {'statusCode': 500, 'query_id': query_id, 'status': status}
+
+def run_resumable_audit(orchestrator, config, event, context, checkpoint=None, not_before=None):
+    """Starts or resumes a checkpointed audit; 202 while a later step is scheduled."""
+    if checkpoint is None:
+        checkpoint = orchestrator.start_opt_out_audit(config, event, context)
+    else:
+        checkpoint = orchestrator.resume_opt_out_audit(checkpoint, config, context, not_before)
+    if checkpoint['phase'] != 'done':
+        return {'statusCode': 202, 'status': 'SCHEDULED', 'audit_id': checkpoint['audit_id'],
+                'phase': checkpoint['phase']}
+    # The audit spans several invocations, so its duration comes from the checkpoint.
+    return report_audit(checkpoint['query_id'], checkpoint['status'],
+                        checkpoint['phase_started_at'] - checkpoint['started_at'])
+
+def run_suite(orchestrator, config):
+    """Runs the default audit suite concurrently and reports per-query status and (capped) result rows."""
+    start_time = time.time()
+    results = orchestrator.run_audit_suite(config, DEFAULT_SUITE, config.audit_max_in_flight, config.suite_max_rows)
+    duration = time.time() - start_time
+    for result in results.values():
+        if isinstance(result.get('result'), list):
+            result['result'] = [{k: encode_value(v) for k, v in row.items()} for row in result['result']]
+    metrics.add_metric(name="AuditSuiteDuration", unit=MetricUnit.Seconds, value=duration)
+
+    failed = [name for name, result in results.items() if result['status'] != 'SUCCEEDED']
+    if failed:
+        Logger.log("Privacy Audit Suite Failed", level="ERROR", failed=failed, duration=duration)
+        metrics.add_metric(name="AuditFailure", unit=MetricUnit.Count, value=1)
+        return {'statusCode': 500, 'status': 'FAILED', 'results': results}
+
+    Logger.log("Privacy Audit Suite Successful", queries=len(results), duration=duration)
+    metrics.add_metric(name="AuditSuccess", unit=MetricUnit.Count, value=1)
+    return {'statusCode': 200, 'status': 'COMPLETED', 'results': results}
 
 @metrics.log_metrics(capture_cold_start_metric=True)
 @logger.inject_lambda_context(log_event=True)
@@ -26,40 +189,169 @@ def lambda_handler(event, context):
     """Entry point for AWS Lambda, responsible for DI and high-level execution."""
     Logger.log("Audit execution started", request_id=context.aws_request_id)
 
+    if event.get('type') == 'AUDIT_SHARD':
+        return run_audit_shard(event)
+
     config = AuditConfiguration()
     if not config.is_valid():
         Logger.log("Environment configuration error: MISSING_RESOURCES", level="ERROR")
         metrics.add_metric(name="AuditConfigurationError", unit=MetricUnit.Count, value=1)
         return {'statusCode': 500, 'body': 'Internal Configuration Error'}
 
-    # Dependency Injection Layer 1: DAOs (Direct AWS SDK Interactions)
-    glue_dao = GlueDAO(boto3.client('glue', config=BOTO_CONFIG))
-    athena_dao = AthenaDAO(boto3.client('athena', config=BOTO_CONFIG))
+    checkpoint = None
+    resume = event if event.get('type') == 'AUDIT_RESUME' else None
+    if resume:
+        checkpoint = build_state_store(config).get(ResumableAuditOrchestrator.checkpoint_key(resume['audit_id']))
+        if checkpoint is None:
+            Logger.log("Audit checkpoint not found", level="ERROR", audit_id=resume['audit_id'])
+            return {'statusCode': 404, 'body': 'Unknown audit_id'}
+        # The rest of the invocation is set up exactly as for the audit's original event.
+        event = checkpoint['event']
+
+    export_arns = event_export_arns(event)
+    ledger = build_ledger(config) if export_arns else None
+    ledger_key = f"{event.get('type', 'SNAPSHOT_COMPLETE')}#{','.join(sorted(export_arns))}"
+    if ledger and not resume:
+        # EventBridge delivers at least once: duplicate triggers of a snapshot collapse into one audit.
+        entry = ledger.claim(ledger_key)
+        if entry is not None:
+            Logger.log("Duplicate audit trigger", export_arns=export_arns, ledger_status=entry['status'])
+            metrics.add_metric(name="AuditDuplicateTrigger", unit=MetricUnit.Count, value=1)
+            if entry['status'] == 'COMPLETED':
+                return dict(entry['result'], duplicate=True)
+            return {'statusCode': 202, 'status': 'IN_PROGRESS', 'duplicate': True}
 
-    # Dependency Injection Layer 2: Services (Execution of Domain Operations)
-    discovery_service = GlueDiscoveryService(glue_dao, config.crawler_name)
-    analytics_service = AthenaAnalyticsService(athena_dao)
+    try:
+        response = run_audit(event, context, config, checkpoint, resume)
+    except Exception:
+        if ledger:
+            ledger.release(ledger_key)
+        raise
+    if ledger and response.get('statusCode') != 202:
+        # Failures are released so the next trigger can retry; 202 means a resumed step will settle it.
+        if response.get('statusCode') == 200:
+            ledger.complete(ledger_key, response)
+        else:
+            ledger.release(ledger_key)
+    return response
+
+def run_audit(event, context, config, checkpoint=None, resume=None):
+    """Builds the services for the configured engine and runs the audit (or its next resumable step)."""
+    table_reader = DynamoTableReader(get_client('dynamodb')) if config.audit_engine in ('scan', 'adaptive') else None
+    engine = resolve_audit_engine(config, table_reader)
+    export_arns = event_export_arns(event)
+    if engine != 'scan':
+        try:
+            resolve_snapshot_scope(config, export_arns)
+            if event.get('parquet_table'):
+                config.use_parquet_table(event['parquet_table'])
+        except ValueError as e:
+            Logger.log("Invalid audit event", level="ERROR", error=str(e))
+            return {'statusCode': 400, 'body': 'Invalid audit event'}
+    if not resume:
+        # Resumed audits already passed the guard when they started.
+        engine = enforce_scan_budget(config, engine)
+        if engine is None:
+            return {'statusCode': 413, 'body': 'Scan budget exceeded'}
+    if engine == 'scan':
+        # Direct-scan engine: small tables are audited live, without an export or query engine.
+        from auditor.analytics import ScanAnalyticsService
+        discovery_service = StaticDiscoveryService()
+        analytics_service = ScanAnalyticsService(table_reader, config.table_name, config.scan_segments)
+    elif engine == 'streaming':
+        # Streaming engine: a single pass over the export files, no catalog or query engine.
+        from auditor.analytics import StreamingAnalyticsService
+        store = S3ObjectStore(get_client('s3'), config.data_lake_bucket)
+        discovery_service = StaticDiscoveryService()
+        analytics_service = StreamingAnalyticsService(ExportReader(store, config.snapshot_prefix), config.export_ids)
+    elif engine == 'consent':
+        # Effective-consent engine: counts users by their latest signal instead of raw signal rows.
+        from auditor.analytics import EffectiveConsentService
+        store = S3ObjectStore(get_client('s3'), config.data_lake_bucket)
+        discovery_service = StaticDiscoveryService()
+        analytics_service = EffectiveConsentService(ExportReader(store, config.snapshot_prefix), config.export_ids)
+    elif engine == 'incremental':
+        # Incremental engine: applies the export's changed items to the previously stored aggregate.
+        from auditor.analytics import IncrementalAnalyticsService
+        if not config.export_id:
+            # Combined multi-table cycles are not supported: stored aggregates are kept per table.
+            Logger.log("Incremental audit requires a single export_arn", level="ERROR")
+            return {'statusCode': 400, 'body': 'Missing export_arn'}
+        store = S3ObjectStore(get_client('s3'), config.data_lake_bucket)
+        discovery_service = StaticDiscoveryService()
+        analytics_service = IncrementalAnalyticsService(
+            ExportReader(store, config.snapshot_prefix), build_state_store(config),
+            config.export_id, config.table_name
+        )
+    elif engine == 'sharded':
+        # Sharded engine: the export manifest is fanned out to synchronous invocations of this function.
+        from auditor.analytics import ShardedAnalyticsService, LambdaShardExecutor
+        store = S3ObjectStore(get_client('s3'), config.data_lake_bucket)
+        invoker = BotoSnapshotDAO(lambda_client=get_client('lambda'))
+        discovery_service = StaticDiscoveryService()
+        analytics_service = ShardedAnalyticsService(
+            ExportReader(store, config.snapshot_prefix),
+            LambdaShardExecutor(invoker, context.function_name, config.data_lake_bucket),
+            config.audit_shards,
+            export_id=config.export_ids
+        )
+    else:
+        # Dependency Injection Layer 1: DAOs (Direct AWS SDK Interactions)
+        glue_dao = GlueDAO(get_client('glue'))
+        # The S3 client lets large result sets stream from the result CSV in ATHENA_OUTPUT.
+        athena_dao = AthenaDAO(get_client('athena'), get_client('s3'))
+
+        # Dependency Injection Layer 2: Services (Execution of Domain Operations)
+        history = CompletionHistory(build_state_store(config)) if config.adaptive_polling else None
+        if config.parquet_table and config.export_ids:
+            # The conversion stage already registered the snapshot's Parquet partitions.
+            discovery_service = StaticDiscoveryService()
+        elif config.discovery_mode == 'catalog':
+            discovery_service = CatalogDiscoveryService(
+                glue_dao, config.database_name, config.table_name, config.data_lake_bucket,
+                export_ids=config.export_ids,
+                export_prefix=config.export_prefix, snapshot_prefix=config.snapshot_prefix
+            )
+        else:
+            discovery_service = GlueDiscoveryService(glue_dao, config.crawler_name, history)
+        if event.get('type') == 'AUDIT_SUITE':
+            # Suite queries share one multiplexed poller instead of one blocking wait each.
+            analytics_service = AsyncAthenaAnalyticsService(athena_dao)
+        else:
+            analytics_service = AthenaAnalyticsService(athena_dao, history)
+            result_cache = build_result_cache(config)
+            if result_cache is not None:
+                analytics_service = CachedAnalyticsService(
+                    analytics_service, result_cache, ','.join(sorted(export_arns)), ttl=config.result_cache_ttl
+                )
     
     # Dependency Injection Layer 3: Orchestrator (Workflow Management)
-    orchestrator = ComplianceAuditOrchestrator(discovery_service, analytics_service)
+    # Only the crawl + query path has waits worth checkpointing; the other engines finish in one pass.
+    resumable = (config.audit_mode == 'resumable' and engine == 'athena' and event.get('type') != 'AUDIT_SUITE')
+    if resume and not resumable:
+        Logger.log("Audit resume without resumable mode", level="ERROR", audit_id=resume['audit_id'], engine=engine)
+        return {'statusCode': 400, 'body': 'Audit is not resumable'}
+    if resumable:
+        orchestrator = ResumableAuditOrchestrator(
+            discovery_service, analytics_service, build_state_store(config),
+            build_resume_scheduler(config, context), inline_wait=config.resume_inline_wait
+        )
+    else:
+        orchestrator = ComplianceAuditOrchestrator(discovery_service, analytics_service)
 
     try:
-        start_time = time.time()
-        query_id, status = orchestrator.run_opt_out_audit(config)
-        duration = time.time() - start_time
-        
-        # SLI: Audit Duration
-        metrics.add_metric(name="AuditDuration", unit=MetricUnit.Seconds, value=duration)
-
-        if status == 'SUCCEEDED':
-            Logger.log("Privacy Audit Successful", query_id=query_id, duration=duration)
-            metrics.add_metric(name="AuditSuccess", unit=MetricUnit.Count, value=1)
-            return {'statusCode': 200, 'query_id': query_id, 'status': 'COMPLETED'}
-
+        if event.get('type') == 'AUDIT_SUITE':
+            response = run_suite(orchestrator, config)
+        elif resumable:
+            response = run_resumable_audit(orchestrator, config, event, context, checkpoint,
+                                           resume.get('not_before') if resume else None)
         else:
-            Logger.log("Privacy Audit Failed", level="ERROR", query_id=query_id, status=status)
-            metrics.add_metric(name="AuditFailure", unit=MetricUnit.Count, value=1)
-            return {'statusCode': 500, 'query_id': query_id, 'status': status}
+            start_time = time.time()
+            query_id, status = orchestrator.run_opt_out_audit(config)
+            response = report_audit(query_id, status, time.time() - start_time)
+        if response['statusCode'] == 200:
+            write_rollup(orchestrator, config, export_arns)
+        return response
 
     except Exception as e:
         Logger.log("Critical failure in audit orchestration", level="ERROR", error=str(e))
@@ -1,42 +1,81 @@
-import boto3
 import json
-from typing import Any, Dict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
 from snapshot.interfaces import SnapshotDAO
+from auditor.clients import get_client
+from auditor.storage import snapshot_prefix
 from auditor.utils import Logger
 
+# The account id never changes within a container; resolved once instead of per export.
+_account_id_cache = {}
+
 class BotoSnapshotDAO(SnapshotDAO):
     """Boto3 implementation of SnapshotDAO."""
     
-    def __init__(self, ddb_client=None, lambda_client=None):
-        self._ddb = ddb_client or boto3.client('dynamodb')
-        self._lambda = lambda_client or boto3.client('lambda')
+    def __init__(self, ddb_client=None, lambda_client=None, sts_client=None):
+        # Clients default to the module-scope cache and are only resolved when first used.
+        self._ddb_client = ddb_client
+        self._lambda_client = lambda_client
+        self._sts_client = sts_client
+
+    def _regional_ddb(self, region: Optional[str]):
+        # Tables in other regions are exported (and described) through a client for their region.
+        return self._ddb_client or get_client('dynamodb', region_name=region)
+
+    @property
+    def _lambda(self):
+        return self._lambda_client or get_client('lambda')
+
+    def _account_id(self) -> str:
+        if 'account' not in _account_id_cache:
+            sts = self._sts_client or get_client('sts')
+            _account_id_cache['account'] = sts.get_caller_identity()['Account']
+        return _account_id_cache['account']
 
-    def export_table(self, table_name: str, bucket_name: str, region: str) -> Dict[str, Any]:
-        """Initiates a DynamoDB Export to S3."""
+    def export_table(self, table_name: str, bucket_name: str, region: str,
+                     export_time: Optional[datetime] = None,
+                     incremental_from: Optional[datetime] = None) -> Dict[str, Any]:
+        """Initiates a DynamoDB Export to S3 (incremental when `incremental_from` is given)."""
         try:
             # We need the full ARN for the Export API
-            # For simplicity, we assume we can construct it or get it from context later.
-            # In a real environment, we'd use STS to get account ID.
-            account_id = boto3.client('sts').get_caller_identity()['Account']
-            table_arn = f"arn:aws:dynamodb:{region}:{account_id}:table/{table_name}"
+            table_arn = f"arn:aws:dynamodb:{region}:{self._account_id()}:table/{table_name}"
             
-            response = self._ddb.export_table_to_point_in_time(
-                TableArn=table_arn,
-                S3Bucket=bucket_name,
-                S3Prefix="exports/",
-                ExportFormat='DYNAMODB_JSON'
-            )
+            params = {
+                'TableArn': table_arn,
+                'S3Bucket': bucket_name,
+                # One prefix per snapshot day, so audits can read a single export's partition.
+                'S3Prefix': snapshot_prefix(export_time or datetime.now(timezone.utc)),
+                'ExportFormat': 'DYNAMODB_JSON'
+            }
+            if incremental_from is not None:
+                params['ExportType'] = 'INCREMENTAL_EXPORT'
+                params['IncrementalExportSpecification'] = {
+                    'ExportFromTime': incremental_from,
+                    'ExportToTime': export_time or datetime.now(timezone.utc),
+                    'ExportViewType': 'NEW_AND_OLD_IMAGES'
+                }
+            elif export_time is not None:
+                params['ExportTime'] = export_time
+
+            response = self._regional_ddb(region).export_table_to_point_in_time(**params)
             return response
         except Exception as e:
             Logger.log("DAO: Export initiation failed", error=str(e))
             raise e
 
-    def invoke_auditor(self, function_name: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-        """Triggers the Auditor Lambda."""
+    def describe_export(self, export_arn: str) -> Dict[str, Any]:
+        """Returns the ExportDescription (status, S3Prefix, ExportTime, ...) of an export."""
+        parts = export_arn.split(':')
+        region = parts[3] if len(parts) > 5 else None
+        return self._regional_ddb(region).describe_export(ExportArn=export_arn)['ExportDescription']
+
+    def invoke_auditor(self, function_name: str, payload: Dict[str, Any],
+                       invocation_type: str = 'Event') -> Dict[str, Any]:
+        """Triggers the Auditor Lambda ('RequestResponse' waits for its result, e.g. audit shards)."""
         try:
             response = self._lambda.invoke(
                 FunctionName=function_name,
-                InvocationType='Event',
+                InvocationType=invocation_type,
                 Payload=json.dumps(payload)
             )
             return response
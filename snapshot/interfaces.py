@@ -1,12 +1,30 @@
-from typing import Protocol, Any, Dict
+from datetime import datetime
+from typing import Protocol, Any, Dict, Optional
 
 class SnapshotDAO(Protocol):
     """Protocol for Snapshot Data Access Object."""
     
-    def export_table(self, table_name: str, bucket_name: str, region: str) -> Dict[str, Any]:
-        """Initiates a DynamoDB Export to S3."""
+    def export_table(self, table_name: str, bucket_name: str, region: str,
+                     export_time: Optional[datetime] = None,
+                     incremental_from: Optional[datetime] = None) -> Dict[str, Any]:
+        """Initiates a DynamoDB Export to S3 (incremental when `incremental_from` is given)."""
         ...
 
-    def invoke_auditor(self, function_name: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    def describe_export(self, export_arn: str) -> Dict[str, Any]:
+        """Describes an export (S3Prefix locates its snapshot partition)."""
+        ...
+
+    def invoke_auditor(self, function_name: str, payload: Dict[str, Any],
+                       invocation_type: str = 'Event') -> Dict[str, Any]:
         """Triggers the Auditor Lambda."""
         ...
+
+class ExportConverter(Protocol):
+    """Protocol for post-export conversion stages (e.g. DYNAMODB_JSON -> Parquet)."""
+
+    def convert(self, export_id: str, export_prefix: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Converts a completed export; returns at least the output `prefix`. `export_prefix` is
+        the export's S3Prefix, so the manifest is found without listing every earlier export.
+        """
+        ...
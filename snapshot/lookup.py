@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from auditor.analytics.consent import ConsentStateIndex, pack_user_id, timestamp_key
+from auditor.analytics.lookup import ConsentLookupIndex, write_lookup_index
+from auditor.storage import AbstractObjectStore, ExportReader, attribute_value, continues_from, export_window
+from auditor.utils import Logger
+
+class ConsentIndexBuilder:
+    """
+    Post-export stage that writes a consent lookup file (latest signal per user, see
+    `auditor.analytics.lookup`) to `<output_prefix><export_id>.idx`, so point lookups
+    against the snapshot no longer need an Athena query. A full export is indexed from
+    scratch; an incremental export is merged into the lookup file of the export it continues.
+    """
+    def __init__(self, store: AbstractObjectStore, export_prefix: str = "exports/",
+                 output_prefix: str = "consent-index/"):
+        self.reader = ExportReader(store, export_prefix)
+        self.store = store
+        self.output_prefix = output_prefix
+
+    def convert(self, export_id: str, export_prefix: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Builds and uploads the lookup file of an export. With the export's `export_prefix`
+        (its S3Prefix) only that prefix is listed to find the manifest.
+        """
+        start_time = time.time()
+        reader = ExportReader(self.store, export_prefix) if export_prefix else self.reader
+        manifest_key = reader.manifest_key(export_id)
+        if manifest_key is None:
+            raise FileNotFoundError(f"No export manifest for export_id={export_id}")
+        summary = reader.summary(export_id, manifest_key)
+        keys = [e['dataFileS3Key'] for e in reader.manifest_entries(manifest_key)]
+        if summary.get('exportType') == 'INCREMENTAL_EXPORT':
+            base_key = self._base_key(export_id, summary)
+            index = self._merge(base_key, reader.iter_changes(keys))
+            Logger.log("Consent index delta merged", export_id=export_id, base_key=base_key)
+        else:
+            index = ConsentStateIndex.from_items(reader.iter_items(keys))
+
+        key = f"{self.output_prefix}{export_id}.idx"
+        fd, path = tempfile.mkstemp(suffix='.idx')
+        os.close(fd)
+        try:
+            users = write_lookup_index(index, path)
+            size = os.path.getsize(path)
+            self.store.put_file(key, path)
+        finally:
+            os.remove(path)
+
+        Logger.log("Consent index built", export_id=export_id, users=users, bytes=size,
+                   duration=time.time() - start_time)
+        return {"prefix": self.output_prefix, "key": key, "users": users, "bytes": size}
+
+    def _base_key(self, export_id: str, summary: Dict[str, Any]) -> str:
+        """Lookup file of the export this incremental export continues (the newest one before it)."""
+        own_key = f"{self.output_prefix}{export_id}.idx"
+        earlier = [k for k in self.store.list_keys(self.output_prefix) if k.endswith('.idx') and k < own_key]
+        base_key = max(earlier) if earlier else None
+        base_id = base_key[len(self.output_prefix):-len('.idx')] if base_key else None
+        if base_id is None or not continues_from(summary, export_window(self.reader.summary(base_id))[1]):
+            # Merging into a lookup file that is not this window's base would miss or repeat changes.
+            raise RuntimeError(f"No consent index to merge incremental export {export_id} into "
+                               f"(newest earlier index: {base_key}); a full export is required")
+        return base_key
+
+    def _merge(self, base_key: str, changes: Iterable) -> ConsentStateIndex:
+        """
+        Applies an incremental export's (OldImage, NewImage) pairs to a copy of the base lookup
+        file. A deleted item that was a user's latest signal drops the user: deletions in the
+        signal log are erasures of the user's history, not a rollback to an older signal.
+        """
+        updates, deleted = [], set()
+        for old_item, new_item in changes:
+            if new_item is not None:
+                updates.append(new_item)
+            elif old_item is not None:
+                deleted.add((pack_user_id(attribute_value(old_item, 'user_id')),
+                             timestamp_key(attribute_value(old_item, 'timestamp'))))
+
+        directory = tempfile.mkdtemp()
+        try:
+            with ConsentLookupIndex.from_store(self.store, base_key, cache_dir=directory) as base:
+                index = ConsentStateIndex(len(base) + len(updates))
+                for key, action, source, ts in base.entries():
+                    if (key, ts) not in deleted:
+                        index.update_key(key, action, source, ts)
+        finally:
+            shutil.rmtree(directory)
+        for item in updates:
+            index.update(attribute_value(item, 'user_id'), attribute_value(item, 'action'),
+                         attribute_value(item, 'source'), attribute_value(item, 'timestamp'))
+        return index
@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from auditor.discovery import ParquetCatalogService
+from auditor.storage import AbstractObjectStore, ExportReader, attribute_value, snapshot_date_from_prefix
+from auditor.utils import Logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional dependency: only the Parquet conversion stage needs it.
+    pa = pq = None
+
+def _parse_timestamp(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+def _parse_bool(value):
+    return None if value is None else value == 'True'
+
+class ParquetExportConverter:
+    """
+    Converts a DYNAMODB_JSON export into typed, compressed Parquet files laid out as
+    `<output_prefix>snapshot_date=YYYY-MM-DD/export_id=<id>/action=<action>/part-NNNN.parquet`.
+    Rows are buffered per action and flushed as one row group every `batch_size`
+    rows, so memory stays bounded regardless of export size. Staged files are uploaded
+    and removed whenever they pass `max_staged_bytes` together, so `/tmp` use stays within
+    Lambda ephemeral storage too. With a `catalog`, the written partitions are registered
+    for Athena before `convert` returns. Incremental exports are not converted: they hold
+    only changed items, so the audit reads their JSON export instead.
+    """
+    def __init__(self, store: AbstractObjectStore, export_prefix: str = "exports/", output_prefix: str = "parquet/",
+                 batch_size: int = 50_000, compression: str = 'zstd', max_staged_bytes: int = 256 * 1024 * 1024,
+                 catalog: Optional[ParquetCatalogService] = None):
+        if pa is None:
+            raise ImportError("pyarrow is required for the Parquet conversion stage")
+        self.reader = ExportReader(store, export_prefix)
+        self.store = store
+        self.output_prefix = output_prefix
+        self.batch_size = batch_size
+        self.compression = compression
+        self.max_staged_bytes = max_staged_bytes
+        self.catalog = catalog
+        self.schema = pa.schema([
+            ('user_id', pa.string()),
+            ('timestamp', pa.timestamp('ms', tz='UTC')),
+            ('source', pa.string()),
+            ('is_mock', pa.bool_()),
+        ])
+
+    def snapshot_date(self, export_id: str, manifest_key: Optional[str] = None,
+                      summary: Optional[Dict[str, Any]] = None) -> str:
+        # Exports under a per-day prefix keep that day, so Parquet partitions match the audit scope.
+        manifest_key = manifest_key or self.reader.manifest_key(export_id)
+        snapshot_date = snapshot_date_from_prefix(manifest_key)
+        if snapshot_date:
+            return snapshot_date
+        export_time = (summary if summary is not None else self.reader.summary(export_id, manifest_key)).get('exportTime')
+        if export_time:
+            return export_time[:10]
+        # Export ids are prefixed with the export time in epoch milliseconds.
+        millis = int(export_id.split('-', 1)[0])
+        return datetime.fromtimestamp(millis / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+
+    def convert(self, export_id: str, export_prefix: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Converts one export; returns its Parquet prefix, written keys, row count, bytes and catalog table.
+        With the export's `export_prefix` (its S3Prefix) only that prefix is listed to find the manifest.
+        """
+        start_time = time.time()
+        reader = ExportReader(self.store, export_prefix) if export_prefix else self.reader
+        manifest_key = reader.manifest_key(export_id)
+        if manifest_key is None:
+            raise FileNotFoundError(f"No export manifest for export_id={export_id}")
+        summary = reader.summary(export_id, manifest_key)
+        if summary.get('exportType') == 'INCREMENTAL_EXPORT':
+            Logger.log("Parquet conversion skipped for incremental export", export_id=export_id)
+            return {"prefix": None, "keys": [], "rows": 0, "bytes": 0, "table": None}
+        keys = [e['dataFileS3Key'] for e in reader.manifest_entries(manifest_key)]
+        snapshot_date = self.snapshot_date(export_id, manifest_key, summary)
+        export_prefix = f"{self.output_prefix}snapshot_date={snapshot_date}/export_id={export_id}/"
+
+        workdir = tempfile.mkdtemp(prefix='parquet-')
+        self._writers, self._parts, self._written, self._bytes, self._staged = {}, {}, [], 0, 0
+        buffers, rows = {}, 0
+        try:
+            for item in reader.iter_items(keys):
+                action = attribute_value(item, 'action') or 'unknown'
+                buffer = buffers.setdefault(action, {name: [] for name in self.schema.names})
+                buffer['user_id'].append(attribute_value(item, 'user_id'))
+                buffer['timestamp'].append(_parse_timestamp(attribute_value(item, 'timestamp')))
+                buffer['source'].append(attribute_value(item, 'source'))
+                buffer['is_mock'].append(_parse_bool(attribute_value(item, 'is_mock')))
+                rows += 1
+                if len(buffer['user_id']) >= self.batch_size:
+                    self._flush(action, buffers.pop(action), export_prefix, workdir)
+
+            for action in list(buffers):
+                self._flush(action, buffers.pop(action), export_prefix, workdir)
+            for action in list(self._writers):
+                self._upload(action, export_prefix)
+        finally:
+            for writer, _ in self._writers.values():
+                writer.close()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        written = self._written
+        table = None
+        if self.catalog is not None and written:
+            self.catalog.register(snapshot_date, export_id, sorted(self._parts))
+            table = self.catalog.table
+        Logger.log("Parquet conversion completed", export_id=export_id, rows=rows, files=len(written),
+                   bytes=self._bytes, duration=time.time() - start_time)
+        return {"prefix": export_prefix, "keys": written, "rows": rows, "bytes": self._bytes, "table": table}
+
+    def _flush(self, action: str, buffer: Dict[str, List], export_prefix: str, workdir: str):
+        if not buffer['user_id']:
+            return
+        if action not in self._writers:
+            path = os.path.join(workdir, f"{self._staged}.parquet")
+            self._staged += 1
+            self._writers[action] = (pq.ParquetWriter(path, self.schema, compression=self.compression), path)
+        self._writers[action][0].write_table(pa.Table.from_pydict(buffer, schema=self.schema))
+
+        # Row groups are on disk once written; roll the largest staged file over when /tmp use passes the cap.
+        staged = {a: os.path.getsize(path) for a, (_, path) in self._writers.items()}
+        if sum(staged.values()) >= self.max_staged_bytes:
+            self._upload(max(staged, key=staged.get), export_prefix)
+
+    def _upload(self, action: str, export_prefix: str):
+        """Closes an action's staged file, uploads it as its next part and frees the space."""
+        writer, path = self._writers.pop(action)
+        writer.close()
+        part = self._parts.get(action, 0)
+        key = f"{export_prefix}action={action}/part-{part:04d}.parquet"
+        self._bytes += os.path.getsize(path)
+        self.store.put_file(key, path)
+        os.remove(path)
+        self._parts[action] = part + 1
+        self._written.append(key)
@@ -1,46 +1,294 @@
 import os
+import uuid
 import boto3
-from typing import Optional
-from snapshot.interfaces import SnapshotDAO
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from snapshot.interfaces import SnapshotDAO, ExportConverter
+from auditor.state import AbstractStateStore, IdempotencyLedger
+from auditor.storage import export_id_from_arn
 from auditor.utils import Logger
 
+# DynamoDB accepts incremental export windows between 15 minutes and 24 hours.
+MIN_INCREMENTAL_WINDOW = timedelta(minutes=15)
+MAX_INCREMENTAL_WINDOW = timedelta(hours=24)
+TERMINAL_EXPORT_STATES = ('COMPLETED', 'FAILED')
+
+def parse_table_specs(specs: str, region: str) -> List[Tuple[str, str]]:
+    """
+    Parses `SNAPSHOT_TABLES` (`table` or `region:table`, comma-separated) into (table, region)
+    pairs. Tables must be in the stack's region: export completion events of other regions
+    never reach this region's EventBridge rule, so their cycles would never finish.
+    """
+    tables = []
+    for spec in specs.split(','):
+        spec = spec.strip()
+        if spec:
+            table_region, _, table = spec.rpartition(':')
+            if table_region and table_region != region:
+                raise ValueError(f"Snapshot table {spec} is outside the stack's region {region}")
+            tables.append((table, region))
+    return tables
+
 class SnapshotService:
     """Domain service for managing DynamoDB Batch Snapshots."""
     
-    def __init__(self, dao: SnapshotDAO):
+    def __init__(self, dao: SnapshotDAO, converter: Optional[ExportConverter] = None,
+                 state_store: Optional[AbstractStateStore] = None, indexer: Optional[ExportConverter] = None):
         self._dao = dao
+        self._converter = converter
+        self._state = state_store
+        self._indexer = indexer
 
-    def start_snapshot(self, table_name: str, bucket_name: str, region: str) -> dict:
-        """Initiates the daily snapshot process."""
+    def start_snapshot(self, table_name: str, bucket_name: str, region: str, incremental: bool = False,
+                       cycle: Optional[Dict[str, Any]] = None) -> dict:
+        """
+        Initiates the daily snapshot process (an incremental export since the last completed one if requested).
+        `cycle` ({cycle_id, table_index}) links the export to a multi-table snapshot cycle.
+        """
         if not table_name or not bucket_name:
             Logger.log("SnapshotService: Missing configuration", level="ERROR")
             return {"status": "FAILED", "reason": "MISSING_CONFIG"}
 
         try:
-            response = self._dao.export_table(table_name, bucket_name, region)
+            export_time = datetime.now(timezone.utc)
+            incremental_from = None
+            if incremental:
+                window = self._incremental_window(table_name, export_time)
+                if window is not None:
+                    incremental_from, export_time = window
+            response = self._dao.export_table(table_name, bucket_name, region,
+                                              export_time=export_time, incremental_from=incremental_from)
             export_arn = response['ExportDescription']['ExportArn']
-            Logger.log("SnapshotService: Export Started", export_arn=export_arn)
-            return {"status": "STARTED", "export_arn": export_arn}
+            export_type = 'INCREMENTAL_EXPORT' if incremental_from else 'FULL_EXPORT'
+            if self._state is not None:
+                # Promoted to the table's last export only once it completes (see handle_export_completion).
+                self._state.put(f"export#{export_arn}", dict(cycle or {}, **{
+                    "table_name": table_name, "export_arn": export_arn,
+                    "export_time": export_time.isoformat(), "export_type": export_type
+                }))
+            Logger.log("SnapshotService: Export Started", export_arn=export_arn, export_type=export_type)
+            return {"status": "STARTED", "export_arn": export_arn, "export_type": export_type}
         except Exception as e:
             Logger.log("SnapshotService: Export failed", level="ERROR", error=str(e))
             return {"status": "FAILED", "error": str(e)}
 
+    def start_snapshot_cycle(self, tables: List[Tuple[str, str]], bucket_name: str, max_in_flight: int = 4,
+                             incremental: bool = False) -> dict:
+        """
+        Starts one snapshot cycle over several (table, region) pairs. At most `max_in_flight`
+        exports run at once (DynamoDB export quotas): the first batch is started concurrently
+        here, and each completion starts the next waiting table. Every table's progress is
+        kept in the state store, so one combined audit runs once all of them have finished.
+        """
+        if self._state is None or not tables or not bucket_name:
+            Logger.log("SnapshotService: Snapshot cycle needs tables, a bucket and a state store", level="ERROR")
+            return {"status": "FAILED", "reason": "MISSING_CONFIG"}
+
+        cycle_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{uuid.uuid4().hex[:8]}"
+        cycle = {"cycle_id": cycle_id, "bucket": bucket_name, "incremental": incremental,
+                 "max_in_flight": max_in_flight, "tables": [{"table_name": t, "region": r} for t, r in tables]}
+        self._state.put(f"cycle#{cycle_id}", cycle)
+        Logger.log("SnapshotService: Snapshot cycle started", cycle_id=cycle_id, tables=len(tables),
+                   max_in_flight=max_in_flight)
+
+        first_batch = range(min(max_in_flight, len(tables)))
+        with ThreadPoolExecutor(max_workers=len(first_batch)) as pool:
+            list(pool.map(lambda i: self._start_cycle_table(cycle, i), first_batch))
+        # Refills the slots of exports that failed to start.
+        states = self._advance_cycle(cycle)
+
+        started = {t["table_name"]: s["export_arn"] for t, s in zip(cycle["tables"], states) if s and s.get("export_arn")}
+        if not started:
+            return {"status": "FAILED", "reason": "NO_EXPORT_STARTED", "cycle_id": cycle_id}
+        return {"status": "STARTED", "cycle_id": cycle_id, "exports": started,
+                "queued": sum(1 for s in states if s is None)}
+
+    def _start_cycle_table(self, cycle: Dict[str, Any], index: int):
+        """Claims and starts one table of a cycle; the claim keeps concurrent completions from starting it twice."""
+        table = cycle["tables"][index]
+        key = f"cycle#{cycle['cycle_id']}#table#{index}"
+        if not self._state.put_if_absent(key, {"status": "STARTING"}):
+            return
+        result = self.start_snapshot(table["table_name"], cycle["bucket"], table["region"], cycle["incremental"],
+                                     cycle={"cycle_id": cycle["cycle_id"], "table_index": index})
+        if result.get("status") == "STARTED":
+            self._state.put(key, {"status": "STARTED", "export_arn": result["export_arn"]})
+        else:
+            self._state.put(key, {"status": "FAILED", "error": result.get("error") or result.get("reason")})
+
+    def _advance_cycle(self, cycle: Dict[str, Any]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Starts waiting tables until `max_in_flight` exports are running; returns every table's
+        state (None while waiting). Concurrent completions may briefly overshoot the limit by
+        the number of completions racing here.
+        """
+        keys = [f"cycle#{cycle['cycle_id']}#table#{i}" for i in range(len(cycle["tables"]))]
+        states = [self._state.get(key) for key in keys]
+        in_flight = sum(1 for s in states if s and s["status"] not in TERMINAL_EXPORT_STATES)
+        for index, state in enumerate(states):
+            if in_flight >= cycle["max_in_flight"]:
+                break
+            if state is None:
+                self._start_cycle_table(cycle, index)
+                states[index] = self._state.get(keys[index])
+                if states[index]["status"] not in TERMINAL_EXPORT_STATES:
+                    in_flight += 1
+        return states
+
+    def _complete_cycle_export(self, pending: Dict[str, Any], status: str, payload: Dict[str, Any],
+                               auditor_func: str) -> dict:
+        cycle_id = pending["cycle_id"]
+        cycle = self._state.get(f"cycle#{cycle_id}")
+        if cycle is None:
+            Logger.log("SnapshotService: Unknown snapshot cycle", level="ERROR", cycle_id=cycle_id)
+            return {"status": "FAILED", "reason": "UNKNOWN_CYCLE"}
+        self._state.put(f"cycle#{cycle_id}#table#{pending['table_index']}",
+                        {"status": status, "export_arn": pending["export_arn"]})
+
+        states = self._advance_cycle(cycle)
+        remaining = sum(1 for s in states if not s or s["status"] not in TERMINAL_EXPORT_STATES)
+        if remaining:
+            Logger.log("SnapshotService: Cycle export finished; waiting for the rest", cycle_id=cycle_id,
+                       export_arn=pending["export_arn"], export_status=status, remaining=remaining)
+            return {"status": "CYCLE_PENDING", "cycle_id": cycle_id, "remaining": remaining}
+
+        # The last two completions can race here; only the one that claims the audit triggers it.
+        if not self._state.put_if_absent(f"cycle#{cycle_id}#audit", {"status": "TRIGGERED"}):
+            return {"status": "CYCLE_PENDING", "cycle_id": cycle_id, "remaining": 0}
+        export_arns = [s["export_arn"] for s in states if s["status"] == "COMPLETED"]
+        failed = [t["table_name"] for t, s in zip(cycle["tables"], states) if s["status"] == "FAILED"]
+        if not export_arns:
+            Logger.log("SnapshotService: Every export of the cycle failed", level="ERROR", cycle_id=cycle_id)
+            return {"status": "FAILED", "reason": "CYCLE_FAILED", "cycle_id": cycle_id}
+
+        payload = dict(payload, export_arns=export_arns, cycle_id=cycle_id)
+        payload.pop("export_arn", None)
+        if failed:
+            payload["failed_tables"] = failed
+        return self._trigger_auditor(auditor_func, payload, cycle_id=cycle_id, exports=len(export_arns))
+
+    def _incremental_window(self, table_name: str, now: datetime) -> Optional[Tuple[datetime, datetime]]:
+        """
+        (ExportFromTime, ExportToTime) of the next incremental export, or None when a full export
+        is required. Each window starts at the previous export's ExportToTime (its ExportTime for
+        a full export), so consecutive deltas chain without gaps, and is clamped to the 24 hour
+        maximum; a table that fell further behind than one more window can catch up gets a full export.
+        """
+        last = self._state.get(f"last-export#{table_name}") if self._state is not None else None
+        if not last:
+            Logger.log("SnapshotService: No previous export recorded; using full export", table=table_name)
+            return None
+        start = datetime.fromisoformat(last['export_time'])
+        elapsed = now - start
+        if not MIN_INCREMENTAL_WINDOW <= elapsed <= 2 * MAX_INCREMENTAL_WINDOW:
+            Logger.log("SnapshotService: Incremental window out of range; using full export",
+                       table=table_name, window_seconds=elapsed.total_seconds())
+            return None
+        return start, min(now, start + MAX_INCREMENTAL_WINDOW)
+
+    def _record_completed_export(self, export_arn: str):
+        pending = self._state.get(f"export#{export_arn}") if self._state is not None else None
+        if not pending:
+            return
+        key = f"last-export#{pending['table_name']}"
+        last = self._state.get(key)
+        if not last or last['export_time'] < pending['export_time']:
+            self._state.put(key, pending)
+
     def handle_export_completion(self, event: dict, auditor_func: str) -> dict:
-        """Handles the completion of a snapshot export and triggers the auditor."""
+        """
+        Handles the completion of a snapshot export and triggers the auditor. Exports of a
+        multi-table cycle trigger one combined audit once every table in the cycle has finished.
+        Redelivered events (EventBridge is at-least-once) get the first delivery's result back.
+        """
+        detail = event.get('detail', {})
+        if self._state is None or detail.get('exportStatus') not in TERMINAL_EXPORT_STATES:
+            return self._handle_export_completion(event, auditor_func)
+
+        ledger = IdempotencyLedger(self._state, namespace='export-completion')
+        key = f"{detail.get('exportArn')}#{detail['exportStatus']}"
+        entry = ledger.claim(key)
+        if entry is not None:
+            Logger.log("SnapshotService: Duplicate export event", export_arn=detail.get('exportArn'),
+                       ledger_status=entry['status'])
+            return {"status": "DUPLICATE", "ledger_status": entry['status'], "result": entry.get('result')}
+        try:
+            result = self._handle_export_completion(event, auditor_func)
+        except Exception:
+            ledger.release(key)
+            raise
+        if result.get("status") == "FAILED":
+            # Lets a redelivery or a manual re-send retry the conversion and trigger.
+            ledger.release(key)
+        else:
+            ledger.complete(key, result)
+        return result
+
+    def _handle_export_completion(self, event: dict, auditor_func: str) -> dict:
         detail = event.get('detail', {})
         export_arn = detail.get('exportArn')
         status = detail.get('exportStatus')
-        
+        pending = self._state.get(f"export#{export_arn}") if self._state is not None else None
+        in_cycle = bool(pending and pending.get("cycle_id"))
+
         if status != 'COMPLETED':
+            if in_cycle and status == 'FAILED':
+                return self._complete_cycle_export(pending, status, {"type": "SNAPSHOT_COMPLETE"}, auditor_func)
             Logger.log("SnapshotService: Non-completed export status received", status=status)
             return {"status": "IGNORED", "reason": f"STATUS_{status}"}
             
-        Logger.log("SnapshotService: Export Complete. Triggering Auditor.", export_arn=export_arn)
+        self._record_completed_export(export_arn)
+
+        payload = {"type": "SNAPSHOT_COMPLETE", "export_arn": export_arn}
+        export_prefix = self._export_prefix(export_arn) if self._converter or self._indexer else None
+        if self._converter is not None:
+            try:
+                result = self._converter.convert(export_id_from_arn(export_arn), export_prefix)
+                if result.get("prefix"):
+                    payload["parquet_prefix"] = result["prefix"]
+                if result.get("table"):
+                    # Registered in the catalog: the audit queries the Parquet table instead of the JSON export.
+                    payload["parquet_table"] = result["table"]
+            except Exception as e:
+                Logger.log("SnapshotService: Parquet conversion failed", level="ERROR", error=str(e))
+                if in_cycle:
+                    return self._complete_cycle_export(pending, 'FAILED', payload, auditor_func)
+                return {"status": "FAILED", "error": str(e)}
+
+        if self._indexer is not None:
+            # Lookups are a convenience for downstream consumers; a failed build must not block the audit.
+            try:
+                index_key = self._indexer.convert(export_id_from_arn(export_arn), export_prefix).get("key")
+                if index_key:
+                    payload["consent_index_key"] = index_key
+            except Exception as e:
+                Logger.log("SnapshotService: Consent index build failed", level="ERROR", error=str(e))
+
+        if in_cycle:
+            # Per-export outputs (consent index keys) are not carried into the combined audit event.
+            payload.pop("consent_index_key", None)
+            return self._complete_cycle_export(pending, status, payload, auditor_func)
+        return self._trigger_auditor(auditor_func, payload, export_arn=export_arn)
+
+    def _export_prefix(self, export_arn: str) -> Optional[str]:
+        """
+        S3Prefix the export was written under, so the post-export stages list only that
+        prefix instead of the whole export history. None (list everything) if it is unknown.
+        """
+        try:
+            return self._dao.describe_export(export_arn).get('S3Prefix')
+        except Exception as e:
+            Logger.log("SnapshotService: Export description failed", level="WARNING", error=str(e))
+            return None
+
+    def _trigger_auditor(self, auditor_func: str, payload: Dict[str, Any], **log_fields) -> dict:
+        Logger.log("SnapshotService: Export Complete. Triggering Auditor.", **log_fields)
         
         try:
             self._dao.invoke_auditor(
                 function_name=auditor_func,
-                payload={"type": "SNAPSHOT_COMPLETE", "export_arn": export_arn}
+                payload=payload
             )
             return {"status": "AUDIT_TRIGGERED"}
         except Exception as e:
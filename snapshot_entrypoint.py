@@ -5,16 +5,42 @@ Role: Thin wrapper for modular SnapshotService.
 import os
 import boto3
 from snapshot.dao import BotoSnapshotDAO
-from snapshot.service import SnapshotService
+from snapshot.service import SnapshotService, parse_table_specs
+from auditor.clients import get_client
+from auditor.storage import S3ObjectStore
+from auditor.state import DynamoStateStore
 
 from auditor.utils import tracer, logger, metrics, Logger
 import time
 
-def get_service():
+def get_region():
+    """Lambda always sets AWS_REGION; a boto3 Session is only built as a fallback."""
+    return os.environ.get('AWS_REGION') or boto3.session.Session().region_name or 'us-east-1'
+
+def get_service(with_converter=False):
     """Dependency injection for SnapshotService."""
-    # Note: Clients are lazily initialized in the DAO
+    # Note: Clients are lazily initialized in the DAO and cached at module scope
     dao = BotoSnapshotDAO()
-    return SnapshotService(dao)
+    converter = None
+    if with_converter and os.environ.get('PARQUET_CONVERSION', 'false').lower() == 'true':
+        # Imported lazily: pyarrow is an optional dependency of the conversion stage only.
+        from snapshot.parquet import ParquetExportConverter
+        from auditor.discovery import GlueDAO, ParquetCatalogService
+        bucket = os.environ.get('DATA_LAKE_BUCKET')
+        prefix = os.environ.get('PARQUET_PREFIX', 'parquet/')
+        catalog = ParquetCatalogService(
+            GlueDAO(get_client('glue')), os.environ.get('DATABASE_NAME'),
+            os.environ.get('PARQUET_TABLE_NAME', f"{os.environ.get('TABLE_NAME')}_parquet"), bucket, prefix
+        )
+        converter = ParquetExportConverter(S3ObjectStore(get_client('s3'), bucket), output_prefix=prefix,
+                                           catalog=catalog)
+    indexer = None
+    if with_converter and os.environ.get('CONSENT_INDEX', 'false').lower() == 'true':
+        from snapshot.lookup import ConsentIndexBuilder
+        indexer = ConsentIndexBuilder(S3ObjectStore(get_client('s3'), os.environ.get('DATA_LAKE_BUCKET')))
+    state_table = os.environ.get('STATE_TABLE')
+    state_store = DynamoStateStore(get_client('dynamodb'), state_table) if state_table else None
+    return SnapshotService(dao, converter, state_store, indexer)
 
 @metrics.log_metrics
 @logger.inject_lambda_context(log_event=True)
@@ -25,19 +51,32 @@ def start_snapshot(event, context):
     
     table_name = os.environ.get('TABLE_NAME')
     bucket_name = os.environ.get('DATA_LAKE_BUCKET')
-    region = boto3.session.Session().region_name or 'us-east-1'
+    region = get_region()
     
     Logger.log("Starting daily DynamoDB export", table=table_name)
     metrics.add_metric(name="ExportInitiated", unit="Count", value=1)
     
-    return service.start_snapshot(table_name, bucket_name, region)
+    incremental = os.environ.get('INCREMENTAL_EXPORTS', 'false').lower() == 'true'
+    table_specs = os.environ.get('SNAPSHOT_TABLES')
+    if table_specs:
+        # Multi-table cycle: bounded concurrent exports, one combined audit when all have finished.
+        try:
+            tables = parse_table_specs(table_specs, region)
+        except ValueError as e:
+            Logger.log("Invalid SNAPSHOT_TABLES", level="ERROR", error=str(e))
+            return {"status": "FAILED", "reason": "INVALID_SNAPSHOT_TABLES"}
+        return service.start_snapshot_cycle(
+            tables, bucket_name,
+            max_in_flight=int(os.environ.get('SNAPSHOT_MAX_IN_FLIGHT', '4')), incremental=incremental
+        )
+    return service.start_snapshot(table_name, bucket_name, region, incremental=incremental)
 
 @metrics.log_metrics
 @logger.inject_lambda_context(log_event=True)
 @tracer.capture_lambda_handler
 def on_export_complete(event, context):
     """Entry point for EventBridge completion trigger."""
-    service = get_service()
+    service = get_service(with_converter=True)
     
     auditor_func = os.environ.get('AUDITOR_FUNCTION_NAME')
     if not auditor_func: